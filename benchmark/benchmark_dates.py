@@ -0,0 +1,95 @@
+'''
+Benchmark of the date handling of the date/amount join.
+
+Before, the dates went through SQLite as text and every pass parsed them again
+(pd.to_datetime(..., format='%Y-%m-%d %H:%M:%S')). Now they are converted once to datetime64[ns] at ingest
+(master_mapping_transfer_check) and every pass reads them as int64 without parsing.
+This script runs the same number of join passes on both representations and reports the time spent parsing.
+
+Usage (from the root of the repository):
+    python -m benchmark.benchmark_dates --nb_payments 50000 --nb_orders 50000 --nb_passes 12
+'''
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from utils.utils import to_datetime64
+from mapping_transfer_check.basic_functions import interval_join_positions
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def generate_tables(nb_payments: int, nb_orders: int, seed: int = 0) -> tuple:
+    """
+    Generates a payment table and a BO table with the dates as text, as they came back from SQLite.
+
+    Parameters:
+        nb_payments (int): Number of payments.
+        nb_orders (int): Number of BO orders.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        tuple: (df_payment, df_BO) with the dates as strings.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01')
+    creation_date = start + pd.to_timedelta(rng.integers(0, 365, nb_orders), unit='D')
+    df_BO = pd.DataFrame({
+        'order_id': np.arange(nb_orders).astype(str),
+        'total_amount': rng.integers(10, 5000, nb_orders) * 10.0,
+        'Start_Date': creation_date.strftime(DATE_FORMAT),
+        'End_Date': (creation_date + pd.Timedelta(days=60)).strftime(DATE_FORMAT)
+    })
+    effective_date = start + pd.to_timedelta(rng.integers(0, 400, nb_payments), unit='D')
+    df_payment = pd.DataFrame({
+        'id': np.arange(nb_payments).astype(str),
+        'amount': rng.integers(10, 5000, nb_payments) * 10.0,
+        'effective_date': effective_date.strftime(DATE_FORMAT)
+    })
+    return df_payment, df_BO
+
+def run_passes(df_payment: pd.DataFrame, df_BO: pd.DataFrame, nb_passes: int) -> float:
+    """
+    Runs nb_passes date/amount joins and returns the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    for _ in range(nb_passes):
+        interval_join_positions(df_payment, df_BO, 'amount', 'effective_date', 5)
+    return time.perf_counter() - start
+
+def main(nb_payments: int = 50000, nb_orders: int = 50000, nb_passes: int = 12) -> pd.DataFrame:
+    """
+    Compares the joins on text dates (parsed at each pass) with the joins on dates converted once.
+
+    Returns:
+        pd.DataFrame: One row per representation with the conversion time, the join time and the total time.
+    """
+    df_payment, df_BO = generate_tables(nb_payments, nb_orders)
+
+    # Dates as text: each pass parses them like the SQLite round trip did
+    time_text = run_passes(df_payment, df_BO, nb_passes)
+
+    # Dates converted once at ingest
+    start = time.perf_counter()
+    df_payment_dt = df_payment.assign(effective_date=to_datetime64(pd.to_datetime(df_payment['effective_date'], format=DATE_FORMAT)))
+    df_BO_dt = df_BO.assign(Start_Date=to_datetime64(pd.to_datetime(df_BO['Start_Date'], format=DATE_FORMAT)),
+                            End_Date=to_datetime64(pd.to_datetime(df_BO['End_Date'], format=DATE_FORMAT)))
+    time_ingest = time.perf_counter() - start
+    time_datetime = run_passes(df_payment_dt, df_BO_dt, nb_passes)
+
+    df_result = pd.DataFrame({
+        'dates': ['text, parsed at each pass', 'datetime64, converted once'],
+        'conversion_s': [np.nan, time_ingest],
+        'joins_s': [time_text, time_datetime],
+        'total_s': [time_text, time_ingest + time_datetime]
+    })
+    df_result['parse_time_removed_s'] = time_text - df_result['total_s']
+    return df_result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nb_payments', type=int, default=50000)
+    parser.add_argument('--nb_orders', type=int, default=50000)
+    parser.add_argument('--nb_passes', type=int, default=12)
+    args = parser.parse_args()
+    print(main(args.nb_payments, args.nb_orders, args.nb_passes).to_string(index=False))
@@ -0,0 +1,322 @@
+'''
+Benchmark suite of the transfer/check matching on the synthetic datasets of benchmark.synthetic_data.
+
+For each dataset size and payment kind (transfer, check), it runs master_mapping_transfer_check and each matching
+pass on its own (mapping_unique_payment, mapping_npaiement_1ord, mapping_1paiement_nord, mapping_npeople,
+mapping_lightcheck_uniquepayment) and reports:
+    + the elapsed time and the payment rows matched per second
+    + the peak RSS of the process (each case runs in a new process)
+    + the precision and recall of the matches against the ground truth links
+The results are written as JSON. With --baseline, they are compared with a previous results file: a case is
+a regression when its throughput drops or its peak RSS grows by more than --threshold, or when its precision
+or recall drops by more than --quality_tolerance. The exit code is 1 if there is a regression.
+
+Usage (from the root of the repository):
+    python -m benchmark.benchmark_suite --sizes 1000 10000 --output benchmark/results/baseline.json
+    python -m benchmark.benchmark_suite --sizes 1000 10000 --output benchmark/results/new.json \
+        --baseline benchmark/results/baseline.json --threshold 0.2
+'''
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from benchmark.synthetic_data import generate_dataset, load_dataset
+from master.clean_data import *
+from mapping_transfer_check.master_functions import *
+
+# Passes run on their own: (name, function, fixed parameters)
+LIST_PASSES = [
+    ('mapping_unique_payment', mapping_unique_payment, {}),
+    ('mapping_npaiement_1ord', mapping_npaiement_1ord, {}),
+    ('mapping_1paiement_nord', mapping_1paiement_nord, {}),
+    ('mapping_npeople', mapping_npeople, {'is_bo': True}),
+    ('mapping_lightcheck_uniquepayment', mapping_lightcheck_uniquepayment, {})
+]
+
+# Payment columns of each payment kind, as in the reconciliation steps of reconcile.py
+DICT_PAYMENT_KINDS = {
+    'transfer': {
+        'list_cols_clientname_payment' : ['reference1', 'reference2', 'clientname'],
+        'date_colname'                 : 'effective_date',
+        'amount_colname'               : 'amount',
+        'id_paiement'                  : 'id',
+        'col_paiements'                : ['transaction_details', 'account_num']
+    },
+    'check': {
+        'list_cols_clientname_payment' : ['check_holder'],
+        'date_colname'                 : 'reception_date',
+        'amount_colname'               : 'amount',
+        'id_paiement'                  : 'check_id',
+        'col_paiements'                : ['account_num', 'check_amount', 'doc_num', 'check_date']
+    }
+}
+
+def get_dataset(nb_orders: int, entity: str, seed: int, data_dir: str) -> str:
+    """
+    Returns the folder of the synthetic dataset of nb_orders orders, generated the first time.
+
+    Parameters:
+        nb_orders (int): Number of BO orders.
+        entity (str): ABCD or XYZ.
+        seed (int): Seed of the generator.
+        data_dir (str): Folder of the datasets.
+
+    Returns:
+        str: The folder of the parquet files.
+    """
+    output_dir = os.path.join(data_dir, f'{entity}_{nb_orders}_{seed}')
+    if not os.path.exists(os.path.join(output_dir, 'Ground_truth.parquet')):
+        generate_dataset(nb_orders, entity, seed, output_dir=output_dir)
+    return output_dir
+
+def prepare_inputs(dict_data: dict, entity: str, payment_kind: str) -> tuple:
+    """
+    Cleans the synthetic data like master_project and selects the payments and BO orders of a payment kind.
+
+    Parameters:
+        dict_data (dict): Tables of load_dataset.
+        entity (str): ABCD or XYZ.
+        payment_kind (str): 'transfer' or 'check'.
+
+    Returns:
+        tuple: (df_paiement, df_BO, df_truth, kwargs) with kwargs the parameters of master_mapping_transfer_check,
+        and df_truth the ground truth links between these payments and orders.
+    """
+    df_mapping_col = dict_data['df_mapping_col']
+    df_BO_vir, df_BO_chq = clean_data_BO(df_mapping_col, dict_data['BO'], entity)
+    dict_kind = DICT_PAYMENT_KINDS[payment_kind]
+    if payment_kind == 'transfer':
+        df_paiement = clean_data_mt940(dict_data['MT940'], entity)['Transfer']
+        df_BO = df_BO_vir
+    else:
+        df_paiement = clean_data_check(dict_data['Check_deposit']).rename(columns={'Product': 'account_num'})
+        df_BO = df_BO_chq
+
+    kwargs = {key: value for key, value in dict_kind.items() if key != 'col_paiements'}
+    kwargs.update({
+        'amount_threshold' : 5 if entity == 'ABCD' else 0,
+        'min_score'        : 90,
+        'bo_name_col'      : 'subscriber_name',
+        'dict_nb_jours'    : {'ABCD_PP': 60, 'ABCD_DM': 180, 'XYZ': 20}
+    })
+
+    df_truth = dict_data['Ground_truth']
+    df_truth = df_truth[df_truth['payment_id'].isin(df_paiement[dict_kind['id_paiement']]) &
+                        df_truth['order_id'].isin(df_BO['order_id'])]
+    return df_paiement, df_BO, df_truth, kwargs
+
+def score_links(df_match: pd.DataFrame, df_truth: pd.DataFrame, id_col: str, order_col: str) -> dict:
+    """
+    Compares the matched (payment, order) links with the ground truth.
+
+    Parameters:
+        df_match (pd.DataFrame): Matches, one row per payment/order link.
+        df_truth (pd.DataFrame): Ground truth links ('payment_id', 'order_id').
+        id_col (str): Name of the payment ID column of df_match.
+        order_col (str): Name of the order ID column of df_match.
+
+    Returns:
+        dict: 'nb_links', 'precision' and 'recall'.
+    """
+    set_match = set(zip(df_match[id_col].astype(str), df_match[order_col].astype(str)))
+    set_truth = set(zip(df_truth['payment_id'].astype(str), df_truth['order_id'].astype(str)))
+    nb_correct = len(set_match & set_truth)
+    return {
+        'nb_links': len(set_match),
+        'precision': nb_correct / len(set_match) if set_match else 1.0,
+        'recall': nb_correct / len(set_truth) if set_truth else 1.0
+    }
+
+def run_case(case: dict) -> dict:
+    """
+    Runs one benchmark case, in its own process so that the peak RSS is the one of the case.
+
+    Parameters:
+        case (dict): 'data_path', 'entity', 'nb_orders', 'payment_kind', 'mode' ('master_mapping_transfer_check'
+        or the name of a pass of LIST_PASSES) and 'nb_days_period' (aggregation period of the isolated passes).
+
+    Returns:
+        dict: The case with 'nb_payments', 'nb_orders_bo', 'elapsed_s', 'rows_per_sec', 'peak_rss_mb',
+        'nb_links', 'precision' and 'recall'.
+    """
+    entity, mode = case['entity'], case['mode']
+    dict_data = load_dataset(case['data_path'])
+    df_paiement, df_BO, df_truth, kwargs = prepare_inputs(dict_data, entity, case['payment_kind'])
+    id_paiement = kwargs['id_paiement']
+    col_paiements = DICT_PAYMENT_KINDS[case['payment_kind']]['col_paiements']
+    df_mapping_col = dict_data['df_mapping_col']
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'master_mapping_transfer_check':
+            start = time.perf_counter()
+            df_result = master_mapping_transfer_check(entity, df_paiement, df_BO, df_mapping_col, col_paiements, **kwargs)
+            elapsed = time.perf_counter() - start
+            order_col = dict(zip(df_mapping_col['column'], df_mapping_col[entity]))['order_id']
+            df_match = df_result[df_result['categorie'] != 'Heavy check']
+        else:
+            # Same inputs as the passes of master_mapping_transfer_check, the date/amount join is shared setup
+            col_BO = df_mapping_col[~df_mapping_col[entity].isnull()]['column'].tolist()
+            df_paiement_pass, df_BO_pass, kwargs_bo = prepare_mapping_inputs(
+                entity, df_paiement[[id_paiement, kwargs['date_colname'], kwargs['amount_colname']] + col_paiements +
+                                    kwargs['list_cols_clientname_payment']], df_BO[col_BO], **kwargs)
+            kwargs_bo['payment_id'] = id_paiement
+            # By default master_mapping_transfer_check does not give nb_days_period to the passes (default 2 days,
+            # which leaves no aggregation window to the n payments / n orders passes), the isolated passes get one
+            kwargs_bo['nb_days_period'] = case['nb_days_period']
+            kwargs_bo['candidate_store'] = create_candidate_store()
+            prime_candidate_store(kwargs_bo['candidate_store'], df_paiement_pass, df_BO_pass, kwargs_bo['amount_colname'],
+                                  kwargs_bo['date_colname'], kwargs_bo['amount_threshold'], id_paiement)
+            func, dict_params = [(func, dict_params) for name, func, dict_params in LIST_PASSES if name == mode][0]
+
+            start = time.perf_counter()
+            df_match, _, _ = func(pd.DataFrame(), df_paiement_pass, df_BO_pass, kwargs['list_cols_clientname_payment'],
+                                  motif=mode, **dict_params, **kwargs_bo)
+            elapsed = time.perf_counter() - start
+            order_col = 'order_id'
+
+    dict_scores = score_links(df_match, df_truth, id_paiement, order_col) if not df_match.empty else \
+        {'nb_links': 0, 'precision': 1.0, 'recall': 0.0 if len(df_truth) else 1.0}
+    return {
+        **{key: value for key, value in case.items() if key != 'data_path'},
+        'nb_payments': len(df_paiement),
+        'nb_orders_bo': len(df_BO),
+        'elapsed_s': elapsed,
+        'rows_per_sec': len(df_paiement) / elapsed if elapsed > 0 else np.nan,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        **dict_scores
+    }
+
+def run_suite(
+    sizes: list,
+    entity: str = 'ABCD',
+    seed: int = 0,
+    data_dir: str = 'benchmark/data',
+    payment_kinds: list = None,
+    modes: list = None,
+    nb_days_period: int = 20
+) -> dict:
+    """
+    Runs the benchmark cases of every size, payment kind and mode, each one in a new process.
+
+    Parameters:
+        sizes (list): Numbers of BO orders of the synthetic datasets.
+        entity (str): ABCD or XYZ.
+        seed (int): Seed of the synthetic datasets.
+        data_dir (str): Folder of the synthetic datasets (generated once).
+        payment_kinds (list): 'transfer' and/or 'check', both by default.
+        modes (list): 'master_mapping_transfer_check' and/or pass names, all by default.
+        nb_days_period (int): Aggregation period in days given to the isolated passes.
+
+    Returns:
+        dict: 'meta' (date, versions, parameters) and 'results' (one dict per case, see run_case).
+    """
+    payment_kinds = payment_kinds or list(DICT_PAYMENT_KINDS)
+    modes = modes or ['master_mapping_transfer_check'] + [name for name, _, _ in LIST_PASSES]
+    list_results = []
+    # spawn: a forked process would start with the peak RSS of this one
+    context = multiprocessing.get_context('spawn')
+    for nb_orders in sizes:
+        data_path = get_dataset(nb_orders, entity, seed, data_dir)
+        for payment_kind in payment_kinds:
+            for mode in modes:
+                case = {'data_path': data_path, 'entity': entity, 'nb_orders': nb_orders,
+                        'payment_kind': payment_kind, 'mode': mode, 'nb_days_period': nb_days_period}
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    dict_result = executor.submit(run_case, case).result()
+                print(f"{nb_orders} {payment_kind} {mode}: {dict_result['rows_per_sec']:.0f} rows/s, "
+                      f"{dict_result['peak_rss_mb']:.0f} MB, precision {dict_result['precision']:.3f}, "
+                      f"recall {dict_result['recall']:.3f}")
+                list_results.append(dict_result)
+
+    meta = {
+        'date': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'entity': entity,
+        'seed': seed
+    }
+    return {'meta': meta, 'results': list_results}
+
+def compare_to_baseline(
+    dict_results: dict,
+    dict_baseline: dict,
+    threshold: float = 0.2,
+    quality_tolerance: float = 0.001
+) -> pd.DataFrame:
+    """
+    Compares the results with a baseline run, case by case (same size, payment kind and mode).
+
+    Parameters:
+        dict_results (dict): Output of run_suite.
+        dict_baseline (dict): Output of a previous run_suite.
+        threshold (float): Accepted relative drop of rows_per_sec and growth of peak_rss_mb.
+        quality_tolerance (float): Accepted absolute drop of precision and recall.
+
+    Returns:
+        pd.DataFrame: One row per case and metric with the baseline value, the new value, the relative change
+        and 'regression'.
+    """
+    keys = ['entity', 'nb_orders', 'payment_kind', 'mode', 'nb_days_period']
+    df_new = pd.DataFrame(dict_results['results']).set_index(keys)
+    df_old = pd.DataFrame(dict_baseline['results']).set_index(keys)
+    df_old = df_old[df_old.index.isin(df_new.index)]
+
+    list_comparison = []
+    for metric in ['rows_per_sec', 'peak_rss_mb', 'precision', 'recall']:
+        df_metric = pd.DataFrame({'baseline': df_old[metric], 'new': df_new.loc[df_old.index, metric]})
+        df_metric['change'] = df_metric['new'] / df_metric['baseline'] - 1
+        if metric == 'rows_per_sec':
+            df_metric['regression'] = df_metric['change'] < -threshold
+        elif metric == 'peak_rss_mb':
+            df_metric['regression'] = df_metric['change'] > threshold
+        else:
+            df_metric['regression'] = df_metric['baseline'] - df_metric['new'] > quality_tolerance
+        list_comparison.append(df_metric.assign(metric=metric).reset_index())
+    return pd.concat(list_comparison, ignore_index=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--entity', default='ABCD', choices=['ABCD', 'XYZ'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data_dir', default='benchmark/data')
+    parser.add_argument('--payment_kinds', nargs='+', choices=list(DICT_PAYMENT_KINDS))
+    parser.add_argument('--modes', nargs='+', choices=['master_mapping_transfer_check'] + [name for name, _, _ in LIST_PASSES])
+    parser.add_argument('--nb_days_period', type=int, default=20, help='Aggregation period of the isolated passes')
+    parser.add_argument('--output', default='benchmark/results/results.json')
+    parser.add_argument('--baseline', help='Results file of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--quality_tolerance', type=float, default=0.001)
+    args = parser.parse_args()
+
+    dict_results = run_suite(args.sizes, args.entity, args.seed, args.data_dir, args.payment_kinds, args.modes,
+                             args.nb_days_period)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump(dict_results, file, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            dict_baseline = json.load(file)
+        df_comparison = compare_to_baseline(dict_results, dict_baseline, args.threshold, args.quality_tolerance)
+        print(df_comparison.to_string(index=False))
+        df_regression = df_comparison[df_comparison['regression']]
+        if not df_regression.empty:
+            print(f'{len(df_regression)} regression(s) against {args.baseline}')
+            sys.exit(1)
+        print(f'No regression against {args.baseline}')
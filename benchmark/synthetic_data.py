@@ -0,0 +1,478 @@
+'''
+Seeded generator of synthetic input data for reconcile.master_project, to test the reconciliation at scale
+without customer data.
+
+It generates, for an entity:
+    + the MT940 bank statement lines (transfers, check deposits and unrelated lines)
+    + the check deposit data
+    + the BO export, with the raw column names of df_mapping_col
+    + df_mapping_col
+    + the ground truth links between the payments (MT940 id or check id) and the BO orders, and between the checks
+      and their MT940 deposit line (deposit_id)
+The rates of split payments, multi-order payments, co-subscriber payers, wrong-account products and name noise
+are parameters. The rows are generated by chunks of orders, so large sizes (up to ~10M rows) can be streamed
+to parquet files.
+
+The MT940 lines can also be written as an MT940 file (write_mt940), to be read with utils.mt940_reader.
+
+Usage (from the root of the repository):
+    python -m benchmark.synthetic_data --nb_orders 100000 --output_dir data/synthetic_100k --mt940
+'''
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+LIST_LAST_NAMES = ['MARTIN', 'BERNARD', 'THOMAS', 'PETIT', 'ROBERT', 'RICHARD', 'DURAND', 'DUBOIS', 'MOREAU', 'LAURENT',
+                   'SIMON', 'MICHEL', 'LEFEBVRE', 'LEROY', 'ROUX', 'DAVID', 'BERTRAND', 'MOREL', 'FOURNIER', 'GIRARD',
+                   'BONNET', 'DUPONT', 'LAMBERT', 'FONTAINE', 'ROUSSEAU', 'VINCENT', 'MULLER', 'LEFEVRE', 'FAURE', 'ANDRE',
+                   'MERCIER', 'BLANC', 'GUERIN', 'BOYER', 'GARNIER', 'CHEVALIER', 'FRANCOIS', 'LEGRAND', 'GAUTHIER', 'GARCIA',
+                   'PERRIN', 'ROBIN', 'CLEMENT', 'MORIN', 'NICOLAS', 'HENRY', 'ROUSSEL', 'MATHIEU', 'GAUTIER', 'MASSON',
+                   'NGUYEN', 'PHAM', 'TRAN', 'LE', 'HOANG', 'VU', 'DANG', 'BUI', 'DO', 'HO']
+LIST_FIRST_NAMES = ['JEAN', 'MARIE', 'PIERRE', 'MICHEL', 'ANNE', 'PHILIPPE', 'NATHALIE', 'ALAIN', 'ISABELLE', 'NICOLAS',
+                    'CATHERINE', 'FRANCOIS', 'SYLVIE', 'LAURENT', 'CHRISTINE', 'ERIC', 'MARTINE', 'DAVID', 'CELINE', 'THOMAS',
+                    'JULIEN', 'SOPHIE', 'PAUL', 'EMMA', 'HUGO', 'LEA', 'LOUIS', 'CHLOE', 'JEAN-PIERRE', 'MARIE-CLAIRE']
+LIST_TITLES = ['M. ', 'MME ', 'MR ', 'MONSIEUR ', 'MADAME ']
+LIST_PRODUCTS = ['PD1', 'PD2', 'PD3']
+DICT_RECEIVER = {'PD1': 'PRODUIT1', 'PD2': 'PRODUIT2', 'PD3': 'PRODUIT3'}
+
+# BO columns used by the reconciliation and their raw names in the export of each entity
+DICT_BO_COLUMNS = {
+    'order_id'          : ('Order ID', 'ORDER_REF'),
+    'subscriber_name'   : ('Subscriber', 'SUB_NAME'),
+    'cosubscriber_name' : ('Co-subscriber', 'COSUB_NAME'),
+    'creation_date'     : ('Creation date', 'CREATED_AT'),
+    'total_amount'      : ('Total amount', 'AMOUNT'),
+    'product_code'      : ('Product', 'PRODUCT_CODE'),
+    'share_type'        : ('Share type', None),
+    'order_status'      : ('Status', 'STATUS'),
+    'payment_mode'      : ('Payment mode', 'PAYMENT_MODE')
+}
+
+def get_mapping_col() -> pd.DataFrame:
+    """
+    Returns df_mapping_col: one row per BO column with its name in the reconciliation ('column') and in the
+    export of each entity ('ABCD', 'XYZ'), empty when the entity does not have the column.
+    """
+    return pd.DataFrame([(column, abcd, xyz) for column, (abcd, xyz) in DICT_BO_COLUMNS.items()],
+                        columns=['column', 'ABCD', 'XYZ'])
+
+def add_name_noise(names: pd.Series, rate: float, rng: np.random.Generator) -> tuple:
+    """
+    Adds noise to a rate of the names: a title, the first two words swapped, a missing letter or lower case.
+
+    Parameters:
+        names (pd.Series): The names.
+        rate (float): Rate of names changed.
+        rng (np.random.Generator): Random generator.
+
+    Returns:
+        tuple: (noisy names, mask of the names changed)
+    """
+    names = names.astype(object).copy()
+    mask = (rng.random(len(names)) < rate) & names.notna().to_numpy()
+    operation = rng.integers(0, 4, len(names))
+    titles = np.array(LIST_TITLES, dtype=object)[rng.integers(0, len(LIST_TITLES), len(names))]
+
+    mask_op = mask & (operation == 0)
+    names[mask_op] = titles[mask_op] + names[mask_op]
+    mask_op = mask & (operation == 1)
+    names[mask_op] = names[mask_op].str.replace(r'^(\S+) (\S+)', r'\2 \1', regex=True)
+    mask_op = mask & (operation == 2)
+    positions = rng.integers(1, 1_000_000, mask_op.sum())
+    names[mask_op] = [name[:pos % len(name)] + name[pos % len(name) + 1:]
+                      for name, pos in zip(names[mask_op], positions)]
+    mask_op = mask & (operation == 3)
+    names[mask_op] = names[mask_op].str.lower()
+    return names, mask
+
+def _random_names(nb: int, rng: np.random.Generator) -> pd.Series:
+    """
+    Returns nb random names 'LAST FIRST'.
+    """
+    last = np.array(LIST_LAST_NAMES, dtype=object)[rng.integers(0, len(LIST_LAST_NAMES), nb)]
+    first = np.array(LIST_FIRST_NAMES, dtype=object)[rng.integers(0, len(LIST_FIRST_NAMES), nb)]
+    return pd.Series(last + ' ' + first, dtype=object)
+
+def _split_cents(total_cents: np.ndarray, nb_parts: np.ndarray, rng: np.random.Generator) -> tuple:
+    """
+    Splits each total into nb_parts positive parts (in cents). Returns (row of each part, amount of each part).
+    """
+    rows = np.repeat(np.arange(len(total_cents)), nb_parts)
+    weights = rng.random(len(rows)) + 0.2
+    sums = np.bincount(rows, weights=weights, minlength=len(total_cents))
+    parts = np.floor(total_cents[rows] * weights / sums[rows]).astype('int64')
+    # The rounding remainder goes to the first part of each row
+    first = np.cumsum(nb_parts) - nb_parts
+    parts[first] += total_cents - np.bincount(rows, weights=parts, minlength=len(total_cents)).astype('int64')
+    return rows, parts
+
+def generate_chunk(
+    nb_orders: int,
+    rng: np.random.Generator,
+    entity: str = 'ABCD',
+    offset: int = 0,
+    **kwargs
+) -> dict:
+    """
+    Generates the data of nb_orders BO orders and their payments.
+
+    Parameters:
+        nb_orders (int): Number of BO orders.
+        rng (np.random.Generator): Random generator.
+        entity (str): ABCD or XYZ.
+        offset (int): First number of the ids, to keep them unique across chunks.
+        **kwargs: Rates and dates, see generate_dataset.
+
+    Returns:
+        dict: 'MT940', 'Check_deposit', 'BO' (columns of the reconciliation) and 'Ground_truth'.
+    """
+    start_date = pd.Timestamp(kwargs.get('start_date', '2024-01-01'))
+    nb_days = kwargs.get('nb_days', 365)
+    check_rate = kwargs.get('check_rate', 0.2)
+    split_rate = kwargs.get('split_rate', 0.1)
+    multi_order_rate = kwargs.get('multi_order_rate', 0.05)
+    cosubscriber_rate = kwargs.get('cosubscriber_rate', 0.3)
+    cosubscriber_payer_rate = kwargs.get('cosubscriber_payer_rate', 0.3)
+    wrong_account_rate = kwargs.get('wrong_account_rate', 0.03)
+    name_noise_rate = kwargs.get('name_noise_rate', 0.2)
+    unpaid_rate = kwargs.get('unpaid_rate', 0.05)
+    unrelated_rate = kwargs.get('unrelated_rate', 0.1)
+    max_delay_days = kwargs.get('max_delay_days', 20)
+
+    ########## BO orders ##########
+    order_num = np.arange(offset, offset + nb_orders)
+    df_BO = pd.DataFrame({
+        'order_id': pd.Series(order_num).map('ORD{:09d}'.format),
+        'subscriber_name': _random_names(nb_orders, rng),
+        'cosubscriber_name': _random_names(nb_orders, rng).where(rng.random(nb_orders) < cosubscriber_rate),
+        'creation_date': start_date + pd.to_timedelta(rng.integers(0, nb_days, nb_orders), unit='D'),
+        'total_amount_cents': rng.integers(50, 5000, nb_orders) * 100 * rng.choice([1, 1, 1, 10], nb_orders),
+        'product_code': np.array(LIST_PRODUCTS, dtype=object)[rng.integers(0, len(LIST_PRODUCTS), nb_orders)],
+        'share_type': np.where(rng.random(nb_orders) < 0.7, 'Full ownership', 'Bare ownership'),
+        'order_status': np.where(rng.random(nb_orders) < 0.02, 'Cancelled', 'Validated')
+    })
+    is_check = rng.random(nb_orders) < check_rate
+    if entity == 'ABCD':
+        df_BO['payment_mode'] = np.where(is_check, 'Check', np.where(rng.random(nb_orders) < 0.5, 'Transfer', 'Funding'))
+    else:
+        df_BO['payment_mode'] = np.where(is_check, 'Bank check', 'Direct Transfer')
+        df_BO['order_status'] = 'Validated'
+
+    # Multi-order payments: the next order belongs to the same client, the same product and is paid together
+    is_multi = (rng.random(nb_orders) < multi_order_rate) & ~is_check
+    is_multi[1::2] = False
+    is_multi[-1] = False
+    following = np.flatnonzero(is_multi) + 1
+    is_check[following] = False
+    for col in ['subscriber_name', 'cosubscriber_name', 'product_code', 'payment_mode', 'order_status']:
+        df_BO.loc[following, col] = df_BO.loc[following - 1, col].to_numpy()
+    df_BO.loc[following, 'creation_date'] = (df_BO.loc[following - 1, 'creation_date'].to_numpy() +
+                                             pd.to_timedelta(rng.integers(0, 5, len(following)), unit='D'))
+    is_multi_second = np.zeros(nb_orders, dtype=bool)
+    is_multi_second[following] = True
+
+    ########## Payments ##########
+    # One payment per paid order (the second order of a multi-order payment is paid by the first one)
+    is_paid = (rng.random(nb_orders) >= unpaid_rate) & (df_BO['order_status'] != 'Cancelled').to_numpy() & ~is_multi_second
+    is_split = (rng.random(nb_orders) < split_rate) & ~is_multi
+    paid = np.flatnonzero(is_paid)
+    total_cents = df_BO['total_amount_cents'].to_numpy()[paid].copy()
+    total_cents[is_multi[paid]] += df_BO['total_amount_cents'].to_numpy()[paid[is_multi[paid]] + 1]
+    nb_parts = np.where(is_split[paid], rng.integers(2, 4, len(paid)), 1)
+    rows, parts = _split_cents(total_cents, nb_parts, rng)
+    order_pos = paid[rows]
+
+    # Payer: the subscriber, or the co-subscriber when there is one, with noise on the name
+    use_cosub = (rng.random(len(rows)) < cosubscriber_payer_rate) & df_BO['cosubscriber_name'].notna().to_numpy()[order_pos]
+    payer = np.where(use_cosub, df_BO['cosubscriber_name'].to_numpy()[order_pos], df_BO['subscriber_name'].to_numpy()[order_pos])
+    payer, is_noisy = add_name_noise(pd.Series(payer, dtype=object), name_noise_rate, rng)
+
+    # Product of the account receiving the payment, sometimes the wrong one
+    product = df_BO['product_code'].to_numpy()[order_pos].copy()
+    is_wrong = rng.random(len(rows)) < wrong_account_rate
+    shift = rng.integers(1, len(LIST_PRODUCTS), is_wrong.sum())
+    product[is_wrong] = np.array(LIST_PRODUCTS, dtype=object)[(pd.Index(LIST_PRODUCTS).get_indexer(product[is_wrong]) + shift)
+                                                              % len(LIST_PRODUCTS)]
+    payment_date = (df_BO['creation_date'].to_numpy()[order_pos] +
+                    pd.to_timedelta(rng.integers(0, max_delay_days + 1, len(rows)), unit='D').to_numpy())
+    payment_is_check = is_check[order_pos]
+
+    ########## Ground truth ##########
+    payment_ids = np.where(payment_is_check,
+                           pd.Series(np.arange(len(rows)) + offset * 3).map('CHK{:09d}'.format),
+                           pd.Series(np.arange(len(rows)) + offset * 3).map('MT{:010d}'.format))
+    link_type = np.select([is_multi[order_pos], nb_parts[rows] > 1], ['multi_order', 'split'], 'single')
+    df_truth = pd.DataFrame({
+        'payment_id': payment_ids,
+        'order_id': df_BO['order_id'].to_numpy()[order_pos],
+        'link_type': link_type,
+        'cosubscriber_payer': use_cosub,
+        'wrong_account': is_wrong,
+        'noisy_name': is_noisy
+    })
+    mask_multi = is_multi[order_pos]
+    df_truth = pd.concat([df_truth, df_truth[mask_multi].assign(
+        order_id=df_BO['order_id'].to_numpy()[order_pos[mask_multi] + 1])], ignore_index=True)
+
+    ########## MT940 transfers ##########
+    transfer = ~payment_is_check
+    nb_transfers = transfer.sum()
+    payer_transfer = payer[transfer].to_numpy()
+    has_reference = rng.random(nb_transfers) < 0.5
+    df_virement = pd.DataFrame({
+        'id': payment_ids[transfer],
+        'country': 'FRANCE',
+        'transaction_type': 'Virement SEPA recu',
+        'sense': 'C',
+        'effective_date': payment_date[transfer],
+        'date': payment_date[transfer],
+        'amount': parts[transfer] / 100,
+        'clientname': payer_transfer,
+        'reference1': np.where(has_reference, 'SOUSCRIPTION ' + pd.Series(payer_transfer, dtype=object).fillna(''), 'VIREMENT'),
+        'reference2': df_BO['order_id'].to_numpy()[order_pos][transfer],
+        'transaction_details': 'VIR SEPA RECU /DE ' + pd.Series(payer_transfer, dtype=object).fillna('') + ' /MOTIF SOUSCRIPTION',
+        'extra_information': 'SEPA CREDIT TRANSFER',
+        'account_code': 'ACC-' + product[transfer],
+        'account_num': product[transfer]
+    })
+
+    ########## Check deposits ##########
+    checks = np.flatnonzero(payment_is_check)
+    reception_date = payment_date[checks]
+    df_cheque = pd.DataFrame({
+        'check_id': payment_ids[checks],
+        'check_holder': payer[checks].to_numpy(),
+        'check_number': rng.integers(1_000_000, 9_999_999, len(checks)).astype(str),
+        'check_amount': parts[checks] / 100,
+        'amount': parts[checks] / 100,
+        'check_date': reception_date - pd.to_timedelta(rng.integers(1, 5, len(checks)), unit='D').to_numpy(),
+        'reception_date': reception_date,
+        'Receiver': pd.Series(product[checks]).map(DICT_RECEIVER).to_numpy()
+    })
+
+    # One MT940 deposit line per product and reception date, the checks of a deposit share its slip number (doc_num)
+    # and one deposit line out of two gives the slip number (BORDEREAU) instead of the number of checks and the date
+    df_group = df_cheque.assign(product=product[checks]).groupby(['product', 'reception_date'])
+    df_deposit = df_group.agg(amount=('amount', 'sum'), nb_checks=('check_id', 'size')).reset_index()
+    deposit_num = np.arange(len(df_deposit)) + offset
+    deposit_id = pd.Series(deposit_num).map('DEP{:09d}'.format)
+    df_cheque.insert(3, 'doc_num', pd.Series(deposit_num).map('{:08d}'.format).to_numpy()[df_group.ngroup().to_numpy()])
+    df_truth['deposit_id'] = df_truth['payment_id'].map(
+        pd.Series(deposit_id.to_numpy()[df_group.ngroup().to_numpy()], index=df_cheque['check_id'].to_numpy()))
+    is_bordereau = deposit_num % 2 == 1
+    df_remise = pd.DataFrame({
+        'id': deposit_id,
+        'country': 'FRANCE',
+        'transaction_type': 'remise de chèques',
+        'sense': 'C',
+        'effective_date': df_deposit['reception_date'] + pd.Timedelta(days=1),
+        'date': df_deposit['reception_date'] + pd.Timedelta(days=1),
+        'amount': df_deposit['amount'],
+        'clientname': None,
+        'reference1': None,
+        'reference2': None,
+        'transaction_details': np.where(is_bordereau, 'REMISE CHEQUES NOPE/BORDEREAU ' + pd.Series(deposit_num).map('{:08d}'.format),
+                                        'REMISE CHEQUES NOPE/' + df_deposit['nb_checks'].astype(str) + 'CHQ ' +
+                                        df_deposit['reception_date'].dt.strftime('%m%d')),
+        'extra_information': 'REMISE ' + pd.Series(deposit_num).map('{:08d}'.format),
+        'account_code': 'ACC-' + df_deposit['product'],
+        'account_num': df_deposit['product']
+    })
+
+    ########## Unrelated MT940 lines ##########
+    nb_unrelated = int(round(unrelated_rate * len(df_virement)))
+    unrelated_date = start_date + pd.to_timedelta(rng.integers(0, nb_days, nb_unrelated), unit='D')
+    unrelated_product = np.array(LIST_PRODUCTS, dtype=object)[rng.integers(0, len(LIST_PRODUCTS), nb_unrelated)]
+    df_unrelated = pd.DataFrame({
+        'id': pd.Series(np.arange(nb_unrelated) + offset).map('OTH{:09d}'.format),
+        'country': np.where(rng.random(nb_unrelated) < 0.9, 'FRANCE', 'BELGIQUE'),
+        'transaction_type': np.where(rng.random(nb_unrelated) < 0.5, 'Virement SEPA recu', 'Frais bancaires'),
+        'sense': np.where(rng.random(nb_unrelated) < 0.8, 'C', 'D'),
+        'effective_date': unrelated_date,
+        'date': unrelated_date,
+        'amount': rng.integers(100, 500000, nb_unrelated) / 100,
+        'clientname': _random_names(nb_unrelated, rng).to_numpy(),
+        'reference1': 'DIVIDEND',
+        'reference2': None,
+        'transaction_details': 'VIR SEPA RECU /DE COMPANY /MOTIF DIVIDEND',
+        'extra_information': 'DIVIDEND',
+        'account_code': 'ACC-' + unrelated_product,
+        'account_num': unrelated_product
+    })
+
+    df_releve = pd.concat([df_virement, df_remise, df_unrelated], ignore_index=True)
+    df_BO['total_amount'] = df_BO.pop('total_amount_cents') / 100
+    # Titles in the BO names, removed by clean_data_BO
+    df_BO['subscriber_name'], _ = add_name_noise(df_BO['subscriber_name'], 0.05, rng)
+    if entity != 'ABCD':
+        df_BO = df_BO.drop(columns='share_type')
+
+    return {'MT940': df_releve, 'Check_deposit': df_cheque, 'BO': df_BO, 'Ground_truth': df_truth}
+
+def rename_bo_columns(df_BO: pd.DataFrame, entity: str) -> pd.DataFrame:
+    """
+    Renames the BO columns to their raw names in the export of the entity (inverse of clean_data_BO).
+    """
+    df_mapping_col = get_mapping_col()
+    df_mapping_col = df_mapping_col[~df_mapping_col[entity].isnull()]
+    return df_BO.rename(columns=dict(zip(df_mapping_col['column'], df_mapping_col[entity])))
+
+def generate_dataset(
+    nb_orders: int = 10000,
+    entity: str = 'ABCD',
+    seed: int = 0,
+    chunk_size: int = 500000,
+    output_dir: str = None,
+    **kwargs
+) -> dict:
+    """
+    Generates a full synthetic dataset by chunks of orders.
+
+    Parameters:
+        nb_orders (int): Number of BO orders (the MT940 has about as many lines).
+        entity (str): ABCD or XYZ.
+        seed (int): Seed of the random generator, the same seed and chunk_size give the same data.
+        chunk_size (int): Number of orders generated at once.
+        output_dir (str): If given, each table is written to <output_dir>/<table>.parquet chunk by chunk
+            (requires pyarrow) and only the paths are returned.
+        **kwargs: Generation parameters:
+            start_date, nb_days: period of the BO creation dates.
+            check_rate: rate of orders paid by check.
+            split_rate: rate of orders paid by several payments.
+            multi_order_rate: rate of payments paying two orders of the same client.
+            cosubscriber_rate: rate of orders with a co-subscriber.
+            cosubscriber_payer_rate: rate of payments made by the co-subscriber when there is one.
+            wrong_account_rate: rate of payments received on the account of another product.
+            name_noise_rate: rate of payer names with a title, swapped words, a typo or lower case.
+            unpaid_rate: rate of orders without payment.
+            unrelated_rate: rate of MT940 lines without order, relative to the transfers.
+            max_delay_days: maximum number of days between the order and the payment.
+
+    Returns:
+        dict: 'MT940', 'Check_deposit', 'BO' (raw column names), 'df_mapping_col', 'Ground_truth' and
+            'df_prlv_sub' (empty direct debit data). With output_dir, the paths of the parquet files instead.
+    """
+    list_chunks = []
+    writers = {}
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    seeds = np.random.SeedSequence(seed).spawn(int(np.ceil(nb_orders / chunk_size)) or 1)
+    try:
+        for num_chunk, offset in enumerate(range(0, nb_orders, chunk_size)):
+            rng = np.random.default_rng(seeds[num_chunk])
+            dict_chunk = generate_chunk(min(chunk_size, nb_orders - offset), rng, entity, offset, **kwargs)
+            dict_chunk['BO'] = rename_bo_columns(dict_chunk['BO'], entity)
+            if output_dir is None:
+                list_chunks.append(dict_chunk)
+                continue
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            for name, df in dict_chunk.items():
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if name not in writers:
+                    writers[name] = pq.ParquetWriter(os.path.join(output_dir, f'{name}.parquet'), table.schema)
+                writers[name].write_table(table.cast(writers[name].schema))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    dict_static = {'df_mapping_col': get_mapping_col(), 'df_prlv_sub': pd.DataFrame({'session_id': pd.Series(dtype=object)})}
+    if output_dir is not None:
+        dict_paths = {name: os.path.join(output_dir, f'{name}.parquet') for name in writers}
+        for name, df in dict_static.items():
+            dict_paths[name] = os.path.join(output_dir, f'{name}.parquet')
+            df.to_parquet(dict_paths[name], index=False)
+        return dict_paths
+
+    dict_result = {name: pd.concat([chunk[name] for chunk in list_chunks], ignore_index=True)
+                   for name in list_chunks[0]}
+    dict_result.update(dict_static)
+    return dict_result
+
+def load_dataset(output_dir: str) -> dict:
+    """
+    Reads a dataset written by generate_dataset with output_dir.
+    """
+    return {os.path.splitext(file)[0]: pd.read_parquet(os.path.join(output_dir, file))
+            for file in sorted(os.listdir(output_dir)) if file.endswith('.parquet')}
+
+# SWIFT type codes of the transaction types of the synthetic MT940 lines (utils.mt940_reader reads them back)
+DICT_TYPE_CODES = {'Virement': 'TRF', 'remise de chèques': 'CHK', 'Prélèvements': 'DDT', 'Rejected / Not paid': 'RTI'}
+DICT_COUNTRY_CODES = {'FRANCE': 'FR', 'BELGIQUE': 'BE'}
+
+def to_mt940_text(df_releve: pd.DataFrame, nb_lines_statement: int = 1000, first_statement: int = 1) -> str:
+    """
+    Formats MT940 lines as the text of MT940 statements: one statement (:20: to :62F:) per account and
+    nb_lines_statement transactions, the account of :25: being the country code followed by '76' and account_code.
+
+    Parameters:
+        df_releve (pd.DataFrame): MT940 lines of generate_dataset.
+        nb_lines_statement (int): Maximum number of transactions per statement.
+        first_statement (int): Number of the first statement.
+
+    Returns:
+        str: The MT940 text.
+    """
+    df = df_releve.copy()
+    type_code = pd.Series('MSC', index=df.index)
+    for label, code in DICT_TYPE_CODES.items():
+        type_code = type_code.mask(df['transaction_type'].str.contains(label, regex=False, na=False), code)
+    df['line_61'] = (':61:' + df['effective_date'].dt.strftime('%y%m%d') + df['date'].dt.strftime('%m%d') + df['sense'] +
+                     df['amount'].map('{:.2f}'.format).str.replace('.', ',', regex=False) + 'N' + type_code +
+                     df['reference1'].fillna('NONREF').str[:16] + '//' + df['id'].str[-16:] + '\n' +
+                     df['extra_information'].fillna('').str[:34])
+    # :86: is made of lines of 65 characters at most, cut between words (the reader joins them with spaces)
+    df['line_86'] = ':86:' + df['transaction_details'].fillna('').str.findall(r'\S.{0,64}(?=\s|$)').str.join('\n')
+    df['account'] = df['country'].map(DICT_COUNTRY_CODES).fillna('XX') + '76' + df['account_code'].str.replace('-', '')
+    df['num_statement'] = df.groupby('account').cumcount() // nb_lines_statement
+
+    list_text = []
+    for num, ((account, _), df_statement) in enumerate(df.groupby(['account', 'num_statement'], sort=False)):
+        statement_number = first_statement + num
+        start_date = df_statement['effective_date'].min().strftime('%y%m%d')
+        end_date = df_statement['effective_date'].max().strftime('%y%m%d')
+        list_text.append(f'{{1:F01BANKFRPPAXXX0000000000}}{{2:I940BANKFRPPXXXXN}}{{4:\n:20:STMT{statement_number:08d}\n'
+                         f':25:{account}\n:28C:{statement_number:05d}/1\n:60F:C{start_date}EUR0,00\n' +
+                         '\n'.join(df_statement['line_61'] + '\n' + df_statement['line_86']) +
+                         f'\n:62F:C{end_date}EUR0,00\n-}}')
+    return '\n'.join(list_text) + '\n'
+
+def write_mt940(dataset, path: str, nb_lines_statement: int = 1000) -> str:
+    """
+    Writes the MT940 lines of a dataset as an MT940 file, by chunks when the dataset is a folder of parquet files.
+
+    Parameters:
+        dataset (dict or str): Output of generate_dataset (dict of frames or folder of parquet files).
+        path (str): Path of the MT940 file.
+        nb_lines_statement (int): Maximum number of transactions per statement.
+
+    Returns:
+        str: path.
+    """
+    with open(path, 'w', encoding='latin-1') as file:
+        if isinstance(dataset, dict):
+            file.write(to_mt940_text(dataset['MT940'], nb_lines_statement))
+            return path
+        import pyarrow.parquet as pq
+        first_statement = 1
+        for batch in pq.ParquetFile(os.path.join(dataset, 'MT940.parquet')).iter_batches(batch_size=500000):
+            text = to_mt940_text(batch.to_pandas(), nb_lines_statement, first_statement)
+            first_statement += text.count(':20:')
+            file.write(text)
+    return path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nb_orders', type=int, default=10000)
+    parser.add_argument('--entity', default='ABCD', choices=['ABCD', 'XYZ'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk_size', type=int, default=500000)
+    parser.add_argument('--output_dir', required=True)
+    parser.add_argument('--mt940', action='store_true', help='Also writes the MT940 lines as an MT940 file')
+    args = parser.parse_args()
+    dict_paths = generate_dataset(args.nb_orders, args.entity, args.seed, args.chunk_size, args.output_dir)
+    if args.mt940:
+        dict_paths['MT940_file'] = write_mt940(args.output_dir, os.path.join(args.output_dir, 'statements.mt940'))
+    for name, path in dict_paths.items():
+        print(f'{name}: {path}')
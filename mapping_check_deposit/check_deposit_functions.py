@@ -0,0 +1,170 @@
+import pandas as pd
+import numpy as np
+from utils.utils import *
+from utils.instrumentation import *
+
+'''
+Matching of the MT940 check deposit lines (remises de chèques) with the deposit slips of the check deposit data,
+to give each check the id of the MT940 line it was credited with.
+    A deposit slip is the group of checks sharing a doc_num (or the same account and reception date without doc_num).
+    + Step 1: deposit number. The deposit_number read by clean_check_mt940 (BORDEREAU lines) is joined on doc_num,
+      both normalized with normalize_num_cheque (hash join).
+    + Step 2: date and amount. The other deposit lines are joined with the remaining slips of the same account and
+      total amount (hash join), the deposit date must be within nb_days after the reception date of the slip.
+    For both steps, the sum of the checks of the slip is compared with the amount of the deposit line.
+'''
+
+def group_checks_by_slip(df_cheque: pd.DataFrame, **kwargs) -> tuple:
+    """
+    Gives each check the key of its deposit slip and aggregates the checks by slip.
+
+    Parameters:
+        df_cheque (pd.DataFrame): Check deposit data.
+        **kwargs: Column names:
+            - check_amount_col: Amount of the check (default 'check_amount').
+            - reception_date_col: Reception date of the check (default 'reception_date').
+            - account_col: Product / account of the check (default 'account_num').
+
+    Returns:
+        tuple: (slip key of each check (pd.Series), pd.DataFrame of the slips with 'slip_key', 'doc_num', 'account_num',
+            'reception_date', 'checks_amount_cents', 'nb_checks_found')
+    """
+    check_amount_col = kwargs.get('check_amount_col', 'check_amount')
+    reception_date_col = kwargs.get('reception_date_col', 'reception_date')
+    account_col = kwargs.get('account_col', 'account_num')
+
+    reception_date = to_datetime64(df_cheque[reception_date_col])
+    if 'doc_num' in df_cheque.columns:
+        doc_num = normalize_num_cheque(df_cheque['doc_num'])
+    else:
+        doc_num = pd.Series(None, index=df_cheque.index, dtype=object)
+    # Checks without slip number: one slip per account and reception date
+    slip_key = doc_num.copy()
+    mask = doc_num.isnull()
+    slip_key[mask] = df_cheque.loc[mask, account_col].astype(str) + '|' + reception_date[mask].dt.strftime('%Y%m%d')
+
+    df_slip = pd.DataFrame({'slip_key': slip_key, 'doc_num': doc_num, 'account_num': df_cheque[account_col],
+                            'reception_date': reception_date, 'amount_cents': to_cents(df_cheque[check_amount_col])})
+    df_slip = df_slip.groupby('slip_key', as_index=False, sort=False).agg(
+        doc_num=('doc_num', 'first'), account_num=('account_num', 'first'), reception_date=('reception_date', 'max'),
+        checks_amount_cents=('amount_cents', 'sum'), nb_checks_found=('amount_cents', 'size'))
+    return slip_key, df_slip
+
+def prepare_deposit_lines(df_releve_cheque: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """
+    Returns the keys of the MT940 deposit lines used by the matching: 'id', 'account_num', 'deposit_key'
+    (normalized deposit_number), 'date_deposit' (deposit_date, or the date of the line when it is unknown),
+    'nb_checks' and 'amount_cents'.
+
+    Parameters:
+        df_releve_cheque (pd.DataFrame): Check deposit lines of the MT940 (output of clean_check_mt940).
+        **kwargs: Column names:
+            - id_releve: Id of the MT940 line (default 'id').
+            - amount_colname: Amount of the line (default 'amount').
+            - date_colname: Date of the line (default 'date').
+    """
+    id_releve = kwargs.get('id_releve', 'id')
+    amount_colname = kwargs.get('amount_colname', 'amount')
+    date_colname = kwargs.get('date_colname', 'date')
+
+    df_remise = pd.DataFrame({'id': df_releve_cheque[id_releve], 'account_num': df_releve_cheque['account_num']})
+    # The XYZ deposit lines only have a deposit_number, the ABCD ones a deposit_number or nb_checks and deposit_date
+    deposit_number = df_releve_cheque.get('deposit_number', pd.Series(None, index=df_releve_cheque.index))
+    df_remise['deposit_key'] = normalize_num_cheque(deposit_number)
+    deposit_date = df_releve_cheque.get('deposit_date', pd.Series(pd.NaT, index=df_releve_cheque.index))
+    df_remise['date_deposit'] = to_datetime64(deposit_date).fillna(to_datetime64(df_releve_cheque[date_colname]))
+    nb_checks = df_releve_cheque.get('nb_checks', pd.Series(None, index=df_releve_cheque.index))
+    df_remise['nb_checks'] = pd.to_numeric(nb_checks, errors='coerce')
+    df_remise['amount_cents'] = to_cents(df_releve_cheque[amount_colname])
+    return df_remise
+
+def match_deposit_number(df_remise: pd.DataFrame, df_slip: pd.DataFrame) -> pd.DataFrame:
+    """
+    Step 1: joins the deposit lines with a deposit number on the slip numbers. When a number is found in several
+    accounts, the slip of the same account then with the closest reception date is kept.
+
+    Returns:
+        pd.DataFrame: Pairs 'id' / 'slip_key'.
+    """
+    record = start_record('mapping_pass', 'deposit_number')
+    df_pairs = df_remise[df_remise['deposit_key'].notna()].merge(
+        df_slip[df_slip['doc_num'].notna()], left_on='deposit_key', right_on='doc_num', suffixes=('', '_slip'))
+    record['nb_candidate_pairs'] = len(df_pairs)
+    df_pairs['other_account'] = df_pairs['account_num'] != df_pairs['account_num_slip']
+    df_pairs['date_gap'] = (df_pairs['date_deposit'] - df_pairs['reception_date']).abs()
+    df_pairs = select_one_to_one(df_pairs, 'id', 'slip_key', ['other_account', 'date_gap'])
+    end_record(record, nb_matches=len(df_pairs))
+    return df_pairs[['id', 'slip_key']]
+
+def match_date_amount(df_remise: pd.DataFrame, df_slip: pd.DataFrame, nb_days: int = 5) -> pd.DataFrame:
+    """
+    Step 2: joins the deposit lines with the slips of the same account and the same total amount, the deposit date
+    being between the reception date of the slip and nb_days after it. The pairs with the same number of checks
+    then the closest dates are kept first.
+
+    Returns:
+        pd.DataFrame: Pairs 'id' / 'slip_key'.
+    """
+    record = start_record('mapping_pass', 'date_amount', nb_days=nb_days)
+    df_pairs = df_remise.merge(df_slip, left_on=['account_num', 'amount_cents'],
+                               right_on=['account_num', 'checks_amount_cents'])
+    record['nb_candidate_pairs'] = len(df_pairs)
+    df_pairs['date_gap'] = df_pairs['date_deposit'] - df_pairs['reception_date']
+    df_pairs = df_pairs[(df_pairs['date_gap'] >= pd.Timedelta(0)) & (df_pairs['date_gap'] <= pd.Timedelta(days=nb_days))]
+    df_pairs['other_nb_checks'] = df_pairs['nb_checks'].notna() & (df_pairs['nb_checks'] != df_pairs['nb_checks_found'])
+    df_pairs = select_one_to_one(df_pairs, 'id', 'slip_key', ['other_nb_checks', 'date_gap'])
+    end_record(record, nb_matches=len(df_pairs))
+    return df_pairs[['id', 'slip_key']]
+
+def master_mapping_check_deposit(df_releve_cheque: pd.DataFrame, df_cheque: pd.DataFrame, **kwargs) -> tuple:
+    """
+    Matches the MT940 check deposit lines with the deposit slips of the check deposit data: by deposit number,
+    then by account, total amount and date for the other lines (see the description of the module).
+
+    Parameters:
+        df_releve_cheque (pd.DataFrame): Check deposit lines of the MT940 (output of clean_check_mt940),
+            with 'account_num'.
+        df_cheque (pd.DataFrame): Check deposit data, with the product of the check in 'account_num'.
+        **kwargs: Additional keyword arguments:
+            - nb_days: Maximum number of days between the reception of the checks and the deposit (default 5).
+            - id_releve, amount_colname, date_colname: Columns of the MT940 lines (see prepare_deposit_lines).
+            - check_amount_col, reception_date_col, account_col: Columns of the checks (see group_checks_by_slip).
+
+    Returns:
+        tuple: (df_releve_cheque with the matched slip: 'doc_num', 'nb_checks_found', 'checks_amount',
+                'amount_difference' (line amount - sum of the checks), 'amount_ok', 'deposit_match',
+                df_cheque with 'deposit_id' (id of the MT940 line) and 'deposit_match')
+            'deposit_match' is 'deposit_number', 'date_amount' or None when not matched.
+    """
+    nb_days = kwargs.get('nb_days', 5)
+    id_releve = kwargs.get('id_releve', 'id')
+
+    record = start_record('reconciliation', 'master_mapping_check_deposit', nb_payments_in=len(df_releve_cheque),
+                          nb_checks_in=len(df_cheque))
+    slip_key, df_slip = group_checks_by_slip(df_cheque, **kwargs)
+    df_remise = prepare_deposit_lines(df_releve_cheque, **kwargs)
+
+    df_pairs_number = match_deposit_number(df_remise, df_slip)
+    df_pairs_date = match_date_amount(df_remise[~df_remise['id'].isin(df_pairs_number['id'])],
+                                      df_slip[~df_slip['slip_key'].isin(df_pairs_number['slip_key'])], nb_days)
+    df_pairs = pd.concat([df_pairs_number.assign(deposit_match='deposit_number'),
+                          df_pairs_date.assign(deposit_match='date_amount')], ignore_index=True)
+    df_pairs = df_pairs.merge(df_slip, on='slip_key')
+
+    # Deposit lines with their slip and the control of the sum of the checks
+    df_result = df_releve_cheque.merge(
+        df_pairs[['id', 'doc_num', 'nb_checks_found', 'checks_amount_cents', 'deposit_match']].rename(columns={'id': id_releve}),
+        on=id_releve, how='left')
+    amount_difference = to_cents(df_result[kwargs.get('amount_colname', 'amount')]) - df_result['checks_amount_cents']
+    df_result['checks_amount'] = from_cents(df_result.pop('checks_amount_cents').astype('Int64'))
+    df_result['amount_difference'] = from_cents(amount_difference.astype('Int64'))
+    df_result['amount_ok'] = (amount_difference == 0).fillna(False).astype(bool)
+
+    # Checks with the id of their deposit line
+    dict_deposit_id = dict(zip(df_pairs['slip_key'], df_pairs['id']))
+    dict_deposit_match = dict(zip(df_pairs['slip_key'], df_pairs['deposit_match']))
+    df_cheque = df_cheque.assign(deposit_id=slip_key.map(dict_deposit_id), deposit_match=slip_key.map(dict_deposit_match))
+
+    end_record(record, nb_matches=len(df_pairs), nb_amount_ok=int(df_result['amount_ok'].sum()),
+               nb_checks_matched=int(df_cheque['deposit_id'].notna().sum()))
+    return df_result, df_cheque
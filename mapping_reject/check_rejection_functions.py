@@ -0,0 +1,205 @@
+import pandas as pd
+import numpy as np
+from utils.utils import *
+from utils.instrumentation import *
+
+'''
+Matching of the rejected checks of the MT940 (CHECK CANCELED / CHECK NOT PAID debit lines) with the deposited checks.
+    The check number of a rejection is read from its texts and normalized with normalize_num_cheque, as the deposited
+    ones (without their leading zeros, padded to 8 digits).
+    + Step 1: exact. Hash join on check number and amount in cents, the deposited check with the closest date is kept
+      (sorted search with merge_asof).
+    + Step 2: typo. The other rejections are joined with the remaining checks of the same amount within nb_days, the
+      numbers may differ by one digit, two swapped adjacent digits, or one may be the beginning of the other
+      (truncated number of at least min_prefix_len digits).
+'''
+
+# Check number of a rejection: the digits after CHECK CANCELED / CHECK NOT PAID, or the first long number of a text
+pattern_rejected_check = r'CHECK (?:CANCELED|NOT PAID)\D*?(\d{5,})'
+pattern_check_number = r'(?<!\d)(\d{5,})(?!\d)'
+
+def find_rejected_check_number(df_rejet_cheque: pd.DataFrame, **kwargs) -> pd.Series:
+    """
+    Reads the check number of the rejections: after CHECK CANCELED / CHECK NOT PAID in transaction_details,
+    otherwise the first number of 5 digits or more of the columns of list_cols_check_number.
+
+    Parameters:
+        df_rejet_cheque (pd.DataFrame): Rejected checks of the MT940.
+        **kwargs: Additional keyword arguments:
+            - list_cols_check_number: Columns searched when the number is not after the rejection label
+              (default ['reference1', 'reference2', 'extra_information']).
+
+    Returns:
+        pd.Series: Check numbers normalized with normalize_num_cheque, None when not found.
+    """
+    list_cols_check_number = kwargs.get('list_cols_check_number', ['reference1', 'reference2', 'extra_information'])
+
+    check_number = df_rejet_cheque['transaction_details'].astype(object).str.extract(pattern_rejected_check)[0]
+    for col in list_cols_check_number:
+        if col in df_rejet_cheque.columns:
+            check_number = check_number.fillna(df_rejet_cheque[col].astype(object).str.extract(pattern_check_number)[0])
+    return normalize_num_cheque(check_number)
+
+def _digit_codes(values: np.ndarray, width: int) -> np.ndarray:
+    """
+    Returns the characters of the numbers (without leading zeros) as a (n, width) array of code points,
+    padded with 0 at the end.
+    """
+    values = np.array([value.lstrip('0') for value in values], dtype=f'U{max(width, 1)}')
+    return values.view(np.uint32).reshape(len(values), max(width, 1))
+
+def compare_check_numbers(numbers1: np.ndarray, numbers2: np.ndarray, min_prefix_len: int = 5) -> np.ndarray:
+    """
+    Compares pairs of check numbers (vectorized on the pairs), the leading zeros being ignored.
+
+    Parameters:
+        numbers1 (np.ndarray): First numbers of the pairs.
+        numbers2 (np.ndarray): Second numbers of the pairs.
+        min_prefix_len (int): Minimum number of digits of a truncated number.
+
+    Returns:
+        np.ndarray: Kind of difference of each pair: 0 same number, 1 one digit different, 2 two adjacent digits
+            swapped, 3 one number is the beginning of the other, -1 other numbers.
+    """
+    if len(numbers1) == 0:
+        return np.array([], dtype=np.int8)
+    len1 = np.array([len(value.lstrip('0')) for value in numbers1])
+    len2 = np.array([len(value.lstrip('0')) for value in numbers2])
+    width = int(max(len1.max(), len2.max()))
+    codes1, codes2 = _digit_codes(numbers1, width), _digit_codes(numbers2, width)
+
+    diff = codes1 != codes2
+    nb_diff = diff.sum(axis=1)
+    same_len = len1 == len2
+    # Two swapped digits: two differences at positions i and i+1, each digit found at the other position
+    first = diff.argmax(axis=1)
+    second = np.minimum(first + 1, width - 1)
+    rows = np.arange(len(codes1))
+    is_swap = (same_len & (nb_diff == 2) & diff[rows, second] &
+               (codes1[rows, first] == codes2[rows, second]) & (codes1[rows, second] == codes2[rows, first]))
+    # Truncated number: the shortest one is the beginning of the other
+    min_len = np.minimum(len1, len2)
+    is_prefix = (~same_len & (min_len >= min_prefix_len) &
+                 ~(diff & (np.arange(width) < min_len[:, None])).any(axis=1))
+    return np.select([same_len & (nb_diff == 0), same_len & (nb_diff == 1), is_swap, is_prefix],
+                     [0, 1, 2, 3], default=-1).astype(np.int8)
+
+def match_exact_check(df_rejet: pd.DataFrame, df_check: pd.DataFrame, list_by: list) -> pd.DataFrame:
+    """
+    Step 1: joins the rejections and the checks on list_by (check number, amount in cents and possibly product),
+    the check of the closest date being found by a sorted search. A check found by several rejections is kept
+    for the closest one.
+
+    Returns:
+        pd.DataFrame: Pairs 'reject_pos' / 'check_pos' with 'date_gap'.
+    """
+    record = start_record('mapping_pass', 'exact_check_number', list_by=list_by)
+    # Same key dtypes on both sides (merge_asof does not compare object and string columns)
+    dict_dtypes = {col: ('int64' if col == 'amount_cents' else object) for col in list_by}
+    df_left = df_rejet.dropna(subset=list_by + ['date']).astype(dict_dtypes).sort_values('date')
+    df_right = df_check.dropna(subset=list_by + ['check_date']).astype(dict_dtypes).sort_values('check_date')
+    df_pairs = pd.merge_asof(df_left, df_right[['check_pos', 'check_date'] + list_by], left_on='date',
+                             right_on='check_date', by=list_by, direction='nearest')
+    df_pairs = df_pairs[df_pairs['check_pos'].notna()].astype({'check_pos': 'int64'})
+    record['nb_candidate_pairs'] = len(df_pairs)
+    df_pairs['date_gap'] = (df_pairs['date'] - df_pairs['check_date']).abs()
+    df_pairs = select_one_to_one(df_pairs, 'reject_pos', 'check_pos', ['date_gap'])
+    end_record(record, nb_matches=len(df_pairs))
+    return df_pairs[['reject_pos', 'check_pos', 'date_gap']].assign(match_type='exact')
+
+def match_typo_check(df_rejet: pd.DataFrame, df_check: pd.DataFrame, nb_days: int = 365,
+                     min_prefix_len: int = 5) -> pd.DataFrame:
+    """
+    Step 2: joins the rejections and the checks of the same amount in cents (hash join) within nb_days, then keeps
+    the pairs whose check numbers are the same or differ by a typo or a truncation (see compare_check_numbers),
+    the smallest difference then the closest date first.
+
+    Returns:
+        pd.DataFrame: Pairs 'reject_pos' / 'check_pos' with 'date_gap' and 'match_type' ('exact', 'typo' or 'prefix').
+    """
+    record = start_record('mapping_pass', 'typo_check_number', nb_days=nb_days)
+    df_pairs = df_rejet.dropna(subset=['check_number', 'amount_cents']).merge(
+        df_check.dropna(subset=['check_number', 'amount_cents']), on='amount_cents', suffixes=('', '_check'))
+    df_pairs['date_gap'] = (df_pairs['date'] - df_pairs['check_date']).abs()
+    df_pairs = df_pairs[df_pairs['date_gap'] <= pd.Timedelta(days=nb_days)]
+    record['nb_candidate_pairs'] = len(df_pairs)
+    df_pairs['difference'] = compare_check_numbers(df_pairs['check_number'].to_numpy(dtype=object),
+                                                   df_pairs['check_number_check'].to_numpy(dtype=object),
+                                                   min_prefix_len)
+    df_pairs = df_pairs[df_pairs['difference'] >= 0]
+    df_pairs = select_one_to_one(df_pairs, 'reject_pos', 'check_pos', ['difference', 'date_gap'])
+    end_record(record, nb_matches=len(df_pairs))
+    df_pairs['match_type'] = np.select([df_pairs['difference'] == 0, df_pairs['difference'] == 3], ['exact', 'prefix'],
+                                       default='typo')
+    return df_pairs[['reject_pos', 'check_pos', 'date_gap', 'match_type']]
+
+def master_mapping_check_rejection(df_rejet_cheque: pd.DataFrame, df_cheque: pd.DataFrame, checknum_column: str,
+                                   checkamount_column: str, checkdate_column: str, checkproduct_column: str,
+                                   **kwargs) -> tuple:
+    """
+    Matches the rejected checks of the MT940 with the deposited checks: on check number and amount, then on amount
+    with a typo or truncation in the check number (see the description of the module).
+
+    Parameters:
+        df_rejet_cheque (pd.DataFrame): Rejected checks of the MT940 (Check_rejected of clean_data_mt940).
+        df_cheque (pd.DataFrame): Deposited checks.
+        checknum_column (str): Check number column of df_cheque.
+        checkamount_column (str): Check amount column of df_cheque.
+        checkdate_column (str): Check date column of df_cheque.
+        checkproduct_column (str): Product column of df_cheque, a check of the product of the rejection
+            (account_num) is kept first. Ignored if it is not in df_cheque.
+        **kwargs: Additional keyword arguments:
+            - amount_colname, date_colname: Amount and date columns of the rejections (default 'amount', 'date').
+            - nb_days: Maximum number of days between a check and its rejection for the typo step (default 365).
+            - min_prefix_len: Minimum number of digits of a truncated check number (default 5).
+            - list_cols_check_number: see find_rejected_check_number.
+
+    Returns:
+        tuple: (matched rejections with the columns of their check (suffix '_check' for the columns in both),
+                'rejected_check_number', 'match_type' ('exact', 'typo' or 'prefix') and 'date_gap_days',
+                unmatched rejections with 'rejected_check_number')
+    """
+    amount_colname = kwargs.get('amount_colname', 'amount')
+    date_colname = kwargs.get('date_colname', 'date')
+    nb_days = kwargs.get('nb_days', 365)
+    min_prefix_len = kwargs.get('min_prefix_len', 5)
+
+    record = start_record('reconciliation', 'master_mapping_check_rejection', nb_payments_in=len(df_rejet_cheque),
+                          nb_checks_in=len(df_cheque))
+    df_rejet_cheque = df_rejet_cheque.assign(rejected_check_number=find_rejected_check_number(df_rejet_cheque, **kwargs))
+    df_rejet = pd.DataFrame({'reject_pos': np.arange(len(df_rejet_cheque)),
+                             'check_number': df_rejet_cheque['rejected_check_number'].to_numpy(),
+                             'amount_cents': to_cents(df_rejet_cheque[amount_colname].abs()).reset_index(drop=True),
+                             'date': to_datetime64(df_rejet_cheque[date_colname]).reset_index(drop=True)})
+    df_check = pd.DataFrame({'check_pos': np.arange(len(df_cheque)),
+                             'check_number': normalize_num_cheque(df_cheque[checknum_column]).to_numpy(),
+                             'amount_cents': to_cents(df_cheque[checkamount_column]).reset_index(drop=True),
+                             'check_date': to_datetime64(df_cheque[checkdate_column]).reset_index(drop=True)})
+
+    # The checks of the product of the rejection first, when the same number and amount is in several products
+    list_pairs = []
+    if checkproduct_column in df_cheque.columns and 'account_num' in df_rejet_cheque.columns:
+        df_pairs = match_exact_check(df_rejet.assign(product=df_rejet_cheque['account_num'].to_numpy()),
+                                     df_check.assign(product=df_cheque[checkproduct_column].to_numpy()),
+                                     ['check_number', 'amount_cents', 'product'])
+        list_pairs.append(df_pairs)
+        df_rejet = df_rejet[~df_rejet['reject_pos'].isin(df_pairs['reject_pos'])]
+        df_check = df_check[~df_check['check_pos'].isin(df_pairs['check_pos'])]
+    df_pairs = match_exact_check(df_rejet, df_check, ['check_number', 'amount_cents'])
+    list_pairs.append(df_pairs)
+    df_rejet = df_rejet[~df_rejet['reject_pos'].isin(df_pairs['reject_pos'])]
+    df_check = df_check[~df_check['check_pos'].isin(df_pairs['check_pos'])]
+    list_pairs.append(match_typo_check(df_rejet, df_check, nb_days, min_prefix_len))
+    df_pairs = pd.concat(list_pairs, ignore_index=True).sort_values('reject_pos')
+
+    df_matched = df_rejet_cheque.iloc[df_pairs['reject_pos'].to_numpy()].reset_index(drop=True)
+    df_check_matched = df_cheque.iloc[df_pairs['check_pos'].to_numpy()].reset_index(drop=True)
+    df_check_matched.columns = [col + '_check' if col in df_matched.columns else col for col in df_check_matched.columns]
+    df_matched = pd.concat([df_matched, df_check_matched], axis=1)
+    df_matched['match_type'] = df_pairs['match_type'].to_numpy()
+    df_matched['date_gap_days'] = df_pairs['date_gap'].dt.days.to_numpy()
+
+    mask_unmatched = ~np.isin(np.arange(len(df_rejet_cheque)), df_pairs['reject_pos'].to_numpy())
+    df_unmatched = df_rejet_cheque[mask_unmatched]
+    end_record(record, nb_matches=len(df_matched), nb_unmatched=len(df_unmatched))
+    return df_matched, df_unmatched
@@ -1,8 +1,349 @@
 import pandas as pd
-import sqlite3
+import numpy as np
+from typing import Tuple
 from utils.utils import *
+from utils.instrumentation import *
 from mapping_transfer_check.duplicates_functions import *
 
+def _as_int64_dates(values: pd.Series) -> np.ndarray:
+    """
+    Converts a date column to an int64 array (nanoseconds since epoch) for sorted comparisons.
+    Missing dates are returned as the minimum int64 value and must be masked by the caller.
+    """
+    return to_datetime64(values).to_numpy().view('int64')
+
+def _expand_ranges(lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Expands the half-open ranges [lo[i], hi[i]) into flat (row, position) arrays.
+
+    Parameters:
+    - lo (np.ndarray): Start of each range.
+    - hi (np.ndarray): End of each range (excluded).
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Row number of each range and the positions it covers.
+    """
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    rows = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, np.repeat(lo, counts) + offsets
+
+def interval_join_positions(
+    df_payment: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    amount_colname: str = None,
+    date_colname: str = None,
+    amount_threshold: float = 5.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds all (payment, order) pairs whose payment date falls in [Start_Date, End_Date] of the order
+    and whose amounts are compatible, without going through SQL.
+
+    The BO table is sorted once on the amount (or on Start_Date when the amount is not bounded)
+    and each payment gets its candidate range with a binary search, so the cost is
+    O((n + m) log m + k) where k is the number of candidates to check.
+
+    Parameters:
+    - df_payment (pd.DataFrame): DataFrame containing payment data.
+    - df_BO (pd.DataFrame): DataFrame containing BO orders/contracts with Start_Date and End_Date.
+    - amount_colname (str): Column name for amounts in the payment table.
+    - date_colname (str): Column name for dates in the payment table.
+    - amount_threshold (float): Threshold for the difference in amount, in the unit of the amounts (cents
+      when both amount columns are int64). -1000 means the payment amount only has to be lower or equal to
+      the order amount.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Row positions in df_payment and df_BO of the matched pairs,
+      sorted by payment position then BO position.
+    """
+    empty = np.array([], dtype='int64')
+    if df_payment.empty or df_BO.empty:
+        return empty, empty
+
+    pay_date = _as_int64_dates(df_payment[date_colname])
+    bo_start = _as_int64_dates(df_BO['Start_Date'])
+    bo_end = _as_int64_dates(df_BO['End_Date'])
+    # Amounts in integer cents are compared as integers, the others as floats
+    is_cents = df_payment[amount_colname].dtype == 'int64' and df_BO['total_amount'].dtype == 'int64'
+    if is_cents:
+        pay_amount = df_payment[amount_colname].to_numpy()
+        bo_amount = df_BO['total_amount'].to_numpy()
+        pay_notnull = np.ones(len(pay_amount), dtype=bool)
+        bo_notnull = np.ones(len(bo_amount), dtype=bool)
+    else:
+        pay_amount = df_payment[amount_colname].to_numpy(dtype='float64', na_value=np.nan)
+        bo_amount = df_BO['total_amount'].to_numpy(dtype='float64', na_value=np.nan)
+        pay_notnull = ~np.isnan(pay_amount)
+        bo_notnull = ~np.isnan(bo_amount)
+
+    # Rows with a missing value can never satisfy the join condition (NULL semantics)
+    nat = np.iinfo('int64').min
+    pay_valid = np.flatnonzero((pay_date != nat) & pay_notnull)
+    bo_valid = np.flatnonzero((bo_start != nat) & (bo_end != nat) & bo_notnull)
+    if len(pay_valid) == 0 or len(bo_valid) == 0:
+        return empty, empty
+
+    if amount_threshold != -1000:
+        # Search on the amount: orders within [amount - threshold, amount + threshold]
+        order = bo_valid[np.argsort(bo_amount[bo_valid], kind='stable')]
+        sorted_amount = bo_amount[order]
+        tolerance = 0 if is_cents else 1e-9 * max(1.0, float(np.nanmax(np.abs(sorted_amount))))
+        lo = np.searchsorted(sorted_amount, pay_amount[pay_valid] - amount_threshold - tolerance, side='left')
+        hi = np.searchsorted(sorted_amount, pay_amount[pay_valid] + amount_threshold + tolerance, side='right')
+    else:
+        # Search on the date: only orders starting at most max(End_Date - Start_Date) before the payment
+        order = bo_valid[np.argsort(bo_start[bo_valid], kind='stable')]
+        sorted_start = bo_start[order]
+        max_width = int((bo_end[bo_valid] - bo_start[bo_valid]).max())
+        lo = np.searchsorted(sorted_start, pay_date[pay_valid] - max(max_width, 0), side='left')
+        hi = np.searchsorted(sorted_start, pay_date[pay_valid], side='right')
+
+    rows, positions = _expand_ranges(lo, hi)
+    left = pay_valid[rows]
+    right = order[positions]
+
+    # Exact filter on both conditions
+    mask = (pay_date[left] >= bo_start[right]) & (pay_date[left] <= bo_end[right])
+    if amount_threshold != -1000:
+        mask &= np.abs(pay_amount[left] - bo_amount[right]) <= amount_threshold
+    else:
+        mask &= pay_amount[left] <= bo_amount[right]
+    left, right = left[mask], right[mask]
+
+    # Same row order as a nested loop join: payments first, then orders
+    sort_idx = np.lexsort((right, left))
+    return left[sort_idx], right[sort_idx]
+
+def exact_match_positions(
+    df_payment: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    clientname_col: str = None,
+    date_colname: str = None,
+    amount_colname: str = None,
+    amount_threshold: float = 5.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the (payment, order) pairs with the same name, the same product, compatible amounts and the payment
+    date in [Start_Date, End_Date], with a hash join on (name, product, amount bucket in cents).
+    The buckets are amount_threshold wide, so the compatible orders are in the bucket of the payment or in the
+    two next to it. Only the unambiguous pairs are returned: the payment and the order have no other candidate.
+
+    Parameters:
+    - df_payment (pd.DataFrame): DataFrame containing payment data, with the 'account_num' product column.
+    - df_BO (pd.DataFrame): DataFrame containing BO orders/contracts with Start_Date and End_Date.
+    - clientname_col (str): Column name for client names in the payment table.
+    - date_colname (str): Column name for dates in the payment table.
+    - amount_colname (str): Column name for amounts in the payment table.
+    - amount_threshold (float): Acceptance threshold for the amount difference (in cents for amounts in cents).
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Row positions in df_payment and df_BO of the matched pairs, sorted by payment position.
+    """
+    empty = np.array([], dtype='int64')
+    if df_payment.empty or df_BO.empty:
+        return empty, empty
+
+    # Amounts already in integer cents (see to_cents) are used as they are, with a threshold in cents
+    is_cents = df_payment[amount_colname].dtype == 'int64' and df_BO['total_amount'].dtype == 'int64'
+    factor = 1 if is_cents else 100
+    threshold_cents = int(round(max(amount_threshold, 0) * factor))
+    width = max(threshold_cents, 1)
+    df_pay = pd.DataFrame({
+        'pos_payment': np.arange(len(df_payment)),
+        'name': df_payment[clientname_col].to_numpy(dtype=object),
+        'product': df_payment['account_num'].to_numpy(dtype=object),
+        'cents': (df_payment[amount_colname].astype('float64') * factor).round(),
+        'date': to_datetime64(df_payment[date_colname]).to_numpy()
+    })
+    df_ord = pd.DataFrame({
+        'pos_BO': np.arange(len(df_BO)),
+        'name': df_BO['subscriber_name'].to_numpy(dtype=object),
+        'product': df_BO['product_code'].to_numpy(dtype=object),
+        'cents_BO': (df_BO['total_amount'].astype('float64') * factor).round(),
+        'Start_Date': to_datetime64(df_BO['Start_Date']).to_numpy(),
+        'End_Date': to_datetime64(df_BO['End_Date']).to_numpy()
+    })
+    # Same filters as the fuzzy path on the names, rows with a missing key can't match
+    df_pay = df_pay[df_pay['name'].map(lambda name: isinstance(name, str) and len(name) >= 4).astype(bool)]
+    df_pay = df_pay.dropna(subset=['product', 'cents', 'date'])
+    df_ord = df_ord.dropna(subset=['name', 'product', 'cents_BO', 'Start_Date', 'End_Date'])
+    if df_pay.empty or df_ord.empty:
+        return empty, empty
+    df_pay['bucket'] = (df_pay['cents'] // width).astype('int64')
+    df_ord['bucket'] = (df_ord['cents_BO'] // width).astype('int64')
+
+    # Hash join on the key with the neighbouring buckets, then exact check of the amount and the date
+    df_pay = pd.concat([df_pay.assign(bucket=df_pay['bucket'] + shift) for shift in [-1, 0, 1]])
+    df_pairs = df_pay.merge(df_ord, on=['name', 'product', 'bucket'])
+    mask = ((df_pairs['cents'] - df_pairs['cents_BO']).abs() <= threshold_cents) & \
+           (df_pairs['date'] >= df_pairs['Start_Date']) & (df_pairs['date'] <= df_pairs['End_Date'])
+    df_pairs = df_pairs[mask]
+
+    # Unambiguous pairs only, the others are left to the fuzzy path and its duplicates handling
+    df_pairs = df_pairs[~df_pairs.duplicated(subset='pos_payment', keep=False) &
+                        ~df_pairs.duplicated(subset='pos_BO', keep=False)].sort_values('pos_payment')
+    return df_pairs['pos_payment'].to_numpy(dtype='int64'), df_pairs['pos_BO'].to_numpy(dtype='int64')
+
+def assemble_left_join(
+    df_payment: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    left: np.ndarray,
+    right: np.ndarray
+) -> pd.DataFrame:
+    """
+    Builds the LEFT JOIN result (payment columns then BO columns) from matched row positions.
+    Payments without any matched order are kept once with empty BO columns.
+
+    Parameters:
+    - df_payment (pd.DataFrame): DataFrame containing payment data.
+    - df_BO (pd.DataFrame): DataFrame containing BO orders/contracts.
+    - left (np.ndarray): Row positions in df_payment, sorted.
+    - right (np.ndarray): Row positions in df_BO.
+
+    Returns:
+    - pd.DataFrame: DataFrame containing matched payments and orders.
+    """
+    unmatched = np.setdiff1d(np.arange(len(df_payment)), left, assume_unique=False)
+    all_left = np.concatenate([left, unmatched])
+    all_right = np.concatenate([right, np.full(len(unmatched), -1, dtype='int64')])
+    sort_idx = np.argsort(all_left, kind='stable')
+    all_left, all_right = all_left[sort_idx], all_right[sort_idx]
+
+    df_left = df_payment.iloc[all_left].reset_index(drop=True)
+    df_right = df_BO.reset_index(drop=True).reindex(pd.Index(all_right)).reset_index(drop=True)
+    return pd.concat([df_left, df_right], axis=1)
+
+def create_candidate_store() -> dict:
+    """
+    Creates an empty store of date/amount candidate pairs shared by the passes of one run.
+
+    Returns:
+    - dict: Store with the cached joins ('entries') and the 'hits' / 'misses' counters.
+    """
+    return {'entries': {}, 'hits': 0, 'misses': 0}
+
+def prime_candidate_store(
+    candidate_store: dict,
+    df_payment: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    amount_colname: str = None,
+    date_colname: str = None,
+    amount_threshold: float = 5.0,
+    payment_id: str = None
+) -> dict:
+    """
+    Runs the full date/amount join once and keeps the pairs as (payment row, order row) of the
+    given tables, so that later passes on subsets of these tables can reuse them.
+    Nothing is stored if the payment ids or order ids are not unique, or if there is no payment column.
+
+    Parameters:
+    - candidate_store (dict): Store created by create_candidate_store.
+    - df_payment (pd.DataFrame): Full payment table of the run.
+    - df_BO (pd.DataFrame): Full BO table of the run, with Start_Date and End_Date.
+    - amount_colname (str): Column name for amounts in the payment table.
+    - date_colname (str): Column name for dates in the payment table.
+    - amount_threshold (float): Threshold for the difference in amount.
+    - payment_id (str): Column name for payment IDs in the payment table.
+
+    Returns:
+    - dict: The updated store.
+    """
+    # (an empty payment table left by the previous passes has no columns)
+    if payment_id is None or payment_id not in df_payment.columns or not df_payment[payment_id].is_unique or \
+            not df_BO['order_id'].is_unique:
+        return candidate_store
+
+    left, right = interval_join_positions(df_payment, df_BO, amount_colname, date_colname, amount_threshold)
+    key = (payment_id, date_colname, amount_colname, amount_threshold)
+    candidate_store['entries'][key] = {
+        'payment_index': pd.Index(df_payment[payment_id], tupleize_cols=False),
+        'payment_values': (_as_int64_dates(df_payment[date_colname]),
+                           df_payment[amount_colname].to_numpy(dtype='float64', na_value=np.nan)),
+        'BO_index': pd.Index(df_BO['order_id'], tupleize_cols=False),
+        'BO_values': (_as_int64_dates(df_BO['Start_Date']),
+                      _as_int64_dates(df_BO['End_Date']),
+                      df_BO['total_amount'].to_numpy(dtype='float64', na_value=np.nan)),
+        'pairs': (left, right)
+    }
+    return candidate_store
+
+def _subset_positions(base_index: pd.Index, base_values: tuple, ids: pd.Series, values: tuple) -> np.ndarray:
+    """
+    Returns the position in the primed table of each row of a subset table,
+    or None if one row is unknown or its join columns have changed.
+    """
+    if not ids.is_unique:
+        return None
+    positions = base_index.get_indexer(pd.Index(ids, tupleize_cols=False))
+    if (positions < 0).any():
+        return None
+    for base, current in zip(base_values, values):
+        base = base[positions]
+        same = (base == current)
+        if base.dtype.kind == 'f':
+            same |= np.isnan(base) & np.isnan(current)
+        if not same.all():
+            return None
+    return positions
+
+def lookup_candidate_store(
+    candidate_store: dict,
+    df_payment: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    amount_colname: str = None,
+    date_colname: str = None,
+    amount_threshold: float = 5.0,
+    payment_id: str = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Answers a date/amount join from the store when both tables are subsets of the primed tables
+    (same ids and same join values), by filtering the cached pairs on the rows still to process.
+    Updates the 'hits' / 'misses' counters of the store.
+
+    Parameters:
+    - candidate_store (dict): Store created by create_candidate_store.
+    - df_payment (pd.DataFrame): Payments still to process.
+    - df_BO (pd.DataFrame): BO orders still to process.
+    - amount_colname (str): Column name for amounts in the payment table.
+    - date_colname (str): Column name for dates in the payment table.
+    - amount_threshold (float): Threshold for the difference in amount.
+    - payment_id (str): Column name for payment IDs in the payment table.
+
+    Returns:
+    - Tuple[np.ndarray, np.ndarray]: Row positions in df_payment and df_BO of the matched pairs,
+      or None if the join can't be answered from the store.
+    """
+    entry = candidate_store['entries'].get((payment_id, date_colname, amount_colname, amount_threshold))
+    pay_positions = bo_positions = None
+    if entry is not None and payment_id in df_payment.columns:
+        pay_positions = _subset_positions(entry['payment_index'], entry['payment_values'], df_payment[payment_id],
+                                          (_as_int64_dates(df_payment[date_colname]),
+                                           df_payment[amount_colname].to_numpy(dtype='float64', na_value=np.nan)))
+    if pay_positions is not None:
+        bo_positions = _subset_positions(entry['BO_index'], entry['BO_values'], df_BO['order_id'],
+                                         (_as_int64_dates(df_BO['Start_Date']),
+                                          _as_int64_dates(df_BO['End_Date']),
+                                          df_BO['total_amount'].to_numpy(dtype='float64', na_value=np.nan)))
+    if bo_positions is None:
+        candidate_store['misses'] += 1
+        return None
+
+    # Map positions in the primed tables to positions in the current tables
+    pay_map = np.full(len(entry['payment_index']), -1, dtype='int64')
+    pay_map[pay_positions] = np.arange(len(pay_positions))
+    bo_map = np.full(len(entry['BO_index']), -1, dtype='int64')
+    bo_map[bo_positions] = np.arange(len(bo_positions))
+
+    base_left, base_right = entry['pairs']
+    left, right = pay_map[base_left], bo_map[base_right]
+    mask = (left >= 0) & (right >= 0)
+    left, right = left[mask], right[mask]
+    sort_idx = np.lexsort((right, left))
+
+    candidate_store['hits'] += 1
+    return left[sort_idx], right[sort_idx]
+
 def mapping_approximately(
     df_payment: pd.DataFrame,
     df_BO: pd.DataFrame,
@@ -20,46 +361,40 @@ def mapping_approximately(
     - amount_colname (Optional[str]): Column name for amounts in the payment table.
     - date_colname (Optional[str]): Column name for dates in the payment table.
     - amount_threshold (float): Threshold for the difference in amount. Default is 5.0.
-    - kwargs: Additional optional parameters.
+    - kwargs: Additional optional parameters:
+        - candidate_store (dict): Store of candidate pairs shared across passes (see create_candidate_store).
+        - payment_id (str): Column name for payment IDs, needed to look up the store.
 
     Returns:
     - pd.DataFrame: DataFrame containing matched payments and orders.
     """
-    with sqlite3.connect(':memory:') as conn:
-        # Write DataFrames to SQL tables
-        df_payment.to_sql('releve', conn, index=False)
-        df_BO.to_sql('BO', conn, index=False)
-        
-        # Construct base query for matching dates
-        base_query = f"""
-            SELECT *
-            FROM releve
-            LEFT JOIN BO ON (
-                releve.{date_colname} BETWEEN BO.Start_Date AND BO.End_Date
-        """
-        
-        # Add amount condition to the query
-        if amount_threshold != -1000:
-            query = f"""
-                {base_query}
-                AND ABS(releve.{amount_colname} - BO.total_amount) <= ?
-            )
-            """
-            # Execute query with amount threshold parameter
-            df_match = pd.read_sql_query(query, conn, params=[amount_threshold])
-        else:
-            query = f"""
-                {base_query}
-                AND releve.{amount_colname} <= BO.total_amount
-            )
-            """
-            # Execute query without amount threshold parameter
-            df_match = pd.read_sql_query(query, conn)
+    candidate_store = kwargs.get('candidate_store')
+    payment_id = kwargs.get('payment_id')
+
+    # Reuse the candidate pairs of the run when the tables are subsets of the primed tables
+    positions = None
+    if candidate_store is not None and not df_payment.empty and not df_BO.empty:
+        positions = lookup_candidate_store(candidate_store, df_payment, df_BO, amount_colname, date_colname,
+                                           amount_threshold, payment_id)
+
+    # Sorted interval join on Start_Date/End_Date and the amount, then LEFT JOIN assembly
+    if positions is None:
+        positions = interval_join_positions(df_payment, df_BO, amount_colname, date_colname, amount_threshold)
+    left, right = positions
+    df_match = assemble_left_join(df_payment, df_BO, left, right)
     
     return df_match
 
 
 
+def log_candidates(candidate_log: dict, df_match: pd.DataFrame, payment_id: str) -> None:
+    """
+    Adds the payment ids and order ids of the candidate pairs to candidate_log (nothing if it is None).
+    """
+    if candidate_log is not None:
+        candidate_log.setdefault(payment_id, set()).update(df_match[payment_id])
+        candidate_log.setdefault('order_id', set()).update(df_match['order_id'])
+
 def rapprocher_paiement_bo_basic(
     df_payment: pd.DataFrame,
     df_rebo_ordre_vir: pd.DataFrame,
@@ -86,21 +421,38 @@ def rapprocher_paiement_bo_basic(
     - payment_id (str): Column name for payment IDs in the payment table.
     - amount_threshold (float): Acceptance threshold for the amount difference.
     - min_score (int): Minimum similarity score for name matching.
-    - kwargs: Additional optional parameters for the mapping functions.
+    - kwargs: Additional optional parameters for the mapping functions:
+        - candidate_store (dict): Store of candidate pairs shared across passes.
+        - blocking (str): 'exact' or 'token' to prune the pairs of names before the fuzzy score (see
+          prune_name_pairs), None (default) scores every pair.
+        - candidate_log (dict): If given, the payment ids and order ids having at least one candidate
+          with a sufficient score are added to candidate_log[payment_id] and candidate_log['order_id'].
 
     Returns:
     - pd.DataFrame: DataFrame containing matched payments and orders.
     """
+    record = start_record('approximate', 'rapprocher_paiement_bo_basic', clientname_col=clientname_col,
+                          nb_payments_in=len(df_payment), nb_orders_in=len(df_rebo_ordre_vir))
+
     # Step 1: SQL code to take transactions with the same amount and close dates
-    df_match = mapping_approximately(df_payment, df_rebo_ordre_vir, amount_colname, date_colname, amount_threshold)
+    df_match = mapping_approximately(df_payment, df_rebo_ordre_vir, amount_colname, date_colname, amount_threshold,
+                                     payment_id=payment_id, candidate_store=kwargs.get('candidate_store'))
+    record['nb_candidate_pairs'] = int(df_match['order_id'].notna().sum())
 
     # Step 2: Calculate the fuzzy score on the obtained result
     df_match = df_match[~df_match[clientname_col].isnull() & ~df_match['subscriber_name'].isnull()]
     df_match = df_match[df_match[clientname_col].str.len() >= 4]
 
+    # Blocking: drop the pairs of names that cannot reach min_score before scoring them
+    if kwargs.get('blocking') and len(df_match) > 0:
+        df_match = df_match[prune_name_pairs(df_match[clientname_col], df_match['subscriber_name'], min_score,
+                                             kwargs.get('blocking'))]
+
+    record['nb_pairs_scored'] = len(df_match)
     if len(df_match) > 0:
-        df_match = calculate_fuzz_score(df_match, clientname_col, 'subscriber_name')
+        df_match = calculate_fuzz_score(df_match, clientname_col, 'subscriber_name', score_cutoff=min_score)
         df_match = df_match[df_match["max_score"] >= min_score].reset_index(names='id_unique')
+        log_candidates(kwargs.get('candidate_log'), df_match, payment_id)
 
         # Step 3: Handle duplicates
         # 3.1 Separate duplicates
@@ -116,7 +468,10 @@ def rapprocher_paiement_bo_basic(
         columns_right = list(df_rebo_ordre_vir.columns)
         id_left = payment_id
         id_right = 'order_id'
-        df_merge = merge_duplicates_by_date(df_duplicates, columns_left, columns_right, id_left, id_right, amount_colname, date_colname, clientname_col)
+        df_merge = merge_duplicates_by_date(df_duplicates, columns_left=columns_left, columns_right=columns_right,
+                                            id_left=id_left, id_right=id_right, amount_colname=amount_colname,
+                                            date_colname=date_colname, clientname_col=clientname_col,
+                                            amount_threshold=amount_threshold)
 
         # 3.3 Concatenate the result
         if len(df_merge) > 0:
@@ -126,6 +481,7 @@ def rapprocher_paiement_bo_basic(
 
         df_match = df_match.drop(columns=['id_unique', 'max_score'])
 
+    end_record(record, nb_matches=len(df_match))
     return df_match
 
 def create_light_check(
@@ -152,22 +508,29 @@ def create_light_check(
         payment_id (Optional[str]): Column name for payment ID in df_payment.
         amount_threshold (float): Threshold amount for matching. Default is 5.0.
         bo_name_col (str): Column name for subscriber name in df_BO. Default is 'subscriber_name'.
-        kwargs: Additional optional parameters.
+        kwargs: Additional optional parameters (candidate_store, candidate_log as in rapprocher_paiement_bo_basic).
     
     Returns:
         pd.DataFrame: DataFrame containing the matched records.
     """
     
+    record = start_record('approximate', 'create_light_check', clientname_col=clientname_col,
+                          nb_payments_in=len(df_payment), nb_orders_in=len(df_BO))
+
     # Perform approximate mapping based on date and amount
-    df_match = mapping_approximately(df_payment, df_BO, amount_colname, date_colname, amount_threshold, **kwargs)
+    df_match = mapping_approximately(df_payment, df_BO, amount_colname, date_colname, amount_threshold,
+                                     payment_id=payment_id, candidate_store=kwargs.get('candidate_store'))
+    record['nb_candidate_pairs'] = int(df_match['order_id'].notna().sum())
     
     # Filter matches to find common client names
     mask = (~df_match['order_id'].isnull()) & (~df_match[clientname_col].isnull())
     df_match = df_match.loc[mask, :]
+    record['nb_pairs_scored'] = len(df_match)
     
     if not df_match.empty:
-        df_match['nom_commun'] = df_match.apply(lambda f: find_commun_word(f[clientname_col], f[bo_name_col]), axis=1)
+        df_match['nom_commun'] = find_commun_word_series(df_match[clientname_col], df_match[bo_name_col])
         df_match = df_match[df_match['nom_commun'] == True].reset_index(names='id_unique')
+        log_candidates(kwargs.get('candidate_log'), df_match, payment_id)
 
         # Handle duplicates
         df_duplicates1 = df_match[df_match.duplicated(subset=payment_id, keep=False)]
@@ -180,14 +543,14 @@ def create_light_check(
         for i in range(5):  # There are max 5 duplicate payments
             df_merge = merge_duplicates_by_date(
                 df_duplicates,
-                list(df_payment.columns),
-                list(df_BO.columns),
-                payment_id,
-                'order_id',
-                amount_colname,
-                date_colname,
-                clientname_col,
-                **kwargs
+                columns_left=list(df_payment.columns),
+                columns_right=list(df_BO.columns),
+                id_left=payment_id,
+                id_right='order_id',
+                amount_colname=amount_colname,
+                date_colname=date_colname,
+                clientname_col=clientname_col,
+                amount_threshold=amount_threshold
             )
             df_duplicates_matched = pd.concat([df_duplicates_matched, df_merge])
             df_duplicates = df_duplicates[~df_duplicates['order_id'].isin(df_duplicates_matched['order_id'])]
@@ -197,5 +560,6 @@ def create_light_check(
     else:
         df_match = pd.DataFrame()
     
+    end_record(record, nb_matches=len(df_match))
     return df_match
 
@@ -22,6 +22,69 @@ The general idea: we will progressively populate the df_rapproche dataframe with
         + min_score: Minimum accepted percentage for the similarity score
 '''
 
+def get_exact_match_stats(list_records: list) -> dict:
+    """
+    Returns the number of payments matched by mapping_exact_match in a run, from the records of the run
+    (collected with memory_sink, or the 'Instrumentation' of master_project). The records of the process pool
+    workers are emitted again in the calling process, so the count also covers n_workers and parallel_ownership.
+
+    Parameters:
+        list_records (list): Instrumentation records of the run.
+
+    Returns:
+        dict: 'hits', the number of payments matched by the exact pass.
+    """
+    return {'hits': sum(record.get('nb_matches', 0) for record in list_records
+                        if record.get('event') == 'mapping_pass' and record.get('name') == 'exact_match')}
+
+def mapping_exact_match(
+    df_rapproche: pd.DataFrame,
+    df_payment: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    list_cols_Clientname: List[str],
+    **kwargs
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Fast path before the fuzzy matching: matches the payments having exactly one BO order with the same name,
+    the same product, a compatible amount and date (see exact_match_positions), flagged with the motif 'exact_match'.
+
+    Parameters:
+    - df_rapproche (pd.DataFrame): DataFrame containing matched records.
+    - df_payment (pd.DataFrame): DataFrame containing payment records.
+    - df_BO (pd.DataFrame): DataFrame containing BO order records.
+    - list_cols_Clientname (List[str]): List of customer name columns to use for matching in the payment DataFrame.
+    - kwargs: Additional optional parameters for matching:
+        - date_colname (Optional[str]): Name of the date column.
+        - amount_colname (Optional[str]): Name of the amount column.
+        - payment_id (Optional[str]): Name of the payment ID column.
+        - amount_threshold (int): Threshold amount for matching (default is 5).
+
+    Returns:
+    - Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: Updated DataFrames for matched records, remaining payments, and remaining BO orders.
+    """
+    date_colname = kwargs.get('date_colname')
+    amount_colname = kwargs.get('amount_colname')
+    payment_id = kwargs.get('payment_id')
+    amount_threshold = kwargs.get('amount_threshold', 5)
+
+    record = start_record('mapping_pass', 'exact_match', nb_payments_in=len(df_payment), nb_orders_in=len(df_BO))
+    nb_matches = 0
+    for clientname_col in list_cols_Clientname:
+        left, right = exact_match_positions(df_payment, df_BO, clientname_col, date_colname, amount_colname,
+                                            amount_threshold)
+        if len(left) == 0:
+            continue
+        df_match = assemble_left_join(df_payment.iloc[left], df_BO, np.arange(len(left)), right)
+        df_match['motif'] = 'exact_match'
+        df_rapproche = pd.concat([df_rapproche, df_match], ignore_index=True)
+        nb_matches += len(df_match)
+
+        df_payment = df_payment[~df_payment[payment_id].isin(df_match[payment_id])]
+        df_BO = df_BO[~df_BO['order_id'].isin(df_match['order_id'])]
+
+    end_record(record, nb_matches=nb_matches)
+    return df_rapproche, df_payment, df_BO
+
 def mapping_unique_payment(
     df_rapproche: pd.DataFrame,
     df_payment: pd.DataFrame,
@@ -46,6 +109,7 @@ def mapping_unique_payment(
         - motif (Optional[str]): Motif to add to the matched records.
         - amount_threshold (int): Threshold amount for matching (default is 5).
         - min_score (int): Minimum score for matching (default is 90).
+        - candidate_store (dict): Store of date/amount candidate pairs shared across passes.
 
     Returns:
     - Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: Updated DataFrames for matched records, remaining payments, and remaining BO orders.
@@ -61,7 +125,7 @@ def mapping_unique_payment(
     for clientname_col in list_cols_Clientname:
         df_match = rapprocher_paiement_bo_basic(
             df_payment, df_BO, clientname_col, date_colname, amount_colname, payment_id,
-            amount_threshold, min_score
+            amount_threshold, min_score, candidate_store=kwargs.get('candidate_store'), blocking=kwargs.get('blocking')
         )
         df_match['motif'] = motif
         df_rapproche = pd.concat([df_rapproche, df_match], ignore_index=True)
@@ -100,6 +164,8 @@ def mapping_npaiement_1ord(
         - amount_threshold (float): Acceptance threshold on the amount for matching.
         - min_score (int): Minimum accepted percentage for the similarity score.
         - is_lightcheck (bool): Flag to indicate if a light check should be performed.
+        - incremental_windows (bool): Only match again the aggregates which changed since the previous window size
+          or had candidates there (default True), same result. False matches every aggregate at every window size.
 
     Returns:
     - Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: Updated DataFrames for matched records, remaining payments, and remaining BO orders.
@@ -113,6 +179,7 @@ def mapping_npaiement_1ord(
     amount_threshold = kwargs.get('amount_threshold', 5)
     min_score = kwargs.get('min_score', 90)
     is_lightcheck = kwargs.get('is_lightcheck', False)
+    incremental_windows = kwargs.get('incremental_windows', True)
 
     # Calculate the number of days to aggregate
     nbdays_agreges = int(nb_days_period / 2)
@@ -120,29 +187,40 @@ def mapping_npaiement_1ord(
         date_colname_2 = 'Max_' + date_colname
         amount_colname_2 = amount_colname + '_total'
         step = 2
+        agg_kwargs = {'payment_id': payment_id, 'clientname_col': clientname_col,
+                      'date_colname': date_colname, 'amount_colname': amount_colname}
+        # Same-day aggregation done once, each window size only recomputes the windows
+        prepared = prepare_aggregation(df_payment, **agg_kwargs)
+        df_payment_agg_previous, candidate_log = None, {}
         for nb_days in np.arange(4, nbdays_agreges + step, step=step):
             # Aggregate payment data by date interval
-            df_payment_agg = aggregate_by_date(df_payment, payment_id, clientname_col, date_colname, amount_colname, nb_days)
+            df_payment_agg = aggregate_prepared(prepared, nb_days)
+            if incremental_windows:
+                df_payment_agg, df_payment_agg_previous = get_changed_aggregates(
+                    df_payment_agg, df_payment_agg_previous, candidate_log.get(payment_id), **agg_kwargs), df_payment_agg
+                candidate_log = {}
             if len(df_payment_agg) > 0:
                 # Match with the aggregated payment
                 if is_lightcheck:
-                    df_match = create_light_check(df_payment_agg, df_BO, clientname_col, date_colname_2, amount_colname_2, payment_id, amount_threshold)
+                    df_match = create_light_check(df_payment_agg, df_BO, clientname_col, date_colname_2, amount_colname_2, payment_id, amount_threshold,
+                                                  candidate_store=kwargs.get('candidate_store'), candidate_log=candidate_log)
                 else:
                     df_match = rapprocher_paiement_bo_basic(df_payment_agg, df_BO, clientname_col, date_colname_2, amount_colname_2, payment_id,
-                                                            amount_threshold, min_score)
+                                                            amount_threshold, min_score, candidate_store=kwargs.get('candidate_store'),
+                                                            candidate_log=candidate_log, blocking=kwargs.get('blocking'))
                 if len(df_match) > 0:
                     list_col = list(df_BO.columns)
                     list_col.append(payment_id)
                     df_match = df_match[list_col]
 
                     # Revert to unit payments
-                    df_match[payment_id] = df_match[payment_id].str.split('|')
                     df_match = df_match.explode(payment_id, ignore_index=True)
                     df_match = df_match.merge(df_payment, on=payment_id)
                     df_match['motif'] = motif
                     df_rapproche = pd.concat([df_rapproche, df_match])
                     df_payment = df_payment[~df_payment[payment_id].isin(df_rapproche[payment_id])]
                     df_BO = df_BO[~df_BO.order_id.isin(df_rapproche.order_id)]
+                    prepared = drop_aggregated_ids(prepared, df_match[payment_id])
     return df_rapproche, df_payment, df_BO
 
 def mapping_1paiement_nord(
@@ -170,6 +248,8 @@ def mapping_1paiement_nord(
         - nb_days_period (int): Maximum number of days accepted between the creation date of the orders and the payment date.
         - amount_threshold (float): Acceptance threshold on the amount for matching.
         - min_score (int): Minimum accepted percentage for the similarity score.
+        - incremental_windows (bool): Only match again the aggregated orders which changed since the previous window
+          size or had candidates there (default True), same result. False matches every aggregate at every window size.
 
     Returns:
     - Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: Updated DataFrames for matched records, remaining payments, and remaining BO orders.
@@ -182,18 +262,23 @@ def mapping_1paiement_nord(
     nb_days_period = kwargs.get('nb_days_period', 2)
     amount_threshold = kwargs.get('amount_threshold', 5)
     min_score = kwargs.get('min_score', 90)
+    incremental_windows = kwargs.get('incremental_windows', True)
 
     # Calculate the number of days to aggregate
     nbdays_agreges = int(nb_days_period / 2)
     step = 5
+    agg_kwargs = {'payment_id': 'order_id', 'clientname_col': 'subscriber_name',
+                  'date_colname': 'creation_date', 'amount_colname': 'total_amount'}
+    # Same-day aggregation done once, each window size only recomputes the windows
+    prepared = prepare_aggregation(df_BO, **agg_kwargs)
+    df_BO_agg_previous, candidate_log = None, {}
     for nb_days in np.arange(10, nbdays_agreges + step, step=step):
-        clientname_col_bo = 'subscriber_name'
-        payment_id_bo = 'order_id'
-        date_colname_bo = 'creation_date'
-        amount_colname_bo = 'total_amount'
-
         # Aggregate BO orders by date interval
-        df_BO_agg = aggregate_by_date(df_BO, payment_id_bo, clientname_col_bo, date_colname_bo, amount_colname_bo, nb_days)
+        df_BO_agg = aggregate_prepared(prepared, nb_days)
+        if incremental_windows:
+            df_BO_agg, df_BO_agg_previous = get_changed_aggregates(
+                df_BO_agg, df_BO_agg_previous, candidate_log.get('order_id'), **agg_kwargs), df_BO_agg
+            candidate_log = {}
         if len(df_BO_agg) > 0:
             df_BO_agg['Start_Date'] = df_BO_agg['creation_date']
             df_BO_agg['End_Date'] = df_BO_agg['creation_date'] + dt.timedelta(days=nb_days_period)
@@ -202,7 +287,7 @@ def mapping_1paiement_nord(
                 # Match with aggregated BO data
                 df_match = rapprocher_paiement_bo_basic(
                     df_payment, df_BO_agg, clientname_col, date_colname, amount_colname, payment_id,
-                    amount_threshold, min_score
+                    amount_threshold, min_score, candidate_log=candidate_log, blocking=kwargs.get('blocking')
                 )
                 df_BO_agg = df_BO_agg[~df_BO_agg['order_id'].isin(df_match['order_id'])]
 
@@ -210,13 +295,13 @@ def mapping_1paiement_nord(
                 list_col = list(df_payment.columns)
                 list_col.append('order_id')
                 df_match = df_match[list_col]
-                df_match['order_id'] = df_match['order_id'].str.split('|')
                 df_match = df_match.explode('order_id', ignore_index=True)
                 df_match = df_match.merge(df_BO, on='order_id')
                 df_match['motif'] = motif
                 df_rapproche = pd.concat([df_rapproche, df_match])
                 df_payment = df_payment[~df_payment[payment_id].isin(df_rapproche[payment_id])]
                 df_BO = df_BO[~df_BO['order_id'].isin(df_rapproche['order_id'])]
+                prepared = drop_aggregated_ids(prepared, df_match['order_id'])
 
     return df_rapproche, df_payment, df_BO
 
@@ -277,7 +362,9 @@ def mapping_npeople(
         # Match with date and product only
         df_match = mapping_approximately(df_payment, df_BO_2pp, amount_colname, date_colname, amount_threshold=-1000)
     else:
-        df_match = mapping_approximately(df_payment, df_BO, amount_colname, date_colname, amount_threshold=-1000)
+        # No candidate store: it is primed with the amount_threshold of the passes, never with this date-only join
+        df_match = mapping_approximately(df_payment, df_BO, amount_colname, date_colname, amount_threshold=-1000,
+                                         payment_id=payment_id)
 
     df_match = df_match[~df_match['order_id'].isnull()]
     df_match = df_match[~df_match[payment_id].isnull()]
@@ -347,7 +434,8 @@ def mapping_lightcheck_uniquepayment(
     for clientname_col in list_cols_Clientname:
         # Create light check matches
         df_match = create_light_check(df_payment, df_BO, clientname_col, date_colname,
-                                      amount_colname, payment_id, amount_threshold, bo_name_col)
+                                      amount_colname, payment_id, amount_threshold, bo_name_col,
+                                      candidate_store=kwargs.get('candidate_store'))
         df_match['motif'] = motif  # Add motif to matched DataFrame
         
         # Concatenate matched records to df_rapproche
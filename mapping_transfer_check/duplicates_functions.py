@@ -1,11 +1,13 @@
 import datetime as dt
 import pandas as pd
-import sqlite3
+import numpy as np
 from utils.utils import *
 
-def aggregate_by_date(df_payment: pd.DataFrame, *args, **kwargs) -> pd.DataFrame:
+def prepare_aggregation(df_payment: pd.DataFrame, *args, **kwargs) -> dict:
     """
-    Aggregates all transactions within a specified number of days for a person for each date.
+    First step of aggregate_by_date, independent of the window: aggregates the transactions of the same
+    client on the same date and sorts them by client then date. The result can be aggregated on several
+    window sizes with aggregate_prepared, and updated with drop_aggregated_ids when payments are matched.
 
     Parameters:
     - df_payment: DataFrame containing payment information.
@@ -15,98 +17,186 @@ def aggregate_by_date(df_payment: pd.DataFrame, *args, **kwargs) -> pd.DataFrame
         - clientname_col: Column name for the client's name.
         - date_colname: Column name for the date.
         - amount_colname: Column name for the amount.
-        - nb_days: Number of days interval to aggregate (default 2).
 
     Returns:
-    - DataFrame with aggregated payments.
+    - dict with the same-day groups ('g_name', 'g_date', 'g_amount', 'g_ids') and the column names.
     """
     payment_id = kwargs.get('payment_id')
     clientname_col = kwargs.get('clientname_col')
     date_colname = kwargs.get('date_colname')
     amount_colname = kwargs.get('amount_colname')
-    nb_days = kwargs.get('nb_days', 2)
     
-    # Etape 1: aggregate transfers from the same client and same date to avoid creating duplicates on the next steps
-    ### ie concatenate paiement1 and paiement2 => paiement12
     df_payment = df_payment[(df_payment[clientname_col]!='') & (~df_payment[clientname_col].isnull())]
-    if len(df_payment)>0:
-        df_payment_agrege = df_payment.groupby(by=[clientname_col,date_colname]).\
-                                                    agg({amount_colname:'sum',\
-                                                        payment_id : "|".join   # concaténer les Id sys pour la même personne
-                                                        }).reset_index()
-
-        #Etape 2: looking for the transfers during a period of  x days (nb_days)
-        # 2.1 add period
-        df1 = df_payment_agrege[[payment_id,clientname_col,date_colname,amount_colname]].sort_values(by=[clientname_col,date_colname])
-        df2 = df1.copy()
-        payment_id_2 = payment_id +"_2"
-        clientname_col_2 = clientname_col +"_2"
-        date_colname_2 = date_colname +"_2"
-        amount_colname_2 = amount_colname+"_2"
-        df2.columns = [payment_id_2,clientname_col_2 ,date_colname_2,amount_colname_2]
-
-        df1["End_date"] = df1[date_colname]+dt.timedelta(days=+int(nb_days))
-
-        # 2.2 flag all transfers in that period
-        conn = sqlite3.connect(':memory:')
-        df1.to_sql('df1', conn, index=False)
-        df2.to_sql('df2', conn, index=False)
-        qry = f'''
-            SELECT * 
-            FROM df1 
-            JOIN df2 
-            ON df1.{clientname_col} = df2.{clientname_col_2}
-            AND df2.{date_colname_2} <= df1.End_date 
-            AND df2.{date_colname_2} > df1.{date_colname}
-        '''
-
-        df_match_date_sup = pd.read_sql_query(qry,conn)
-
-        #2.3 remove all payments already taken in the period of x days from the start date
-        ### it will create 3 rows : paiement12 et paiement3, paiement12 et paiement4, paiement3 and paiement4
-        ### needs to remove paiement3 et paiement4
-        list_idsys2 = set(list(df_match_date_sup[payment_id_2])) # list des Id sys qui sont déjà utilisés
-        list_idsys_agreges = set(list(df_match_date_sup[payment_id_2])+list(df_match_date_sup[payment_id])) # tous les id sys
-        df_match_date_sup = df_match_date_sup[~df_match_date_sup[payment_id].isin(list_idsys2)] # enlever les lignes déjà utilisés
-        list_idsys = set(list(df_match_date_sup[payment_id])) #+list_concat_meme_date
-
-        # 2.4 add transfer data to the start date
-        ### add paiement12 and paiement12 to make groupby
-         # Add initial transactions
-        df_date0_to_add = df_payment_agrege[df_payment_agrege[payment_id].isin(list_idsys)] 
-        df_date0_to_add[payment_id_2] = df_date0_to_add[payment_id]
-        df_date0_to_add[amount_colname_2] = df_date0_to_add[amount_colname]
-
-        ### records on people who didn't make several transfers or who did 2 transfers in a day
-        df_not_agrege = df_payment_agrege[~df_payment_agrege[payment_id].isin(list_idsys_agreges)]
-        df_not_agrege[payment_id_2] = df_not_agrege[payment_id]
-        df_not_agrege[amount_colname_2] = df_not_agrege[amount_colname]
-
-        # 2.5 : aggregate data
-        ### df_match_date_sup :  paiement12 et paiement3, paiement12 et paiement4
-        ### df_date0_to_add :  paiement12 et paiement12
-        ### df_not_agrege : lignes unitaires
-        df_match_date_sup = pd.concat([df_match_date_sup,df_date0_to_add,df_not_agrege]).sort_values([clientname_col,date_colname])
-        df_match_date_sup[date_colname] = pd.to_datetime(df_match_date_sup[date_colname])
-
-        # Prendre la date
-        df_match_date_sup[date_colname_2] = df_match_date_sup.apply(lambda f : get_date(f[payment_id],
-                                                                                f[payment_id_2],
-                                                                                f[date_colname],
-                                                                                f[date_colname_2]), axis=1 )
-        df_match_date_sup[date_colname_2] = pd.to_datetime(df_match_date_sup[date_colname_2],format = '%Y-%m-%d %H:%M:%S')
-        df_match_date_sup = df_match_date_sup.groupby(by=[payment_id,date_colname]).agg({amount_colname_2:"sum",
-                                                                    clientname_col:'first',
-                                                                    payment_id_2: "|".join,
-                                                                    date_colname_2:"max"
-                                                                }).reset_index()
-        df_match_date_sup[payment_id] = df_match_date_sup[payment_id].apply(lambda x: x.split("|")[0] if "|" in x else x)
-        df_match_date_sup = df_match_date_sup[[payment_id_2,date_colname,clientname_col,amount_colname_2,date_colname_2]]
-        df_match_date_sup = df_match_date_sup.rename(columns={payment_id_2:payment_id,amount_colname_2:amount_colname,date_colname_2:'Max_'+date_colname})
-        df_match_date_sup[amount_colname+"_total"] = df_match_date_sup[amount_colname]
-    else : df_match_date_sup = pd.DataFrame()
+    df_payment = df_payment[~to_datetime64(df_payment[date_colname]).isnull()]
+
+    # Etape 1: aggregate transfers from the same client and same date to avoid creating duplicates on the next steps
+    ### ie paiement1 and paiement2 => paiement12, rows sorted by client then date
+    name_codes, names = pd.factorize(df_payment[clientname_col], sort=True)
+    dates = to_datetime64(df_payment[date_colname]).to_numpy().view('int64')
+    # Amounts in integer cents keep exact integer sums
+    if df_payment[amount_colname].dtype == 'int64':
+        amounts = df_payment[amount_colname].to_numpy()
+    else:
+        amounts = np.nan_to_num(df_payment[amount_colname].to_numpy(dtype='float64', na_value=np.nan))
+    ids = df_payment[payment_id].to_numpy(dtype=object)
+    order = np.lexsort((dates, name_codes))
+    name_codes, dates, amounts, ids = name_codes[order], dates[order], amounts[order], ids[order]
+
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (name_codes[1:] != name_codes[:-1]) | (dates[1:] != dates[:-1])
+    starts = np.flatnonzero(new_group)
+    return {
+        'payment_id': payment_id,
+        'clientname_col': clientname_col,
+        'date_colname': date_colname,
+        'amount_colname': amount_colname,
+        'names': names,
+        'g_name': name_codes[starts],
+        'g_date': dates[starts],
+        'g_amount': np.add.reduceat(amounts, starts) if len(starts) else amounts,
+        'g_ids': [tuple(group) for group in np.split(ids, starts[1:])] if len(starts) else []
+    }
+
+def drop_aggregated_ids(prepared: dict, list_ids) -> dict:
+    """
+    Removes from a prepare_aggregation result the same-day groups containing one of the given ids
+    (a matched aggregated payment always takes its same-day groups entirely).
+
+    Parameters:
+    - prepared: Result of prepare_aggregation.
+    - list_ids: Ids of the matched payments.
+
+    Returns:
+    - dict: The prepared aggregation without these groups.
+    """
+    set_ids = set(list_ids)
+    keep = np.array([not set_ids.intersection(group) for group in prepared['g_ids']], dtype=bool)
+    if keep.all():
+        return prepared
+    prepared = dict(prepared)
+    for key in ['g_name', 'g_date', 'g_amount']:
+        prepared[key] = prepared[key][keep]
+    prepared['g_ids'] = [group for group, kept in zip(prepared['g_ids'], keep) if kept]
+    return prepared
+
+def aggregate_prepared(prepared: dict, nb_days: int = 2) -> pd.DataFrame:
+    """
+    Second step of aggregate_by_date: aggregates the same-day groups of a client within a window of nb_days.
+    
+    Each client is processed on its dates sorted once: a date starts a window when no earlier date of the
+    client is within nb_days before it, and the window takes every later date up to nb_days after it.
+    The ids of the aggregated payments are kept as a tuple in the payment_id column.
+
+    Parameters:
+    - prepared: Result of prepare_aggregation.
+    - nb_days: Number of days interval to aggregate (default 2).
+
+    Returns:
+    - DataFrame with aggregated payments.
+    """
+    payment_id = prepared['payment_id']
+    clientname_col = prepared['clientname_col']
+    date_colname = prepared['date_colname']
+    amount_colname = prepared['amount_colname']
+    g_name, g_date, g_amount, g_ids = prepared['g_name'], prepared['g_date'], prepared['g_amount'], prepared['g_ids']
+    nb_groups = len(g_ids)
+    if nb_groups == 0:
+        return pd.DataFrame()
+
+    # Etape 2: looking for the transfers during a period of x days (nb_days)
+    # 2.1 end of the window of each date: last date of the same client <= date + nb_days
+    window = int(nb_days) * 86400 * 10**9
+    all_dates, ranks = np.unique(np.concatenate([g_date, g_date + window]), return_inverse=True)
+    nb_ranks = len(all_dates) + 1
+    keys = g_name.astype('int64') * nb_ranks + ranks[:nb_groups]
+    hi = np.searchsorted(keys, g_name.astype('int64') * nb_ranks + ranks[nb_groups:], side='right')
+
+    # 2.2 a date already taken in the window of an earlier date of the client does not start a window
+    covered = np.zeros(nb_groups, dtype=bool)
+    covered[1:] = (g_name[1:] == g_name[:-1]) & (g_date[1:] - g_date[:-1] <= window)
+    has_later = hi > np.arange(nb_groups) + 1
+    # (a date in the window of a taken date but not in the window of the start date is dropped)
+    anchors = np.flatnonzero(~covered)
+    lengths = np.where(has_later[anchors], hi[anchors] - anchors, 1)
+
+    # 2.3 aggregate data: the start date then the later dates of the window
+    row_starts = np.cumsum(lengths) - lengths
+    members = np.repeat(anchors - row_starts, lengths) + np.arange(lengths.sum())
+    agg_amount = np.add.reduceat(g_amount[members], row_starts)
+    agg_ids = [tuple(id_ for member in range(anchor, anchor + length) for id_ in g_ids[member])
+               for anchor, length in zip(anchors, lengths)]
+
+    df_match_date_sup = pd.DataFrame({
+        payment_id: pd.Series(agg_ids, dtype=object),
+        date_colname: g_date[anchors].view('datetime64[ns]'),
+        clientname_col: prepared['names'][g_name[anchors]],
+        amount_colname: agg_amount,
+        'Max_' + date_colname: g_date[anchors + lengths - 1].view('datetime64[ns]'),
+    })
+    df_match_date_sup[amount_colname + "_total"] = df_match_date_sup[amount_colname]
+
+    # Same row order as a groupby on the concatenated ids of the start date
+    df_match_date_sup['_key'] = ['|'.join(map(str, g_ids[anchor])) for anchor in anchors]
+    df_match_date_sup = df_match_date_sup.sort_values(['_key', date_colname], kind='mergesort')
+    df_match_date_sup = df_match_date_sup.drop(columns='_key').reset_index(drop=True)
     return df_match_date_sup
 
+def aggregate_by_date(df_payment: pd.DataFrame, *args, **kwargs) -> pd.DataFrame:
+    """
+    Aggregates all transactions within a specified number of days for a person for each date.
+    See prepare_aggregation and aggregate_prepared for the two steps.
+
+    Parameters:
+    - df_payment: DataFrame containing payment information.
+    - *args: Additional positional arguments.
+    - **kwargs: Additional keyword arguments. Must include:
+        - payment_id: Unique identifier for the payment.
+        - clientname_col: Column name for the client's name.
+        - date_colname: Column name for the date.
+        - amount_colname: Column name for the amount.
+        - nb_days: Number of days interval to aggregate (default 2).
+
+    Returns:
+    - DataFrame with aggregated payments.
+    """
+    prepared = prepare_aggregation(df_payment, **kwargs)
+    return aggregate_prepared(prepared, kwargs.get('nb_days', 2))
+
+def get_changed_aggregates(df_agg: pd.DataFrame, df_agg_previous: pd.DataFrame, rematch_ids=None,
+                           *args, **kwargs) -> pd.DataFrame:
+    """
+    Keeps the aggregated rows to match again after the previous window size: the new or changed rows
+    (ids or last date not seen in the previous window) and the rows in rematch_ids.
+    An unchanged row without any candidate in the previous window cannot get one now since the other table
+    only loses rows, so skipping it does not change the result. The rows which had candidates but were not
+    matched (lost a duplicate conflict) must be given in rematch_ids.
+
+    Parameters:
+    - df_agg: Aggregated rows for the current window.
+    - df_agg_previous: Aggregated rows for the previous window (None for the first window).
+    - rematch_ids: Ids (tuples) of the previous window rows which had candidates.
+    - *args: Additional positional arguments.
+    - **kwargs: Additional keyword arguments. Must include:
+        - payment_id: Column with the tuple of aggregated ids.
+        - clientname_col: Column name for the client's name.
+        - date_colname: Column name for the date.
+
+    Returns:
+    - DataFrame with the aggregated rows to match again.
+    """
+    if df_agg_previous is None or df_agg_previous.empty or df_agg.empty:
+        return df_agg
+    payment_id = kwargs.get('payment_id')
+    clientname_col = kwargs.get('clientname_col')
+    date_colname = 'Max_' + kwargs.get('date_colname')
+
+    keys = [clientname_col, payment_id, date_colname]
+    df_new = df_agg[keys].merge(df_agg_previous[keys].drop_duplicates(subset=keys), on=keys, how='left', indicator=True)
+    mask = (df_new['_merge'] == 'left_only').to_numpy().copy()
+    if rematch_ids:
+        mask |= df_agg[payment_id].isin(rematch_ids).to_numpy()
+    return df_agg[mask]
+
 
 def merge_duplicates_by_date(df_duplicates: pd.DataFrame, *args, **kwargs) -> pd.DataFrame:
     '''Merges the payment table and BO table with duplicates.
@@ -140,7 +230,9 @@ def merge_duplicates_by_date(df_duplicates: pd.DataFrame, *args, **kwargs) -> pd
     amount_threshold = kwargs.get('amount_threshold', 5)
     
     # Create combo name column
-    df_duplicates.loc[:,'nompaiement_nombo'] = df_duplicates[clientname_col] + '|' + df_duplicates.subscriber_name # créer la colonne combo des noms
+    # (as object: pandas can't add an empty str column to an empty object one, e.g. names cleaned from str and
+    # object inputs)
+    df_duplicates.loc[:,'nompaiement_nombo'] = df_duplicates[clientname_col].astype(object) + '|' + df_duplicates.subscriber_name.astype(object) # créer la colonne combo des noms
     columns_left.append('nompaiement_nombo')
     columns_right.append('nompaiement_nombo')
     
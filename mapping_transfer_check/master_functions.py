@@ -1,5 +1,7 @@
 import pandas as pd
 import datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from mapping_transfer_check.basic_functions import *
 from mapping_transfer_check.different_types_mapping_functions import *
 
@@ -16,6 +18,170 @@ from mapping_transfer_check.different_types_mapping_functions import *
         + bo_name_col : nom de la colonne Nom de client de la table BO
 '''
 
+def _run_mapping_type(
+    df_rapproche: pd.DataFrame,
+    df_paiement: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    list_cols_clientname_payment: List[str],
+    mapping_type: Optional[str] = None,
+    **kwargs
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Runs the mapping functions of a mapping type on one slice of payments and BO orders.
+    Same parameters and returns as mapping_paiement_bo.
+    """
+    # Each pass flags its matches with its own motif (used for the categorie of the result)
+    kwargs = {key: value for key, value in kwargs.items() if key != 'motif'}
+    if mapping_type == 'exact':
+        df_rapproche, df_paiement, df_BO = mapping_exact_match(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, **kwargs
+        )
+
+    elif mapping_type == 'basic':
+        # 1. Unique Payment
+        df_rapproche, df_paiement, df_BO = mapping_unique_payment(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, motif='unique_payment', **kwargs
+        )
+
+        # 2. Multiple Payments for One Order
+        df_rapproche, df_paiement, df_BO = mapping_npaiement_1ord(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, motif='npaiement_1ord', **kwargs
+        )
+
+        # 3. One Payment for Multiple Orders
+        df_rapproche, df_paiement, df_BO = mapping_1paiement_nord(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, motif='1paiement_nord', **kwargs
+        )
+
+    elif mapping_type == 'pls_pp':
+        df_rapproche, df_paiement, df_BO = mapping_npeople(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, is_bo=True, motif='pls_pp', **kwargs
+        )
+
+    elif mapping_type == 'pls_paiements_diff_motifs':
+        df_rapproche, df_paiement, df_BO = mapping_npeople(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, is_bo=False, motif='pls_paiements_diff_motifs', **kwargs
+        )
+
+    elif mapping_type == 'light_check_paiementunique':
+        df_rapproche, df_paiement, df_BO = mapping_lightcheck_uniquepayment(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, motif='light_check_paiementunique', **kwargs
+        )
+
+    elif mapping_type == 'light_check_pls_paiements_1ord':
+        df_rapproche, df_paiement, df_BO = mapping_npaiement_1ord(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, is_lightcheck=True, motif='light_check_pls_paiements_1ord', **kwargs
+        )
+
+    return df_rapproche, df_paiement, df_BO
+
+def _run_mapping_slice(
+    df_rapproche: pd.DataFrame,
+    df_paiement: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    list_cols_clientname_payment: List[str],
+    mapping_type: Optional[str] = None,
+    **kwargs
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Runs _run_mapping_type and flags the new matches with mauvais_compte (payments and orders on different products).
+    """
+    mauvais_compte = len(df_paiement['account_num'].unique()) != len(df_BO.product_code.unique())
+    df_rapproche, df_paiement, df_BO = _run_mapping_type(
+        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, mapping_type, **kwargs
+    )
+    mask = df_rapproche['mauvais_compte'].isnull()
+    df_rapproche.loc[mask, 'mauvais_compte'] = mauvais_compte
+    return df_rapproche, df_paiement, df_BO
+
+def _run_mapping_partition(args: tuple) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Worker of the process pool: runs the same-product pass of one product code.
+    args is (df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, mapping_type, kwargs),
+    df_rapproche being an empty frame with the columns of the matches of the previous passes.
+    """
+    df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, mapping_type, kwargs = args
+    return _run_mapping_slice(df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, mapping_type, **kwargs)
+
+def mapping_paiement_bo_partitioned(
+    df_rapproche: pd.DataFrame,
+    df_paiement_a_traiter: pd.DataFrame,
+    df_BO_a_traiter: pd.DataFrame,
+    list_cols_clientname_payment: List[str],
+    mapping_type: Optional[str] = None,
+    n_workers: int = 1,
+    **kwargs
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Version of mapping_paiement_bo in two phases:
+    1. the payments of each product code are matched with the BO orders of the same product. The partitions
+       are independent and run in a process pool of n_workers processes (in the calling process if n_workers <= 1);
+    2. the remaining payments of each product code, in the same order, are matched with the remaining BO orders
+       of the other products (mauvais_compte).
+    The results are merged in the order of the product codes, so the output does not depend on n_workers.
+    Unlike the single-pass loop, no product code can take the orders of another product code before that
+    product code has been matched on its own orders.
+
+    Parameters:
+    - Same as mapping_paiement_bo, plus:
+    - n_workers (int): Number of processes for the same-product partitions.
+
+    Returns:
+    - Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: Matched orders, unmatched payments, unmatched BO orders.
+    """
+    if df_rapproche.empty:
+        df_rapproche['mauvais_compte'] = pd.Series(dtype=object)
+    if df_paiement_a_traiter.empty:
+        return df_rapproche, pd.DataFrame(), df_BO_a_traiter
+
+    list_product_code = list(df_paiement_a_traiter['account_num'].unique())
+    use_pool = n_workers is not None and n_workers > 1 and len(list_product_code) > 1
+    # The candidate store stays in the calling process, the workers join their own partition
+    kwargs_partition = kwargs
+    if use_pool:
+        kwargs_partition = {key: value for key, value in kwargs.items() if key != 'candidate_store'}
+    # Each slice starts from an empty copy of df_rapproche, the matches are concatenated at the end
+    df_empty = df_rapproche.iloc[:0]
+    list_args = [(df_empty, df_paiement_a_traiter[df_paiement_a_traiter['account_num'] == product_code],
+                  df_BO_a_traiter[df_BO_a_traiter.product_code == product_code],
+                  list_cols_clientname_payment, mapping_type, kwargs_partition)
+                 for product_code in list_product_code]
+
+    # Phase 1: same-product partitions
+    if use_pool:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(list_args))) as executor:
+            list_captured = list(executor.map(capture_records, repeat(_run_mapping_partition), list_args))
+        # The records of the workers are emitted in the order of the product codes
+        for _, list_records in list_captured:
+            emit_records(list_records)
+        list_results = [result for result, _ in list_captured]
+    else:
+        list_results = [_run_mapping_partition(args) for args in list_args]
+
+    list_df_rapproche = [df_rapproche] + [result[0] for result in list_results]
+    dict_paiement = dict(zip(list_product_code, [result[1] for result in list_results]))
+    df_BO_a_traiter = pd.concat([result[2] for result in list_results] +
+                                [df_BO_a_traiter[~df_BO_a_traiter.product_code.isin(list_product_code)]])
+
+    # Phase 2: remaining payments against the orders of the other products, serial as it shares the orders.
+    # The exact pass joins on the product, it can't match there
+    list_product_code_autre = list_product_code if mapping_type != 'exact' else []
+    for product_code in list_product_code_autre:
+        df_paiement = dict_paiement[product_code]
+        df_BO_fonds = df_BO_a_traiter[df_BO_a_traiter.product_code == product_code]
+        df_BO_autre = df_BO_a_traiter[df_BO_a_traiter.product_code != product_code]
+        df_rapproche_autre, df_paiement, df_BO_autre = _run_mapping_slice(
+            df_empty, df_paiement, df_BO_autre, list_cols_clientname_payment, mapping_type, **kwargs
+        )
+        list_df_rapproche.append(df_rapproche_autre)
+        dict_paiement[product_code] = df_paiement
+        df_BO_a_traiter = pd.concat([df_BO_fonds, df_BO_autre])
+
+    list_df_rapproche = [df for df in list_df_rapproche if not df.empty] or [df_rapproche]
+    df_rapproche = pd.concat(list_df_rapproche)
+    df_paiement_restant = pd.concat([dict_paiement[product_code] for product_code in list_product_code])
+    return df_rapproche, df_paiement_restant, df_BO_a_traiter
+
 def mapping_paiement_bo(
     df_rapproche: pd.DataFrame,
     df_paiement_a_traiter: pd.DataFrame,
@@ -32,8 +198,10 @@ def mapping_paiement_bo(
     - df_paiement_a_traiter (pd.DataFrame): DataFrame containing client payment data to process.
     - df_BO_a_traiter (pd.DataFrame): DataFrame containing BO orders/contracts not yet processed.
     - list_cols_clientname_payment (List[str]): List of columns regarding the payer in the payment table.
-    - mapping_type (Optional[str]): Type of mapping to perform. Can be 'basic', 'pls_pp', 'pls_paiements_diff_motifs', 'light_check_paiementunique', 'light_check_pls_paiements_1ord'.
-    - kwargs: Additional optional parameters for the mapping functions.
+    - mapping_type (Optional[str]): Type of mapping to perform. Can be 'exact', 'basic', 'pls_pp', 'pls_paiements_diff_motifs', 'light_check_paiementunique', 'light_check_pls_paiements_1ord'.
+    - kwargs: Additional optional parameters for the mapping functions:
+        - n_workers (int): If given, runs mapping_paiement_bo_partitioned: the same-product partitions are
+          matched first in n_workers processes, then the wrong-account pass. None (default) keeps the single loop.
 
     Returns:
     - Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: 
@@ -41,10 +209,20 @@ def mapping_paiement_bo(
       - Unmatched payments DataFrame
       - Unmatched BO orders DataFrame
     """
+    record = start_record('mapping_pass', mapping_type, nb_payments_in=len(df_paiement_a_traiter),
+                          nb_orders_in=len(df_BO_a_traiter))
+    nb_matches_before = len(df_rapproche)
+    if kwargs.get('n_workers') is not None:
+        df_rapproche, df_paiement_restant, df_BO_a_traiter = mapping_paiement_bo_partitioned(
+            df_rapproche, df_paiement_a_traiter, df_BO_a_traiter, list_cols_clientname_payment, mapping_type, **kwargs
+        )
+        end_record(record, nb_matches=len(df_rapproche) - nb_matches_before)
+        return df_rapproche, df_paiement_restant, df_BO_a_traiter
+
     # Initialize DataFrame for remaining payments
     df_paiement_restant = pd.DataFrame()
     if df_rapproche.empty:
-        df_rapproche['mauvais_compte'] = ''
+        df_rapproche['mauvais_compte'] = pd.Series(dtype=object)
     
     if not df_paiement_a_traiter.empty:
         for product_code in df_paiement_a_traiter['account_num'].unique():
@@ -56,51 +234,16 @@ def mapping_paiement_bo(
             df_BO_a_traiter = pd.DataFrame()
             
             for df_BO in [df_BO_fonds, df_BO_autre]:
-                mauvais_compte = len(df_paiement['account_num'].unique()) != len(df_BO.product_code.unique())
-                
-                if mapping_type == 'basic':
-                    # 1. Unique Payment
-                    df_rapproche, df_paiement, df_BO = mapping_unique_payment(
-                        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, **kwargs
+                # The exact pass joins on the product, it can't match the orders of the other products
+                if mapping_type != 'exact' or df_BO is df_BO_fonds:
+                    df_rapproche, df_paiement, df_BO = _run_mapping_slice(
+                        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, mapping_type, **kwargs
                     )
-                    
-                    # 2. Multiple Payments for One Order
-                    df_rapproche, df_paiement, df_BO = mapping_npaiement_1ord(
-                        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, **kwargs
-                    )
-                    
-                    # 3. One Payment for Multiple Orders
-                    df_rapproche, df_paiement, df_BO = mapping_1paiement_nord(
-                        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, **kwargs
-                    )
-                
-                elif mapping_type == 'pls_pp':
-                    df_rapproche, df_paiement, df_BO = mapping_npeople(
-                        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, is_bo=True, **kwargs
-                    )
-                
-                elif mapping_type == 'pls_paiements_diff_motifs':
-                    df_rapproche, df_paiement, df_BO = mapping_npeople(
-                        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, is_bo=False, **kwargs
-                    )
-                
-                elif mapping_type == 'light_check_paiementunique':
-                    df_rapproche, df_paiement, df_BO = mapping_lightcheck_uniquepayment(
-                        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, **kwargs
-                    )
-                
-                elif mapping_type == 'light_check_pls_paiements_1ord':
-                    df_rapproche, df_paiement, df_BO = mapping_npaiement_1ord(
-                        df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, is_lightcheck=True, **kwargs
-                    )
-                
-                mask = df_rapproche['mauvais_compte'].isnull()
-                df_rapproche.loc[mask, 'mauvais_compte'] = mauvais_compte
-                
                 df_BO_a_traiter = pd.concat([df_BO_a_traiter, df_BO])
             
             df_paiement_restant = pd.concat([df_paiement_restant, df_paiement])
     
+    end_record(record, nb_matches=len(df_rapproche) - nb_matches_before)
     return df_rapproche, df_paiement_restant, df_BO_a_traiter
 
 def master_mapping_bo_paiement(
@@ -111,6 +254,7 @@ def master_mapping_bo_paiement(
 ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     This function handles all cases of matching:
+    - Exact matching (same name, product and amount)
     - Matching based on the subscriber_name column
     - Matching based on the co_subscriber_name column
     - Matching multiple people
@@ -120,7 +264,13 @@ def master_mapping_bo_paiement(
     - df_paiement (pd.DataFrame): DataFrame containing client payment data.
     - df_BO (pd.DataFrame): DataFrame containing BO orders/contracts not yet processed.
     - list_cols_clientname_payment (List[str]): List of columns regarding the payer in the payment table.
-    - kwargs: Additional optional parameters for the matching functions.
+    - kwargs: Additional optional parameters for the matching functions:
+        - candidate_store (dict): Store of date/amount candidate pairs (see create_candidate_store). Pass one
+          to read its 'hits' / 'misses' counters after the run, otherwise a new one is created.
+        - exact_match (bool): Runs the mapping_exact_match pass first (default True), its matches are counted
+          in its 'exact_match' records (see get_exact_match_stats).
+        - blocking (str): 'exact' or 'token' to prune the pairs of names that cannot reach min_score before the
+          fuzzy score (see prune_name_pairs, counters in get_blocking_stats). None (default) scores every pair.
 
     Returns:
     - Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: 
@@ -131,6 +281,19 @@ def master_mapping_bo_paiement(
     # Initialize empty DataFrame for matched orders
     df_rapproche = pd.DataFrame()
 
+    # Join payments and orders on date/amount once, the passes below only filter the pairs of the remaining rows
+    if kwargs.get('candidate_store') is None:
+        kwargs['candidate_store'] = create_candidate_store()
+    kwargs.setdefault('payment_id', kwargs.get('id_paiement'))
+    prime_candidate_store(kwargs['candidate_store'], df_paiement, df_BO, kwargs.get('amount_colname'),
+                          kwargs.get('date_colname'), kwargs.get('amount_threshold', 5), kwargs['payment_id'])
+
+    # Same name, product and amount: matched before the fuzzy passes
+    if kwargs.get('exact_match', True):
+        df_rapproche, df_paiement, df_BO = mapping_paiement_bo(
+            df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, mapping_type='exact', **kwargs
+        )
+
     # Matching on the subscriber_name column
     df_rapproche, df_paiement, df_BO = mapping_paiement_bo(
         df_rapproche, df_paiement, df_BO, list_cols_clientname_payment, mapping_type='basic', **kwargs
@@ -171,6 +334,206 @@ def master_mapping_bo_paiement(
 def get_categorie(motif:str=None):
     return 'Light check' if 'light_check' in motif else 'Proposition'
 
+def _run_ownership_branch(args: tuple) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Worker of the parallel ownership mode: runs master_mapping_bo_paiement on one BO slice, with a candidate
+    store primed on the tables of the branch.
+    args is (df_paiement, df_BO, list_cols_clientname_payment, kwargs).
+    Returns the result of master_mapping_bo_paiement and the 'hits' / 'misses' counters of the store.
+    """
+    df_paiement, df_BO, list_cols_clientname_payment, kwargs = args
+    candidate_store = create_candidate_store()
+    result = master_mapping_bo_paiement(df_paiement, df_BO, list_cols_clientname_payment,
+                                        **dict(kwargs, candidate_store=candidate_store))
+    return result, {key: candidate_store[key] for key in ['hits', 'misses']}
+
+def resolve_ownership_conflicts(
+    df_rapproche_pp: pd.DataFrame,
+    df_rapproche_dm: pd.DataFrame,
+    id_paiement: str
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Merges the full ownership and dismemberment matches obtained on the same payments: the full ownership
+    matches have priority, so a dismemberment match (all the payments and orders linked together) is
+    rejected when one of its payments is also matched in full ownership.
+
+    Parameters:
+    - df_rapproche_pp (pd.DataFrame): Matches of the full ownership orders.
+    - df_rapproche_dm (pd.DataFrame): Matches of the dismemberment orders.
+    - id_paiement (str): Name of the payment ID column.
+
+    Returns:
+    - Tuple[pd.DataFrame, pd.DataFrame]: 
+      - Dismemberment matches kept
+      - Dismemberment matches rejected
+    """
+    if df_rapproche_dm.empty or df_rapproche_pp.empty:
+        return df_rapproche_dm, df_rapproche_dm.iloc[:0]
+    components = get_match_components(df_rapproche_dm, id_paiement, 'order_id')
+    mask_conflict = df_rapproche_dm[id_paiement].isin(df_rapproche_pp[id_paiement]).to_numpy()
+    mask_rejected = np.isin(components, components[mask_conflict])
+    return df_rapproche_dm[~mask_rejected], df_rapproche_dm[mask_rejected]
+
+def master_mapping_ownership_parallel(
+    df_paiement: pd.DataFrame,
+    df_BO_pp: pd.DataFrame,
+    df_BO_dm: pd.DataFrame,
+    list_cols_clientname_payment: List[str],
+    **kwargs
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Speculative version of the full ownership then dismemberment matching of ABCD: both BO slices are matched
+    at the same time against all the payments, in two processes. The conflicts are resolved with
+    resolve_ownership_conflicts (full ownership first), then the orders of the rejected dismemberment matches
+    and the unmatched dismemberment orders are matched again against the payments left by both branches.
+
+    Parameters:
+    - df_paiement (pd.DataFrame): DataFrame containing client payment data.
+    - df_BO_pp (pd.DataFrame): Full ownership BO orders, with Start_Date / End_Date.
+    - df_BO_dm (pd.DataFrame): Dismemberment BO orders, with Start_Date / End_Date.
+    - list_cols_clientname_payment (List[str]): List of columns regarding the payer in the payment table.
+    - kwargs: Additional optional parameters for master_mapping_bo_paiement. Each branch primes its own
+      candidate store, the 'hits' / 'misses' of both branches are added to the candidate_store passed, which
+      is used by the repair pass.
+        - nb_days_period_dm (int): nb_days_period of the dismemberment branch and of the repair pass
+          (default nb_days_period).
+
+    Returns:
+    - Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]: 
+      - Full ownership matches
+      - Dismemberment matches
+      - Unmatched payments
+      - Unmatched full ownership orders
+      - Unmatched dismemberment orders
+    """
+    id_paiement = kwargs.get('payment_id') or kwargs.get('id_paiement')
+    # The candidate store is joined on the tables of one branch, each process primes its own and sends back
+    # its counters
+    candidate_store = kwargs.get('candidate_store')
+    if candidate_store is None:
+        candidate_store = create_candidate_store()
+    nb_days_period_dm = kwargs.get('nb_days_period_dm', kwargs.get('nb_days_period'))
+    kwargs = {key: value for key, value in kwargs.items() if key not in ['candidate_store', 'nb_days_period_dm']}
+    kwargs_dm = kwargs if nb_days_period_dm is None else dict(kwargs, nb_days_period=nb_days_period_dm)
+    list_args = [(df_paiement, df_BO_pp, list_cols_clientname_payment, kwargs),
+                 (df_paiement, df_BO_dm, list_cols_clientname_payment, kwargs_dm)]
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        list_captured = list(executor.map(capture_records, repeat(_run_ownership_branch), list_args))
+    for (_, dict_counters), list_records in list_captured:
+        emit_records(list_records)
+        for key, value in dict_counters.items():
+            candidate_store[key] += value
+    (df_rapproche_pp, df_paiement_pp, df_BO_pp), (df_rapproche_dm, _, df_BO_dm_restant) = \
+        [result for (result, _), _ in list_captured]
+
+    # Full ownership first, the dismemberment matches using one of its payments are dropped
+    df_rapproche_dm, df_rejected = resolve_ownership_conflicts(df_rapproche_pp, df_rapproche_dm, id_paiement)
+    if not df_rapproche_dm.empty:
+        df_paiement_pp = df_paiement_pp[~df_paiement_pp[id_paiement].isin(df_rapproche_dm[id_paiement])]
+
+    # The orders which lost their match, or lost a duplicate conflict against a payment taken by the full
+    # ownership, get a new chance on the remaining payments
+    if not df_rejected.empty or not df_rapproche_pp.empty:
+        df_BO_repair = df_BO_dm[df_BO_dm['order_id'].isin(df_rejected['order_id']) |
+                                df_BO_dm['order_id'].isin(df_BO_dm_restant['order_id'])]
+        df_rapproche_repair, df_paiement_pp, df_BO_dm_restant = master_mapping_bo_paiement(
+            df_paiement_pp, df_BO_repair, list_cols_clientname_payment, candidate_store=candidate_store, **kwargs_dm
+        )
+        df_rapproche_dm = pd.concat([df_rapproche_dm, df_rapproche_repair])
+
+    return df_rapproche_pp, df_rapproche_dm, df_paiement_pp, df_BO_pp, df_BO_dm_restant
+
+def get_amount_columns(amount_colname: str) -> List[str]:
+    """
+    Returns the amount columns converted to cents during the matching (payment amount, BO amount and the sums
+    and differences computed by the passes).
+    """
+    return [amount_colname, 'total_amount', 'check_amount', amount_colname + '_total', 'ecart_montant']
+
+def get_nb_days_period(entity: str, share_type: Optional[str] = None, **kwargs) -> int:
+    """
+    Returns the nb_days_period given to the matching passes (aggregation windows of the n payments / n orders
+    passes): kwargs['nb_days_period'] when given, otherwise the period of the orders in dict_nb_jours
+    ('ABCD_PP' / 'ABCD_DM' from the share type for ABCD, the entity name then 'xyz' for the other entities).
+
+    Parameters:
+    - entity (str): Entity type, either 'ABCD' or 'xyz'.
+    - share_type (Optional[str]): Share type of the ABCD orders ('Full ownership' or dismemberment).
+    - kwargs: Parameters of master_mapping_transfer_check (nb_days_period, dict_nb_jours).
+
+    Returns:
+    - int: Number of days.
+    """
+    if kwargs.get('nb_days_period') is not None:
+        return kwargs['nb_days_period']
+    dict_nb_jours = kwargs.get('dict_nb_jours', {})
+    if entity == 'ABCD':
+        return dict_nb_jours['ABCD_PP'] if share_type == 'Full ownership' else dict_nb_jours['ABCD_DM']
+    # The other entities are keyed by their name or by 'xyz'
+    return dict_nb_jours.get(entity, dict_nb_jours.get('xyz'))
+
+def prepare_mapping_inputs(
+    entity: str,
+    df_paiement: pd.DataFrame,
+    df_BO: pd.DataFrame,
+    **kwargs
+) -> Tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    Prepares the payments and BO orders for the matching passes: amounts in integer cents, dates in datetime64
+    and the period of each order (Start_Date / End_Date, from dict_nb_jours and the share type for ABCD).
+
+    Parameters:
+    - entity (str): Entity type, either 'ABCD' or 'xyz'.
+    - df_paiement (pd.DataFrame): DataFrame containing client payment data, with the columns to keep.
+    - df_BO (pd.DataFrame): DataFrame containing BO orders, with the columns of the entity.
+    - kwargs: Parameters of master_mapping_transfer_check (date_colname, amount_colname, amount_threshold,
+      dict_nb_jours, nb_days_period, order_period_windows, amounts_in_cents...).
+
+    Returns:
+    - Tuple[pd.DataFrame, pd.DataFrame, dict]: 
+      - Prepared payments DataFrame
+      - Prepared BO orders DataFrame
+      - kwargs for master_mapping_bo_paiement and the mapping functions. With nb_days_period or
+        order_period_windows, they have the nb_days_period of the entity (see get_nb_days_period, the full
+        ownership one for ABCD)
+    """
+    date_colname = kwargs.get('date_colname')
+    amount_colname = kwargs.get('amount_colname')
+    dict_nb_jours = kwargs.get('dict_nb_jours', {})
+
+    # list_cols_clientname_payment is given as a positional argument to master_mapping_bo_paiement
+    kwargs_bo = {key: value for key, value in kwargs.items() if key != 'list_cols_clientname_payment'}
+
+    # Amounts in integer cents during the matching (exact comparisons and sums), converted back in the result
+    df_paiement = df_paiement.copy()
+    df_BO = df_BO.copy()
+    if kwargs.get('amounts_in_cents', True):
+        for df in [df_paiement, df_BO]:
+            for col in [col for col in get_amount_columns(amount_colname) if col in df.columns]:
+                df[col] = to_cents(df[col])
+        kwargs_bo['amount_threshold'] = int(round(kwargs.get('amount_threshold', 5) * 100))
+
+    # Dates in datetime64[ns] once for the whole matching, Start_Date / End_Date are computed on them
+    df_paiement[date_colname] = to_datetime64(df_paiement[date_colname])
+    df_BO['creation_date'] = to_datetime64(df_BO['creation_date'])
+
+    kwargs_period = {'dict_nb_jours': dict_nb_jours}
+    if entity == 'ABCD':
+        mask_pp = df_BO.share_type == 'Full ownership'
+        nb_days_period = np.where(mask_pp, get_nb_days_period(entity, 'Full ownership', **kwargs_period),
+                                  get_nb_days_period(entity, **kwargs_period))
+    else:
+        nb_days_period = get_nb_days_period(entity, **kwargs_period)
+    df_BO['Start_Date'] = df_BO['creation_date']
+    df_BO['End_Date'] = df_BO['creation_date'] + pd.to_timedelta(nb_days_period, unit='D')
+
+    # Aggregation period of the n payments / n orders passes, only on request: the period of the orders gives
+    # wider windows (more matches, much slower), otherwise the passes keep their default of 2 days
+    if kwargs.get('nb_days_period') is not None or kwargs.get('order_period_windows', False):
+        kwargs_bo['nb_days_period'] = get_nb_days_period(entity, 'Full ownership', **kwargs)
+
+    return df_paiement, df_BO, kwargs_bo
+
 def master_mapping_transfer_check(
     entity: str,
     df_paiement: pd.DataFrame,
@@ -198,6 +561,14 @@ def master_mapping_transfer_check(
         - min_score (int): Minimum accepted similarity score.
         - bo_name_col ([str]): Column name in the BO table for the subscriber name.
         - dict_nb_jours (Dict[str, int]): Dictionary containing the number of days before and after the subscription date to search for the payment.
+        - nb_days_period (int): Aggregation period of the n payments / n orders passes. By default the 2 day
+          default of the passes.
+        - order_period_windows (bool): Without nb_days_period, uses the period of the orders in dict_nb_jours as
+          aggregation period (see get_nb_days_period). More matches, but much slower. Default False.
+        - amounts_in_cents (bool): Converts the amounts (and amount_threshold) to int64 cents for the matching and
+          back to euros in the result (default True).
+        - parallel_ownership (bool): For ABCD, matches the full ownership and dismemberment orders at the same time
+          (see master_mapping_ownership_parallel) instead of one after the other. Default False.
 
     Returns:
     - pd.DataFrame: Final DataFrame with matched and unmatched payments and BO orders.
@@ -207,7 +578,8 @@ def master_mapping_transfer_check(
     date_colname = kwargs.get('date_colname')
     amount_colname = kwargs.get('amount_colname')
     id_paiement = kwargs.get('id_paiement')
-    dict_nb_jours = kwargs.get('dict_nb_jours', {})
+    record = start_record('reconciliation', 'master_mapping_transfer_check', entity=entity,
+                          nb_payments_in=len(df_paiement), nb_orders_in=len(df_BO))
 
     # Retain only necessary columns in the payment DataFrame and preserve column order
     col_paiements = [id_paiement, date_colname, amount_colname] + col_paiements + list_cols_clientname_payment
@@ -216,37 +588,42 @@ def master_mapping_transfer_check(
     df_BO = df_BO[col_BO]
     old_col = col_paiements + col_BO
 
+    df_paiement, df_BO, kwargs_bo = prepare_mapping_inputs(entity, df_paiement, df_BO, **kwargs)
+    amounts_in_cents = kwargs.get('amounts_in_cents', True)
+    list_amount_cols = get_amount_columns(amount_colname)
+
     if entity == 'ABCD':
         df_BO_pp = df_BO[df_BO.share_type == 'Full ownership']
         df_BO_dm = df_BO[df_BO.share_type != 'Full ownership']
+        # The dismemberment orders have their own period when the passes get one
+        kwargs_bo_dm = kwargs_bo
+        if 'nb_days_period' in kwargs_bo:
+            kwargs_bo_dm = dict(kwargs_bo, nb_days_period=get_nb_days_period(entity, **kwargs))
+
+        if kwargs.get('parallel_ownership', False):
+            # Both slices at the same time, full ownership keeps the priority on conflicts
+            df_rapproche_pp, df_rapproche_dm, df_paiement, df_BO_pp, df_BO_dm = master_mapping_ownership_parallel(
+                df_paiement, df_BO_pp, df_BO_dm, list_cols_clientname_payment,
+                nb_days_period_dm=kwargs_bo_dm.get('nb_days_period'), **kwargs_bo
+            )
+        else:
+            # Process full ownership
+            df_rapproche_pp, df_paiement, df_BO_pp = master_mapping_bo_paiement(df_paiement, df_BO_pp,
+                                                                                 list_cols_clientname_payment, **kwargs_bo)
 
-        # Process full ownership
-        nb_days_period = dict_nb_jours['ABCD_PP']
-        df_BO_pp['Start_Date'] = df_BO_pp['creation_date']
-        df_BO_pp['End_Date'] = df_BO_pp['creation_date'] + dt.timedelta(days=nb_days_period)
-        df_rapproche_pp, df_paiement, df_BO_pp = master_mapping_bo_paiement(df_paiement, df_BO_pp,
-                                                                             list_cols_clientname_payment, **kwargs)
-
-        # Process dismemberment
-        nb_days_period = dict_nb_jours['ABCD_DM']
-        df_BO_dm['Start_Date'] = df_BO_dm['creation_date']
-        df_BO_dm['End_Date'] = df_BO_dm['creation_date'] + dt.timedelta(days=nb_days_period)
-        df_rapproche_dm, df_paiement, df_BO_dm = master_mapping_bo_paiement(df_paiement, df_BO_dm,
-                                                                             list_cols_clientname_payment, **kwargs)
+            # Process dismemberment
+            df_rapproche_dm, df_paiement, df_BO_dm = master_mapping_bo_paiement(df_paiement, df_BO_dm,
+                                                                                 list_cols_clientname_payment, **kwargs_bo_dm)
         df_rapproche = pd.concat([df_rapproche_pp, df_rapproche_dm])
         df_BO = pd.concat([df_BO_dm, df_BO_pp])
     else:
         # Process other entity
-        nb_days_period = dict_nb_jours['xyz']
-        df_BO['Start_Date'] = df_BO['creation_date']
-        df_BO['End_Date'] = df_BO['creation_date'] + dt.timedelta(days=nb_days_period)
         df_rapproche, df_paiement, df_BO = master_mapping_bo_paiement(df_paiement, df_BO,
-                                                                      list_cols_clientname_payment, **kwargs)
+                                                                      list_cols_clientname_payment, **kwargs_bo)
 
-    # Display summary of results
-    print(f'Number of matched payment rows: {len(df_rapproche)},\n' +
-          f'Number of unmatched payment rows: {len(df_paiement)},\n' +
-          f'Number of unmatched BO rows: {len(df_BO)}')
+    # Summary of the results
+    end_record(record, nb_matched_rows=len(df_rapproche), nb_unmatched_payments=len(df_paiement),
+               nb_unmatched_orders=len(df_BO))
 
     # Map column names
     dict_name = dict(zip(df_mapping_col['column'], df_mapping_col[entity]))
@@ -257,6 +634,9 @@ def master_mapping_transfer_check(
     df_paiement_final = pd.concat([df_rapproche, df_paiement]).drop(columns=['Start_Date', 'End_Date', 'id_unique', 'nom_commun'], errors='ignore')
     new_col = [x for x in df_paiement_final.columns if x not in old_col]
     df_paiement_final = df_paiement_final[old_col + new_col].sort_values(by='categorie', ascending=False)
+    if amounts_in_cents:
+        for col in [col for col in list_amount_cols if col in df_paiement_final.columns]:
+            df_paiement_final[col] = from_cents(df_paiement_final[col])
     df_paiement_final = df_paiement_final.rename(columns=dict_name)
 
     return df_paiement_final
\ No newline at end of file
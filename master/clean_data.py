@@ -1,13 +1,77 @@
 import datetime as dt
+import numpy as np
 import pandas as pd
 
 from utils.clean_reference import *
 from utils.utils import *
-from utils.clean_check_reject import *
 from utils.clean_check import *
 from utils.clean_reference import *
+from utils.instrumentation import *
 
 
+# Buckets of the MT940 lines, in the order of the result of clean_data_mt940 (-1: line not reconciled)
+LIST_MT940_BUCKETS = ['Transfer', 'Check', 'Direct_debit', 'Check_rejected', 'Direct_debit_rejected']
+
+def _match_distinct(values: pd.Series, func) -> np.ndarray:
+    """
+    Evaluates a rule (function of a Series of strings returning booleans) once per distinct value of a
+    low cardinality column and maps the result back to the rows.
+
+    Returns:
+        np.ndarray: Boolean mask of the rows, False for missing values.
+    """
+    codes, uniques = pd.factorize(values)
+    if len(uniques) == 0:
+        return np.zeros(len(values), dtype=bool)
+    mask_uniques = np.append(func(pd.Series(uniques, dtype=object)).fillna(False).to_numpy(dtype=bool), False)
+    return mask_uniques[codes]
+
+def classify_mt940(df_releve: pd.DataFrame, entity: str) -> np.ndarray:
+    """
+    Assigns each MT940 line to its bucket of LIST_MT940_BUCKETS in one pass: the rules on country,
+    sense and transaction_type are evaluated once per distinct value, the rules on the text columns only on
+    the lines of the buckets they concern.
+
+    Parameters:
+        df_releve (pd.DataFrame): The bank statement data.
+        entity (str): The entity type, used to filter transfers.
+
+    Returns:
+        np.ndarray: Position of the bucket of each line in LIST_MT940_BUCKETS, -1 for the other lines.
+    """
+    is_fr = _match_distinct(df_releve['country'], lambda values: values == 'FRANCE')
+    is_credit = _match_distinct(df_releve['sense'], lambda values: values == 'C')
+    is_debit = _match_distinct(df_releve['sense'], lambda values: values == 'D')
+    transaction_type = df_releve['transaction_type']
+    # Transfers first: a type containing several labels is classified as the first one
+    list_conditions = [
+        _match_distinct(transaction_type, lambda values: values.str.contains('Virement', regex=False)) & is_credit,
+        _match_distinct(transaction_type, lambda values: values.str.contains('remise de chèques', regex=False)),
+        _match_distinct(transaction_type, lambda values: values.str.contains('Prélèvements', regex=False)) & is_credit,
+        _match_distinct(transaction_type, lambda values: values == 'Rejected / Not paid') & is_debit
+    ]
+    bucket = np.select(list_conditions, [0, 1, 2, 3], default=-1).astype(np.int8)
+    bucket[~is_fr] = -1
+
+    # Transfers excluded on their texts
+    position = np.flatnonzero(bucket == 0)
+    df_virement = df_releve.iloc[position]
+    mask_excluded = df_virement.transaction_details.astype(str).str.contains('PARRAINAGE', regex=False)
+    if entity != 'ABCD':
+        mask_excluded = mask_excluded | \
+        df_virement.reference1.astype(str).str.contains('COMPANY|CESSION', na=False) | \
+        df_virement.reference1.isnull() | \
+        df_virement.extra_information.astype(str).str.contains('DIVIDEND| PD1 | PD2| PD3 | SHORTTERM BO|OPCVM', na=False)
+    mask_excluded = mask_excluded.to_numpy(dtype=bool)
+    bucket[position[mask_excluded]] = -1
+
+    # Rejections which are not about a check are direct debit rejections
+    position = np.flatnonzero(bucket == 3)
+    mask_check = df_releve.transaction_details.iloc[position].str.contains('CHECK CANCELED|CHECK NOT PAID', na=False).to_numpy()
+    bucket[position[~mask_check]] = 4
+    return bucket
+
+@instrumented('cleaning')
 def clean_data_mt940(df_releve: pd.DataFrame, entity: str) -> dict:
     """
     Clean and categorize transactions from MT940 bank statement data.
@@ -19,49 +83,23 @@ def clean_data_mt940(df_releve: pd.DataFrame, entity: str) -> dict:
     Returns:
     dict: A dictionary containing categorized transaction DataFrames.
     """
-    
-    # Filter transactions for France
-    df_releve_fr = df_releve[df_releve.country=='FRANCE']
+    # One classification of the lines, each bucket is taken once from the statement
+    bucket = classify_mt940(df_releve, entity)
+    dict_position = pd.Series(np.arange(len(bucket))).groupby(bucket).indices
+    dict_result = {name: df_releve.iloc[dict_position.get(num, np.array([], dtype=np.intp))]
+                   for num, name in enumerate(LIST_MT940_BUCKETS)}
 
-    # Filter for transfers, excluding specific types
-    df_virement = df_releve_fr[(df_releve_fr.transaction_type.str.contains('Virement',na=False)) & (df_releve.sense == 'C')]
-    df_virement = df_virement[~df_virement.transaction_details.astype(str).str.contains('PARRAINAGE')]
-    if entity != 'ABCD':
-        mask = (~df_virement.reference1.astype(str).str.contains('COMPANY|CESSION',na=False)) & \
-        (~df_virement.reference1.isnull()) & \
-        (~df_virement.extra_information.astype(str).str.contains('DIVIDEND| PD1 | PD2| PD3 | SHORTTERM BO|OPCVM',na=False)) 
-        df_virement = df_virement.loc[mask,:]
-
-    # Filter for cheque deposits
-    df_releve_cheque = df_releve_fr[df_releve_fr.transaction_type.str.contains('remise de chèques',na=False)]
-    df_releve_cheque = clean_check_mt940(df_releve_cheque,entity)
-
-    # Filter for direct debits
-    mask = (df_releve_fr.transaction_type.str.contains('Prélèvements',na=False)) & (df_releve_fr.sense == 'C')
-    df_releve_prlv = df_releve_fr.loc[mask,:].drop(columns = ['clientname', 'reference1','reference2'])
-
-    # Identify rejected transactions
-    df_debit = df_releve_fr[df_releve_fr.sense == 'D']
-    df_rejet = df_debit[df_debit.transaction_type=='Rejected / Not paid']
-
-    mask = df_rejet.transaction_details.str.contains('CHECK CANCELED|CHECK NOT PAID')
-    df_rejet_cheque = df_rejet[mask]
-    df_rejet_prlv = df_rejet[~mask]
-    dict_result = {
-                'Transfer'   : df_virement,
-                'Check'      : df_releve_cheque,
-                'Direct_debit' : df_releve_prlv,
-                'Check_rejected': df_rejet_cheque,
-                'Direct_debit_rejected'  : df_rejet_prlv
-               }
+    dict_result['Check'] = clean_check_mt940(dict_result['Check'], entity)
+    dict_result['Direct_debit'] = dict_result['Direct_debit'].drop(columns=['clientname', 'reference1', 'reference2'])
     return dict_result
 
-def clean_data_check(df_cheque:pd.DataFrame):
+@instrumented('cleaning')
+def clean_data_check(df_cheque:pd.DataFrame, cache_path:str=None):
     df_cheque['Product'] = df_cheque['Receiver'].map({  'PRODUIT1':'PD1', 
                                                         'PRODUIT2':'PD2', 
                                                         'PRODUIT3':'PD3', 
                                                         'PRODUIT4':'PD4'})
-    df_cheque['check_holder'] = df_cheque['check_holder'].apply(clean_name)
+    df_cheque['check_holder'] = normalize_unique(df_cheque['check_holder'], 'clean_name', cache_path)
     df_cheque['check_number'] = df_cheque['check_number'].apply(clean_num_cheque)
     if 'doc_num' in df_cheque.columns:
         df_cheque['doc_num'] = df_cheque['doc_num'].apply(clean_num_cheque)
@@ -69,14 +107,15 @@ def clean_data_check(df_cheque:pd.DataFrame):
         df_cheque = df_cheque[(df_cheque.NuméroOrdre.isnull()) & (df_cheque.DateReception>='2023-01-01')]
     return df_cheque
 
-def clean_data_BO(df_mapping_col:pd.DataFrame,df_BO:pd.DataFrame,entity:str):
+@instrumented('cleaning', input_arg='df_BO')
+def clean_data_BO(df_mapping_col:pd.DataFrame,df_BO:pd.DataFrame,entity:str,cache_path:str=None):
     ## Renommer les colonnes
     dict_name = dict(zip(df_mapping_col[entity],df_mapping_col['column']))
     df_BO = df_BO.rename(columns=dict_name)
 
     ### Enlever les M et Mme dans le nom
-    df_BO.subscriber_name = df_BO.subscriber_name.apply(clean_name)
-    df_BO.cosubscriber_name = df_BO.cosubscriber_name.apply(clean_name)
+    df_BO.subscriber_name = normalize_unique(df_BO.subscriber_name, 'clean_name', cache_path)
+    df_BO.cosubscriber_name = normalize_unique(df_BO.cosubscriber_name, 'clean_name', cache_path)
     df_BO.order_id = df_BO.order_id.astype(str) 
 
     ### Splitter en virements et chèque
@@ -2,23 +2,174 @@ import datetime as dt
 import pandas as pd
 import numpy as np
 
-from master_project.clean_data import *
+from master.clean_data import *
 from mapping_transfer_check.master_functions import *
-from mapping_reject.check_rejection_functions import *
-from mapping_reject.direct_debit_rejection import *
-from mapping_direct_debit.direct_debit_control import *
+from mapping_check_deposit.check_deposit_functions import *
+from utils.instrumentation import *
 
+# The rejection and direct debit modules are not part of every installation, their steps are skipped without them
+try:
+    from mapping_reject.check_rejection_functions import *
+    CHECK_REJECTION_AVAILABLE = True
+except ImportError:
+    CHECK_REJECTION_AVAILABLE = False
+try:
+    from mapping_reject.direct_debit_rejection import *
+except ImportError:
+    pass
+try:
+    from mapping_direct_debit.direct_debit_control import *
+    DIRECT_DEBIT_AVAILABLE = True
+except ImportError:
+    DIRECT_DEBIT_AVAILABLE = False
+
+
+def get_reconciliation_params(entity: str) -> dict:
+    '''
+    Returns the matching parameters shared by the transfer and check reconciliations of an entity.
+    '''
+    # Name of the subscriber in the BO after clean_data_BO
+    bo_name_col = 'subscriber_name'
+    amount_threshold = 5 if entity == 'ABCD' else 0
+
+    dict_nb_jours = {
+        'ABCD_PP': 60,
+        'ABCD_DM': 180,
+        'XYZ': 20
+    }
+    return {
+        'amount_threshold' : amount_threshold,
+        'min_score'        : 90,
+        'bo_name_col'      : bo_name_col,
+        'dict_nb_jours'    : dict_nb_jours
+    }
+
+def prepare_check_data(df_cheque: pd.DataFrame, entity: str) -> pd.DataFrame:
+    '''
+    Renames the product column of the cleaned check deposit data and keeps the checks of the entity.
+    '''
+    df_cheque = df_cheque.rename(columns={'Product': 'account_num'})
+    if entity == 'ABCD':
+        df_cheque = df_cheque[df_cheque['account_num'].isin(['PD1', 'PD2', 'PD3'])]
+    else:
+        df_cheque = df_cheque[~df_cheque['account_num'].isin(['PD1', 'PD2', 'PD3'])]
+    return df_cheque
+
+def reconcile_transfer_stage(dict_result: dict, tuple_BO: tuple, entity: str, df_mapping_col: pd.DataFrame):
+    '''
+    Step 4.1: reconciles the MT940 transfers with the BO transfer orders. Returns None if there is no transfer.
+    '''
+    df_virement = dict_result['Transfer']
+    df_BO_vir = tuple_BO[0]
+    if len(df_virement) == 0:
+        return None
+    emit_event('progress', 'reconciling_transfers', nb_payments=len(df_virement))
+    
+    list_cols_clientname_payment = ['reference1', 'reference2', 'clientname']
+    date_colname, amount_colname, id_paiement = 'effective_date', 'amount', 'id'
+    col_paiements_to_keep = ['transaction_details', 'account_num']
+    
+    kwargs = {
+        'date_colname'                 : date_colname,
+        'amount_colname'               : amount_colname,
+        'id_paiement'                  : id_paiement,
+        'list_cols_clientname_payment' : list_cols_clientname_payment,
+        **get_reconciliation_params(entity)
+    }
+    
+    return master_mapping_transfer_check(entity, df_virement, df_BO_vir, df_mapping_col, col_paiements_to_keep,
+                                         **kwargs)
+
+def reconcile_check_stage(df_cheque: pd.DataFrame, tuple_BO: tuple, entity: str, df_mapping_col: pd.DataFrame):
+    '''
+    Step 4.2: reconciles the check deposits with the BO check orders. Returns None if there is no check.
+    '''
+    df_BO_chq = tuple_BO[1]
+    if len(df_cheque) == 0:
+        return None
+    df_cheque = prepare_check_data(df_cheque, entity)
+    
+    colonnes = df_mapping_col[~df_mapping_col[entity].isnull()]['column'].to_list()
+    df_BO_chq = df_BO_chq[colonnes]
+    
+    emit_event('progress', 'reconciling_checks', nb_payments=len(df_cheque), nb_orders=len(df_BO_chq))
+    
+    list_cols_clientname_payment = ['check_holder']
+    date_colname, amount_colname, id_paiement = 'reception_date', 'amount', 'check_id'
+    col_paiements_to_keep = ['account_num', 'check_amount', 'doc_num', 'check_date']
+    
+    kwargs = {
+        'date_colname'                 : date_colname,
+        'amount_colname'               : amount_colname,
+        'id_paiement'                  : id_paiement,
+        'list_cols_clientname_payment' : list_cols_clientname_payment,
+        **get_reconciliation_params(entity)
+    }
+    
+    df_cheque_final = master_mapping_transfer_check(entity, df_cheque, df_BO_chq, df_mapping_col, col_paiements_to_keep,
+                                                     **kwargs)
+    return df_cheque_final.rename(columns={'account_num': 'receiving_account'})
+
+def check_deposit_stage(dict_result: dict, df_cheque: pd.DataFrame, entity: str):
+    '''
+    Step 4.3: matches the check deposit lines of the MT940 with the deposit slips of the check deposit data, to give
+    each check the id of its MT940 line. Returns None if there is no deposit line or no check.
+    '''
+    df_releve_cheque = dict_result['Check']
+    if len(df_releve_cheque) == 0 or len(df_cheque) == 0:
+        return None
+    df_cheque = prepare_check_data(df_cheque, entity)
+    emit_event('progress', 'matching_check_deposits', nb_payments=len(df_releve_cheque), nb_checks=len(df_cheque))
+    return master_mapping_check_deposit(df_releve_cheque, df_cheque, nb_days=5)
+
+def direct_debit_stage(dict_result: dict, df_prlv_sub: pd.DataFrame, entity: str):
+    '''
+    Step 4.4: verifies the direct debits of the MT940 against the direct debit XML data. Returns None if there is none
+    or if mapping_direct_debit is not installed.
+    '''
+    df_releve_prlv = dict_result['Direct_debit']
+    if len(df_releve_prlv) == 0:
+        return None
+    if not DIRECT_DEBIT_AVAILABLE:
+        emit_event('progress', 'direct_debit_skipped', nb_payments=len(df_releve_prlv))
+        return None
+    df_prlv_sub = df_prlv_sub.copy()
+    df_prlv_sub.session_id = df_prlv_sub.session_id.str.upper()
+    return check_direct_debit(df_prlv_sub, df_releve_prlv, entity)
+
+def check_rejection_stage(dict_result: dict, df_cheque: pd.DataFrame, entity: str):
+    '''
+    Step 5: reconciles the rejected checks of the MT940 with the check deposits. Returns None if there is none
+    or if mapping_reject.check_rejection_functions is not installed, otherwise the matched and the unmatched
+    rejections (see master_mapping_check_rejection).
+    '''
+    df_rejet_cheque = dict_result['Check_rejected']
+    if len(df_rejet_cheque) == 0 or not CHECK_REJECTION_AVAILABLE:
+        return None
+    if len(df_cheque) > 0:
+        df_cheque = prepare_check_data(df_cheque, entity)
+    # To do: Take the list of checks from the BO for df_cheque when BO data is cleaner and up-to-date with automatic reconciliation
+    # Replace the following columns with those from BO 
+    # The product of the checks is in account_num after prepare_check_data, as the product of the rejections
+    checknum_column, checkamount_column, checkdate_column, checkproduct_column = 'check_number', 'check_amount', 'check_date', 'account_num'
+    
+    return master_mapping_check_rejection(df_rejet_cheque, df_cheque,
+                                          checknum_column, checkamount_column, checkdate_column, checkproduct_column)
 
 def master_project(entity: str, df_mapping_col: pd.DataFrame, df_releve: pd.DataFrame, 
-                   df_cheque: pd.DataFrame, df_BO: pd.DataFrame, df_prlv_sub: pd.DataFrame):
+                   df_cheque: pd.DataFrame, df_BO: pd.DataFrame, df_prlv_sub: pd.DataFrame,
+                   n_workers: int = None, list_sinks_run: list = None):
     '''
     This is the master function that handles all reconciliations for the project:
     Steps include:
         + Clean input data (names, check number, etc.) for MT940, check deposit, BO
         + Reconcile transfers
         + Reconcile checks
+        + Match the check deposit lines with the deposit slips
         + Perform checks on direct debits
         + Reconcile bounced checks
+    The steps are run as a dependency graph (see run_stage_graph): the transfers, checks, check deposits,
+    direct debits and bounced checks only depend on the cleaned data, so with n_workers they run concurrently in a process pool.
     Args:
         + entity: ABCD or XYZ
         + df_mapping_col: column mapping for the BO
@@ -26,114 +177,46 @@ def master_project(entity: str, df_mapping_col: pd.DataFrame, df_releve: pd.Data
         + df_cheque: check deposit data
         + df_BO: BO Data
         + df_prlv_sub: direct debit XML data
+        + n_workers: number of processes running the independent steps concurrently, None runs them one by one
+        + list_sinks_run: sinks receiving the instrumentation records of this run (see utils.instrumentation),
+          in addition to the sinks already registered
     Returns:
-        Dictionary with the key as the step name and the value as the corresponding result
+        Dictionary with the key as the step name and the value as the corresponding result,
+        'Timing' with the start, end and duration of each step
+        and 'Instrumentation' with the records of the cleaning steps, mapping passes and candidate joins
     '''
-    dict_resultat_project = {}
-    
-    ############# Step 1: Select MT940 data: #############
-    dict_result = clean_data_mt940(df_releve, entity)
-    df_virement = dict_result['Transfer']
-    df_releve_cheque = dict_result['Check']  # To add the step releve_cheque vs remise_chèque to get id_sys
-    df_releve_prlv = dict_result['Direct_debit']
-    df_rejet_cheque = dict_result['Check_rejected']
-    df_rejet_prlv = dict_result['Direct_debit_rejected']
-
-    ############# Step 2: Clean check deposit data #############
-    df_cheque = clean_data_check(df_cheque)
-
-    ############# Step 3: Clean BO data: #############
-    df_BO_vir, df_BO_chq = clean_data_BO(df_mapping_col, df_BO, entity)
-    
-    ############# Step 4: Reconcile credit lines: #############
-    if entity == 'ABCD':
-        bo_name_col = 'client_name'
-        amount_threshold = 5
-    else:
-        bo_name_col = 'sub_name'
-        amount_threshold = 0
-
-    dict_nb_jours = {
-        'ABCD_PP': 60,
-        'ABCD_DM': 180,
-        'XYZ': 20
+    dict_stages = {
+        ############# Step 1: Select MT940 data: #############
+        'Clean_MT940'   : {'func': clean_data_mt940, 'args': (df_releve, entity)},
+        ############# Step 2: Clean check deposit data #############
+        'Clean_check'   : {'func': clean_data_check, 'args': (df_cheque,)},
+        ############# Step 3: Clean BO data: #############
+        'Clean_BO'      : {'func': clean_data_BO, 'args': (df_mapping_col, df_BO, entity)},
+        ############# Step 4: Reconcile credit lines: #############
+        'Transfer'      : {'func': reconcile_transfer_stage, 'depends_on': ['Clean_MT940', 'Clean_BO'],
+                           'args': (entity, df_mapping_col)},
+        'Check'         : {'func': reconcile_check_stage, 'depends_on': ['Clean_check', 'Clean_BO'],
+                           'args': (entity, df_mapping_col)},
+        'Check_deposit' : {'func': check_deposit_stage, 'depends_on': ['Clean_MT940', 'Clean_check'], 'args': (entity,)},
+        'Direct_debit'  : {'func': direct_debit_stage, 'depends_on': ['Clean_MT940'], 'args': (df_prlv_sub, entity)},
+        ############ Step 5: Reconcile debits: #############
+        'check_rejected': {'func': check_rejection_stage, 'depends_on': ['Clean_MT940', 'Clean_check'], 'args': (entity,)}
     }
-    min_score = 90
-    
-    ### 4.1 Reconcile transfers:
-    if len(df_virement) > 0:
-        print(f'RECONCILING TRANSFERS')
-        print(f'Number of transfer lines to process: {len(df_virement)}')
-        
-        list_cols_clientname_payment = ['reference1', 'reference2', 'clientname']
-        date_colname, amount_colname, id_paiement = 'effective_date', 'amount', 'id'
-        col_paiements_to_keep = ['transaction_details', 'account_code']
-        
-        kwargs = {
-            'date_colname'                 : date_colname,
-            'amount_colname'               : amount_colname,
-            'id_paiement'                  : id_paiement,
-            'amount_threshold'             : amount_threshold,
-            'min_score'                    : min_score,
-            'bo_name_col'                  : bo_name_col,
-            'dict_nb_jours'                : dict_nb_jours,
-            'list_cols_clientname_payment' : list_cols_clientname_payment
-        }
-        
-        df_virement_final = master_mapping_transfer_check(entity, df_virement, df_BO_vir, df_mapping_col, col_paiements_to_keep,
-                                                          **kwargs)
-        dict_resultat_project['Transfer'] = df_virement_final
-    
-    ### 4.2 Reconcile checks:
-    if len(df_cheque) > 0:
-        print(f'RECONCILING CHECKS')
-        df_cheque = df_cheque.rename(columns={'Product': 'account_num'})
-        
-        colonnes = df_mapping_col[~df_mapping_col[entity].isnull()]['column'].to_list()
-        df_BO_chq = df_BO_chq[colonnes]
-        
-        if entity == 'ABCD':
-            df_cheque = df_cheque[df_cheque['account_num'].isin(['PD1', '¨PD2', 'PD3'])]
-        else:
-            df_cheque = df_cheque[~df_cheque['account_num'].isin(['PD1', '¨PD2', 'PD3'])]
-        
-        print(f'Number of check lines to reconcile: {len(df_cheque)},\n'+
-              f'Number of BO check lines to reconcile: {len(df_BO_chq)}')
-        
-        list_cols_clientname_payment = ['check_holder']
-        date_colname, amount_colname, id_paiement = 'reception_date', 'amount', 'check_id'
-        col_paiements_to_keep = ['account_num', 'check_amount', 'doc_num', 'check_date']
-        
-        kwargs = {
-            'date_colname'                 : date_colname,
-            'amount_colname'               : amount_colname,
-            'id_paiement'                  : id_paiement,
-            'amount_threshold'             : amount_threshold,
-            'min_score'                    : min_score,
-            'bo_name_col'                  : bo_name_col,
-            'dict_nb_jours'                : dict_nb_jours,
-            'list_cols_clientname_payment' : list_cols_clientname_payment
-        }
-        
-        df_cheque_final = master_mapping_transfer_check(entity, df_cheque, df_BO_chq, df_mapping_col, col_paiements_to_keep,
-                                                         **kwargs)
-        df_cheque_final = df_cheque_final.rename(columns={'account_num': 'receiving_account'})
-        dict_resultat_project['Check'] = df_cheque_final
-    
-    ### 4.3 Verify direct debit data:
-    if len(df_releve_prlv) > 0:
-        df_prlv_sub.session_id = df_prlv_sub.session_id.str.upper()
-        df_resultat_prlv = check_direct_debit(df_prlv_sub, df_releve_prlv, entity)
-        dict_resultat_project['Direct_debit'] = df_resultat_prlv
-    
-    ############ Step 5: Reconcile debits: #############
-    if len(df_rejet_cheque) > 0:
-        # To do: Take the list of checks from the BO for df_cheque when BO data is cleaner and up-to-date with automatic reconciliation
-        # Replace the following columns with those from BO 
-        checknum_column, checkamount_column, checkdate_column, checkproduct_column = 'check_number', 'check_amount', 'check_date', 'check_receiver'
-        
-        df_merge_check_rejects = master_mapping_check_rejection(df_rejet_cheque, df_cheque,
-                                                                checknum_column, checkamount_column, checkdate_column, checkproduct_column)
-        dict_resultat_project['check_rejected'] = df_merge_check_rejects
+    list_records = []
+    list_sinks_added = [memory_sink(list_records)] + (list_sinks_run or [])
+    for sink in list_sinks_added:
+        add_sink(sink)
+    try:
+        dict_results, df_timing = run_stage_graph(dict_stages, n_workers)
+    finally:
+        for sink in list_sinks_added:
+            remove_sink(sink)
+
+    dict_resultat_project = {}
+    for stage in ['Transfer', 'Check', 'Check_deposit', 'Direct_debit', 'check_rejected']:
+        if dict_results[stage] is not None:
+            dict_resultat_project[stage] = dict_results[stage]
+    dict_resultat_project['Timing'] = df_timing
+    dict_resultat_project['Instrumentation'] = records_to_frame(list_records)
     
     return dict_resultat_project
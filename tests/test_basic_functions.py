@@ -0,0 +1,68 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+
+from mapping_transfer_check.basic_functions import *
+
+
+def sqlite_join(df_payment: pd.DataFrame, df_BO: pd.DataFrame, amount_threshold: float) -> list:
+    """
+    The SQLite LEFT JOIN that mapping_approximately used to run, as (payment id, order id) pairs.
+    """
+    with sqlite3.connect(':memory:') as conn:
+        df_payment.to_sql('releve', conn, index=False)
+        df_BO.to_sql('BO', conn, index=False)
+        query = """
+            SELECT releve.id, BO.order_id
+            FROM releve
+            LEFT JOIN BO ON (
+                releve.effective_date BETWEEN BO.Start_Date AND BO.End_Date
+        """
+        if amount_threshold != -1000:
+            query += 'AND ABS(releve.amount - BO.total_amount) <= ?)'
+            df_match = pd.read_sql_query(query, conn, params=[amount_threshold])
+        else:
+            query += 'AND releve.amount <= BO.total_amount)'
+            df_match = pd.read_sql_query(query, conn)
+    return list(zip(df_match['id'], df_match['order_id'].astype(object).where(df_match['order_id'].notna(), None)))
+
+def make_tables(nb_payments: int, nb_orders: int, seed: int, in_cents: bool) -> tuple:
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01')
+    df_payment = pd.DataFrame({'id': [f'P{i}' for i in range(nb_payments)],
+                               'effective_date': start + pd.to_timedelta(rng.integers(0, 60, nb_payments), unit='D'),
+                               'amount': rng.integers(1, 40, nb_payments) * 50.0})
+    creation_date = start + pd.to_timedelta(rng.integers(0, 60, nb_orders), unit='D')
+    df_BO = pd.DataFrame({'order_id': [f'O{i}' for i in range(nb_orders)],
+                          'Start_Date': creation_date,
+                          'End_Date': creation_date + pd.to_timedelta(rng.integers(0, 20, nb_orders), unit='D'),
+                          'total_amount': rng.integers(1, 40, nb_orders) * 50.0 + rng.choice([0, 3, 5, 8], nb_orders)})
+    if in_cents:
+        df_payment['amount'] = to_cents(df_payment['amount'])
+        df_BO['total_amount'] = to_cents(df_BO['total_amount'])
+    else:
+        # Missing amounts and dates never match (NULL in SQL)
+        df_payment.loc[::17, 'amount'] = np.nan
+        df_BO.loc[::13, 'total_amount'] = np.nan
+        df_BO.loc[::19, 'End_Date'] = pd.NaT
+    return df_payment, df_BO
+
+@pytest.mark.parametrize('in_cents', [False, True])
+@pytest.mark.parametrize('amount_threshold', [0, 5, -1000])
+def test_interval_join_same_as_sqlite(in_cents, amount_threshold):
+    df_payment, df_BO = make_tables(120, 80, 0, in_cents)
+    threshold = amount_threshold * 100 if in_cents and amount_threshold != -1000 else amount_threshold
+    df_match = mapping_approximately(df_payment, df_BO, 'amount', 'effective_date', threshold)
+    pairs = list(zip(df_match['id'], df_match['order_id'].astype(object).where(df_match['order_id'].notna(), None)))
+    expected = sqlite_join(df_payment, df_BO, threshold)
+    assert any(order_id is not None for _, order_id in expected)
+    # Same pairs, in the nested-loop order of the LEFT JOIN
+    assert pairs == expected
+
+def test_interval_join_empty_tables():
+    df_payment, df_BO = make_tables(10, 10, 0, False)
+    left, right = interval_join_positions(df_payment.iloc[:0], df_BO, 'amount', 'effective_date', 5)
+    assert len(left) == len(right) == 0
+    left, right = interval_join_positions(df_payment, df_BO.iloc[:0], 'amount', 'effective_date', 5)
+    assert len(left) == len(right) == 0
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from mapping_check_deposit.check_deposit_functions import *
+
+
+def to_list(values: pd.Series) -> list:
+    return values.astype(object).where(values.notna(), None).tolist()
+
+def make_deposit_lines() -> pd.DataFrame:
+    """
+    Deposit lines as clean_check_mt940 gives them: a deposit_number (BORDEREAU lines) or nb_checks and deposit_date.
+    """
+    return pd.DataFrame({
+        'id': ['DEP1', 'DEP2', 'DEP3', 'DEP4', 'DEP5', 'DEP6'],
+        'account_num': ['PD1', 'PD1', 'PD2', 'PD1', 'PD2', 'PD1'],
+        'date': pd.to_datetime(['2024-03-02', '2024-03-06', '2024-03-21', '2024-04-11', '2024-04-02', '2024-03-02']),
+        'amount': [150.0, 300.0, 80.0, 60.0, 100.0, 150.0],
+        'deposit_number': ['12', None, None, None, '0000056', None],
+        'nb_checks': [None, '2', '1', '1', None, None],
+        'deposit_date': pd.to_datetime([None, '2024-03-05', '2024-03-20', '2024-04-10', None, None])
+    })
+
+def make_deposit_checks() -> pd.DataFrame:
+    return pd.DataFrame({
+        'check_id': [f'CHK{i}' for i in range(10)],
+        'doc_num': ['00000012', '00000012', None, None, None, None, None, '56', '56', None],
+        'account_num': ['PD1', 'PD1', 'PD1', 'PD1', 'PD2', 'PD1', 'PD1', 'PD2', 'PD2', 'PD1'],
+        'check_amount': [100.0, 50.0, 200.0, 100.0, 80.0, 30.0, 60.0, 40.0, 50.0, 30.0],
+        # DEP4: the slip of two checks is the closest in date, the slip of one check is kept
+        'reception_date': pd.to_datetime(['2024-03-01', '2024-03-01', '2024-03-03', '2024-03-03', '2024-03-10',
+                                          '2024-04-09', '2024-04-06', '2024-04-01', '2024-04-01', '2024-04-09'])
+    })
+
+def test_master_mapping_check_deposit():
+    df_result, df_cheque = master_mapping_check_deposit(make_deposit_lines(), make_deposit_checks())
+    df_result = df_result.set_index('id')
+    assert to_list(df_result['deposit_match']) == ['deposit_number', 'date_amount', None, 'date_amount',
+                                                   'deposit_number', None]
+    # Deposit number: the sum of the checks is controlled, DEP5 lacks 10 euros
+    assert df_result.loc[['DEP1', 'DEP5'], 'checks_amount'].tolist() == [150.0, 90.0]
+    assert df_result.loc[['DEP1', 'DEP5'], 'amount_difference'].tolist() == [0.0, 10.0]
+    assert df_result['amount_ok'].tolist() == [True, True, False, True, False, False]
+    assert df_result.loc['DEP2', 'nb_checks_found'] == 2
+    # Every check of a slip gets the id of its deposit line, DEP6 does not take the slip of DEP1
+    assert to_list(df_cheque['deposit_id']) == ['DEP1', 'DEP1', 'DEP2', 'DEP2', None, None, 'DEP4', 'DEP5', 'DEP5',
+                                                None]
+    assert to_list(df_cheque['deposit_match'])[:4] == ['deposit_number'] * 2 + ['date_amount'] * 2
+
+def test_master_mapping_check_deposit_nb_days():
+    # The checks of DEP3 were received 10 days before the deposit
+    df_result, df_cheque = master_mapping_check_deposit(make_deposit_lines(), make_deposit_checks(), nb_days=10)
+    assert df_result.set_index('id').loc['DEP3', 'deposit_match'] == 'date_amount'
+    assert df_cheque.loc[df_cheque['check_id'] == 'CHK4', 'deposit_id'].tolist() == ['DEP3']
+
+def test_match_deposit_number_same_account_first():
+    df_remise = pd.DataFrame({'id': ['DEP1'], 'account_num': ['PD2'], 'deposit_key': ['00000012'],
+                              'date_deposit': pd.to_datetime(['2024-03-02'])})
+    df_slip = pd.DataFrame({'slip_key': ['A', 'B'], 'doc_num': ['00000012', '00000012'], 'account_num': ['PD1', 'PD2'],
+                            'reception_date': pd.to_datetime(['2024-03-01', '2024-01-01'])})
+    assert match_deposit_number(df_remise, df_slip)['slip_key'].tolist() == ['B']
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from mapping_reject.check_rejection_functions import *
+
+
+def make_rejections(list_details: list, list_amounts: list, list_dates: list) -> pd.DataFrame:
+    return pd.DataFrame({'id': [f'RJ{i}' for i in range(len(list_details))],
+                         'transaction_details': list_details,
+                         'amount': list_amounts,
+                         'date': pd.to_datetime(list_dates)})
+
+def make_checks(list_numbers: list, list_amounts: list, list_dates: list) -> pd.DataFrame:
+    return pd.DataFrame({'check_id': [f'CHK{i}' for i in range(len(list_numbers))],
+                         'check_number': list_numbers,
+                         'check_amount': list_amounts,
+                         'check_date': pd.to_datetime(list_dates)})
+
+def test_normalize_num_cheque_leading_zeros():
+    values = pd.Series(['0001234567', '1234567', '01234567.0', None, '00000000'])
+    assert normalize_num_cheque(values).tolist() == ['01234567', '01234567', '01234567', None, '00000000']
+
+@pytest.mark.parametrize('rejected_number, deposited_number', [('0001234567', '1234567'), ('1234567', '0001234567')])
+def test_check_rejection_leading_zeros(rejected_number, deposited_number):
+    df_rejet = make_rejections([f'CHECK NOT PAID {rejected_number}'], [-150.0], ['2024-03-10'])
+    df_cheque = make_checks([deposited_number], [150.0], ['2024-03-01'])
+    df_matched, df_unmatched = master_mapping_check_rejection(df_rejet, df_cheque, 'check_number', 'check_amount',
+                                                              'check_date', 'account_num')
+    assert df_matched['check_id'].tolist() == ['CHK0']
+    assert df_matched['match_type'].tolist() == ['exact']
+    assert df_unmatched.empty
+
+def test_match_typo_check_same_number():
+    # Same number once the leading zeros are ignored: kept by the typo step as an exact match
+    df_rejet = pd.DataFrame({'reject_pos': [0], 'check_number': ['0001234567'], 'amount_cents': [15000],
+                             'date': pd.to_datetime(['2024-03-10'])})
+    df_check = pd.DataFrame({'check_pos': [0], 'check_number': ['01234567'], 'amount_cents': [15000],
+                             'check_date': pd.to_datetime(['2024-03-01'])})
+    df_pairs = match_typo_check(df_rejet, df_check)
+    assert df_pairs['match_type'].tolist() == ['exact']
+
+def test_master_mapping_check_rejection():
+    df_rejet = make_rejections(['CHECK NOT PAID 1234567', 'CHECK CANCELED 2345678', 'CHECK NOT PAID 3456789',
+                                'CHECK NOT PAID 4567890', 'CHECK NOT PAID 5678901', 'CHECK NOT PAID 6789012',
+                                'CHECK NOT PAID', 'CHECK NOT PAID 8901234', 'CHECK NOT PAID 9012345'],
+                               [-150.0, -200.0, -300.0, -400.0, -500.0, -600.0, -700.0, -800.0, -900.0],
+                               ['2024-03-10'] * 8 + ['2025-06-01'])
+    # The number of RJ6 is only in its reference
+    df_rejet['reference1'] = [None] * 6 + ['REF 7890123', None, None]
+    df_cheque = make_checks(['1234567', '2345670', '3457689', '456789', '9999999', '6789012', '7890123', '8911244',
+                             '9012346'],
+                            [150.0, 200.0, 300.0, 400.0, 500.0, 650.0, 700.0, 800.0, 900.0],
+                            ['2024-03-01'] * 9)
+    df_matched, df_unmatched = master_mapping_check_rejection(df_rejet, df_cheque, 'check_number', 'check_amount',
+                                                              'check_date', 'account_num')
+    # Exact number, one digit different, two swapped digits, truncated number, number of the reference
+    assert df_matched['id'].tolist() == ['RJ0', 'RJ1', 'RJ2', 'RJ3', 'RJ6']
+    assert df_matched['check_id'].tolist() == ['CHK0', 'CHK1', 'CHK2', 'CHK3', 'CHK6']
+    assert df_matched['match_type'].tolist() == ['exact', 'typo', 'typo', 'prefix', 'exact']
+    assert df_matched['date_gap_days'].tolist() == [9] * 5
+    # Other number, other amount, two digits different, typo more than nb_days after the check
+    assert df_unmatched['id'].tolist() == ['RJ4', 'RJ5', 'RJ7', 'RJ8']
+    assert df_unmatched['rejected_check_number'].tolist() == ['05678901', '06789012', '08901234', '09012345']
+
+def test_check_rejection_same_product_first():
+    df_rejet = make_rejections(['CHECK NOT PAID 1234567'], [-150.0], ['2024-03-10']).assign(account_num='PD2')
+    df_cheque = make_checks(['1234567', '1234567'], [150.0, 150.0], ['2024-03-09', '2024-03-01'])
+    df_cheque['account_num'] = ['PD1', 'PD2']
+    df_matched, _ = master_mapping_check_rejection(df_rejet, df_cheque, 'check_number', 'check_amount', 'check_date',
+                                                   'account_num')
+    assert df_matched['check_id'].tolist() == ['CHK1']
+    # Without the product, the closest check
+    df_matched, _ = master_mapping_check_rejection(df_rejet.drop(columns='account_num'), df_cheque, 'check_number',
+                                                   'check_amount', 'check_date', 'account_num')
+    assert df_matched['check_id'].tolist() == ['CHK0']
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from master.clean_data import *
+
+
+def clean_data_mt940_filters(df_releve: pd.DataFrame, entity: str) -> dict:
+    """
+    The bucket filters that clean_data_mt940 used to run one after the other.
+    """
+    df_releve_fr = df_releve[df_releve.country=='FRANCE']
+
+    df_virement = df_releve_fr[(df_releve_fr.transaction_type.str.contains('Virement',na=False)) & (df_releve.sense == 'C')]
+    df_virement = df_virement[~df_virement.transaction_details.astype(str).str.contains('PARRAINAGE')]
+    if entity != 'ABCD':
+        mask = (~df_virement.reference1.astype(str).str.contains('COMPANY|CESSION',na=False)) & \
+        (~df_virement.reference1.isnull()) & \
+        (~df_virement.extra_information.astype(str).str.contains('DIVIDEND| PD1 | PD2| PD3 | SHORTTERM BO|OPCVM',na=False))
+        df_virement = df_virement.loc[mask,:]
+
+    df_releve_cheque = df_releve_fr[df_releve_fr.transaction_type.str.contains('remise de chèques',na=False)]
+    df_releve_cheque = clean_check_mt940(df_releve_cheque,entity)
+
+    mask = (df_releve_fr.transaction_type.str.contains('Prélèvements',na=False)) & (df_releve_fr.sense == 'C')
+    df_releve_prlv = df_releve_fr.loc[mask,:].drop(columns = ['clientname', 'reference1','reference2'])
+
+    df_debit = df_releve_fr[df_releve_fr.sense == 'D']
+    df_rejet = df_debit[df_debit.transaction_type=='Rejected / Not paid']
+    mask = df_rejet.transaction_details.str.contains('CHECK CANCELED|CHECK NOT PAID')
+    return {'Transfer': df_virement, 'Check': df_releve_cheque, 'Direct_debit': df_releve_prlv,
+            'Check_rejected': df_rejet[mask], 'Direct_debit_rejected': df_rejet[~mask]}
+
+def make_releve(nb_lines: int, seed: int) -> pd.DataFrame:
+    """
+    Statement lines of every bucket, with the texts the transfer and rejection rules look at.
+    """
+    rng = np.random.default_rng(seed)
+    def choice(values):
+        return pd.Series(np.array(values, dtype=object)[rng.integers(0, len(values), nb_lines)], dtype='str')
+    df_releve = pd.DataFrame({
+        'id': pd.Series(np.arange(nb_lines)).map('L{:05d}'.format).astype('str'),
+        'country': choice(['FRANCE', 'FRANCE', 'FRANCE', 'BELGIQUE', None]),
+        'sense': choice(['C', 'C', 'D', None]),
+        'transaction_type': choice(['Virement', 'Virement SEPA recu', 'remise de chèques', 'Prélèvements',
+                                    'Rejected / Not paid', 'Frais bancaires', None]),
+        'amount': rng.integers(100, 100000, nb_lines) / 100,
+        'clientname': choice(['DUPONT JEAN', 'MARTIN LEA', None]),
+        'reference1': choice(['SOUSCRIPTION', 'COMPANY X', 'CESSION PARTS', None]),
+        'reference2': choice(['ORD000123', None]),
+        'transaction_details': choice(['VIR SEPA RECU /DE DUPONT JEAN', 'PARRAINAGE', 'REMISE CHEQUES NOPE/3CHQ 0412',
+                                       'REMISE CHEQUES NOPE/BORDEREAU 00000012', 'CHECK CANCELED 1234567',
+                                       'CHECK NOT PAID 7654321', 'RETOUR PRELEVEMENT', None]),
+        'extra_information': choice(['SEPA CREDIT TRANSFER', 'DIVIDEND', 'CONTRAT PD1 ', 'OPCVM', None])
+    })
+    df_releve['date'] = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, nb_lines), unit='D')
+    # Index not in the order of the lines, the buckets keep the labels of the statement
+    return df_releve.set_axis(rng.permutation(nb_lines) * 3)
+
+@pytest.mark.parametrize('entity', ['ABCD', 'XYZ'])
+def test_clean_data_mt940_same_as_the_filters(entity):
+    df_releve = make_releve(3000, 0)
+    dict_result = clean_data_mt940(df_releve, entity)
+    expected = clean_data_mt940_filters(df_releve, entity)
+    assert list(dict_result) == LIST_MT940_BUCKETS
+    for name in LIST_MT940_BUCKETS:
+        assert len(expected[name]) > 0
+        pd.testing.assert_frame_equal(dict_result[name], expected[name], check_index_type=False)
+
+def test_classify_mt940_lines_of_no_bucket():
+    df_releve = make_releve(3000, 1)
+    bucket = classify_mt940(df_releve, 'XYZ')
+    expected = clean_data_mt940_filters(df_releve, 'XYZ')
+    in_bucket = df_releve.index.isin(np.concatenate([expected[name].index for name in LIST_MT940_BUCKETS]))
+    assert ((bucket == -1) == ~in_bucket).all()
+
+def test_classify_mt940_first_label():
+    # A type with several labels only goes to the first bucket
+    df_releve = pd.DataFrame({'country': ['FRANCE', 'FRANCE'], 'sense': ['C', 'D'],
+                              'transaction_type': ['Virement remise de chèques', 'Virement remise de chèques'],
+                              'reference1': ['REF', 'REF'], 'transaction_details': [None, None],
+                              'extra_information': [None, None]})
+    assert classify_mt940(df_releve, 'ABCD').tolist() == [0, 1]
@@ -0,0 +1,50 @@
+import os
+import csv
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.clean_reference import *
+
+'''
+Regression corpus of clean_name: tests/data/clean_name_corpus.csv holds ~4k raw names (titles, accents, separators,
+case, digits, particles) with the output of the original row-wise clean_name ('<NULL>' for a missing output).
+clean_name and clean_name_series must both give exactly these outputs. When the name patterns are changed on
+purpose, regenerate the expected outputs with: python -m tests.test_clean_name
+'''
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'clean_name_corpus.csv')
+NULL_MARK = '<NULL>'
+
+def read_corpus() -> pd.DataFrame:
+    df_corpus = pd.read_csv(CORPUS_PATH, dtype=object, keep_default_na=False)
+    return df_corpus.astype(object)
+
+def to_marked(values) -> list:
+    return [value if isinstance(value, str) else NULL_MARK for value in values]
+
+def test_clean_name_corpus():
+    df_corpus = read_corpus()
+    assert to_marked(df_corpus['raw'].map(clean_name)) == df_corpus['expected'].tolist()
+
+def test_clean_name_series_corpus():
+    df_corpus = read_corpus()
+    assert to_marked(clean_name_series(df_corpus['raw'])) == df_corpus['expected'].tolist()
+
+@pytest.mark.parametrize('dtype', [object, 'str'])
+def test_clean_name_series_same_as_clean_name(dtype):
+    raw = pd.concat([read_corpus()['raw'], pd.Series([None, 'NAN'], dtype=object)], ignore_index=True)
+    raw = raw.astype(dtype)
+    expected = [clean_name(value) for value in raw.astype(object)]
+    assert to_marked(clean_name_series(raw)) == to_marked(expected)
+
+def test_remove_titles_keeps_the_pattern_order():
+    # One pattern after the other, a single alternation of the patterns gives DUPONT MME and " DUPONT"
+    assert remove_titles('DUPONT MR ET MME') == 'DUPONT ET'
+    assert remove_titles('MME M. DUPONT') == 'MME. DUPONT'
+
+if __name__ == '__main__':
+    df_corpus = read_corpus()
+    df_corpus['expected'] = to_marked(df_corpus['raw'].map(clean_name))
+    df_corpus.to_csv(CORPUS_PATH, index=False, quoting=csv.QUOTE_ALL)
+    print(f'{len(df_corpus)} expected outputs written to {CORPUS_PATH}')
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from utils.clean_reference import *
+
+
+def test_normalize_unique_all_null():
+    values = pd.Series([None, None, None], name='cosubscriber_name')
+    result = normalize_unique(values)
+    assert result.index.equals(values.index)
+    assert result.isnull().all()
+
+def test_normalize_unique_empty():
+    assert len(normalize_unique(pd.Series([], dtype=object))) == 0
+
+@pytest.mark.parametrize('dtype', [object, 'str'])
+def test_normalize_unique_same_as_apply(dtype):
+    values = pd.Series(['M DUPONT', None, 'mme Émilie Martin', 'M DUPONT', 'MR ET MME DURAND'], dtype=dtype)
+    result = normalize_unique(values)
+    expected = values.apply(clean_name)
+    if dtype == 'str':
+        assert result.dtype == values.dtype
+    assert result.fillna('<NA>').tolist() == expected.fillna('<NA>').tolist()
+
+def test_normalize_unique_keeps_str_dtype():
+    # The names are concatenated with other string columns (see duplicates_functions)
+    payer = normalize_unique(pd.Series(['M DUPONT', 'MME MARTIN'], dtype='str'))
+    subscriber = pd.Series(['DUPONT', 'MARTIN'], dtype='str')
+    assert (payer + '|' + subscriber).tolist() == ['DUPONT|DUPONT', 'MARTIN|MARTIN']
+
+def test_clean_data_bo_without_cosubscriber():
+    from benchmark.synthetic_data import generate_dataset
+    from master.clean_data import clean_data_BO
+    dataset = generate_dataset(200, 'ABCD', 0, cosubscriber_rate=0.0)
+    df_BO_vir, df_BO_chq = clean_data_BO(dataset['df_mapping_col'], dataset['BO'], 'ABCD')
+    assert len(df_BO_vir) + len(df_BO_chq) > 0
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from mapping_transfer_check.duplicates_functions import *
+
+
+@pytest.mark.parametrize('dtype_payment, dtype_BO', [('str', object), (object, 'str'), ('str', 'str')])
+def test_merge_duplicates_by_date_str_and_object_names(dtype_payment, dtype_BO):
+    # Two payments of the same client for two orders: the oldest payment goes to the oldest order
+    df_duplicates = pd.DataFrame({
+        'id': ['P1', 'P1', 'P2', 'P2'],
+        'clientname': pd.Series(['DUPONT'] * 4, dtype=dtype_payment),
+        'effective_date': pd.to_datetime(['2024-01-05', '2024-01-05', '2024-02-05', '2024-02-05']),
+        'amount': [100.0] * 4,
+        'order_id': ['O1', 'O2', 'O1', 'O2'],
+        'subscriber_name': pd.Series(['DUPONT'] * 4, dtype=dtype_BO),
+        'creation_date': pd.to_datetime(['2024-01-01', '2024-02-01', '2024-01-01', '2024-02-01']),
+        'total_amount': [100.0] * 4
+    })
+    df_merge = merge_duplicates_by_date(df_duplicates, columns_left=['id', 'clientname', 'effective_date', 'amount'],
+                                        columns_right=['order_id', 'subscriber_name', 'creation_date', 'total_amount'],
+                                        id_left='id', id_right='order_id', clientname_col='clientname')
+    assert sorted(zip(df_merge['id'], df_merge['order_id'])) == [('P1', 'O1'), ('P2', 'O2')]
+
+def test_merge_duplicates_by_date_empty():
+    # No duplicate: empty str payer names and empty object subscriber names
+    df_duplicates = pd.DataFrame({
+        'id': pd.Series(dtype='str'), 'clientname': pd.Series(dtype='str'),
+        'effective_date': pd.Series(dtype='datetime64[ns]'), 'amount': pd.Series(dtype=float),
+        'order_id': pd.Series(dtype='str'), 'subscriber_name': pd.Series(dtype=object),
+        'creation_date': pd.Series(dtype='datetime64[ns]'), 'total_amount': pd.Series(dtype=float)
+    })
+    df_merge = merge_duplicates_by_date(df_duplicates, columns_left=['id', 'clientname', 'effective_date', 'amount'],
+                                        columns_right=['order_id', 'subscriber_name', 'creation_date', 'total_amount'],
+                                        id_left='id', id_right='order_id', clientname_col='clientname')
+    assert df_merge.empty
+
+@pytest.mark.parametrize('nb_days, expected', [
+    (2, [(('P1', 'P2', 'P3'), '2024-01-01', 'DUPONT', 180.0, '2024-01-03'), (('P5',), '2024-01-12', 'DUPONT', 10.0, '2024-01-12'),
+         (('P6', 'P7'), '2024-01-02', 'MARTIN', 150.0, '2024-01-04')]),
+    (4, [(('P1', 'P2', 'P3', 'P4'), '2024-01-01', 'DUPONT', 200.0, '2024-01-05'), (('P5',), '2024-01-12', 'DUPONT', 10.0, '2024-01-12'),
+         (('P6', 'P7'), '2024-01-02', 'MARTIN', 150.0, '2024-01-04')])
+])
+def test_aggregate_by_date(nb_days, expected):
+    # Outputs of the previous SQLite self-join (with the ids joined by '|'): same-day payments first, then the
+    # window of each first date, the rows without a client name are dropped
+    df_payment = pd.DataFrame({
+        'id': ['P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8'],
+        'clientname': ['DUPONT', 'DUPONT', 'DUPONT', 'DUPONT', 'DUPONT', 'MARTIN', 'MARTIN', ''],
+        'effective_date': pd.to_datetime(['2024-01-01', '2024-01-01', '2024-01-03', '2024-01-05', '2024-01-12',
+                                          '2024-01-02', '2024-01-04', '2024-01-02']),
+        'amount': [100.0, 50.0, 30.0, 20.0, 10.0, 70.0, 80.0, 5.0]
+    })
+    df_agg = aggregate_by_date(df_payment, payment_id='id', clientname_col='clientname', date_colname='effective_date',
+                               amount_colname='amount', nb_days=nb_days)
+    assert (df_agg['amount'] == df_agg['amount_total']).all()
+    assert list(zip(df_agg['id'], df_agg['effective_date'].dt.strftime('%Y-%m-%d'), df_agg['clientname'],
+                    df_agg['amount'], df_agg['Max_effective_date'].dt.strftime('%Y-%m-%d'))) == expected
+
+def test_aggregate_by_date_drops_the_dates_after_a_taken_date():
+    # Jan 7 is in the window of Jan 4, taken by Jan 1, but not in the window of Jan 1: it is dropped, as before
+    df_payment = pd.DataFrame({'id': ['P1', 'P2', 'P3', 'P4'], 'clientname': ['DUPONT', 'DUPONT', 'DUPONT', 'MARTIN'],
+                               'effective_date': pd.to_datetime(['2024-01-01', '2024-01-04', '2024-01-07', '2024-01-04']),
+                               'amount': [100.0, 50.0, 30.0, 20.0]})
+    df_agg = aggregate_by_date(df_payment, payment_id='id', clientname_col='clientname', date_colname='effective_date',
+                               amount_colname='amount', nb_days=4)
+    assert list(zip(df_agg['id'], df_agg['amount'])) == [(('P1', 'P2'), 150.0), (('P4',), 20.0)]
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.utils import *
+from benchmark.synthetic_data import _random_names, add_name_noise
+
+needs_rapidfuzz = pytest.mark.skipif(not RAPIDFUZZ_AVAILABLE, reason='rapidfuzz is not installed')
+
+# Pairs where rapidfuzz's partial_ratio scores higher than fuzzywuzzy's: (name1, name2, fuzzywuzzy, rapidfuzz)
+LIST_KNOWN_DIFFERENCES = [
+    ('JEAN DUPONT', 'M DUPONT', 88, 93),
+    ('DUPOND JAAG', 'DUPOND JEAN', 82, 90)
+]
+
+def get_name_pairs(nb_pairs: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """
+    Noisy pairs of the same name and pairs of random names.
+    """
+    rng = np.random.default_rng(seed)
+    names = _random_names(nb_pairs, rng)
+    noisy, _ = add_name_noise(names.copy(), 0.7, rng)
+    df = pd.DataFrame({'name1': pd.concat([names, names]).to_numpy(dtype=object),
+                       'name2': pd.concat([noisy, _random_names(nb_pairs, rng)]).to_numpy(dtype=object)})
+    return df[df['name1'].notna() & df['name2'].notna()].reset_index(drop=True)
+
+def test_default_backend_is_fuzzywuzzy():
+    assert FUZZ_BACKEND == 'fuzzywuzzy'
+    df = get_name_pairs(200)
+    default = calculate_fuzz_score(df.copy(), 'name1', 'name2')['max_score']
+    reference = calculate_fuzz_score(df.copy(), 'name1', 'name2', backend='fuzzywuzzy')['max_score']
+    assert default.equals(reference)
+
+def test_set_fuzz_backend():
+    with pytest.raises(ValueError):
+        set_fuzz_backend('levenshtein')
+    assert set_fuzz_backend() == 'fuzzywuzzy'
+
+@needs_rapidfuzz
+def test_known_differences():
+    df = pd.DataFrame(LIST_KNOWN_DIFFERENCES, columns=['name1', 'name2', 'fuzzywuzzy', 'rapidfuzz'])
+    for backend in ['fuzzywuzzy', 'rapidfuzz']:
+        scores = calculate_fuzz_score(df.copy(), 'name1', 'name2', backend=backend)['max_score']
+        assert scores.tolist() == df[backend].tolist()
+
+@needs_rapidfuzz
+def test_backend_parity():
+    clear_score_cache()
+    df = get_name_pairs(1000)
+    reference = calculate_fuzz_score(df.copy(), 'name1', 'name2', backend='fuzzywuzzy')['max_score'].to_numpy()
+    fast = calculate_fuzz_score(df.copy(), 'name1', 'name2', backend='rapidfuzz')['max_score'].to_numpy()
+    # Identical names score 100 with both, rapidfuzz is never much lower
+    same = (df['name1'] == df['name2']).to_numpy()
+    assert (reference[same] == 100).all() and (fast[same] == 100).all()
+    assert (fast >= reference - 1).all()
+    # Few decisions change at the usual threshold
+    flipped = (reference >= 90) != (fast >= 90)
+    assert flipped.mean() < 0.005
+
+def test_fuzzywuzzy_column_without_names():
+    df = pd.DataFrame({'name1': [np.nan, np.nan], 'name2': ['JEAN DUPONT', 'M DUPONT']})
+    df = calculate_fuzz_score(df, 'name1', 'name2', backend='fuzzywuzzy')
+    assert df['max_score'].isna().all()
+    df = pd.DataFrame({'name1': ['JEAN DUPONT', np.nan], 'name2': ['M DUPONT', 'M DUPONT']})
+    assert calculate_fuzz_score(df, 'name1', 'name2', backend='fuzzywuzzy')['max_score'].tolist()[0] == 88
+
+def test_fuzzywuzzy_pair_cache():
+    clear_score_cache()
+    df = get_name_pairs(200)
+    df = pd.concat([df, df.iloc[:50]], ignore_index=True)
+    scores = calculate_fuzz_score(df.copy(), 'name1', 'name2', backend='fuzzywuzzy')['max_score'].to_numpy()
+    # Reference: the four fuzzywuzzy scores of each row, token_set_ratio and partial_ratio for several words
+    reference = [max(fuzz.token_sort_ratio(t1, t2), fuzz.ratio(t1, t2),
+                     *([fuzz.token_set_ratio(t1, t2), fuzz.partial_ratio(t1, t2)]
+                       if len(t1.split()) > 1 and len(t2.split()) > 1 else []))
+                 for t1, t2 in zip(df['name1'], df['name2'])]
+    assert scores.tolist() == reference
+    nb_pairs = len(set(zip(df['name1'], df['name2'])))
+    assert get_score_cache_info()['misses'] == nb_pairs
+    # A second pass reads every pair from the cache
+    calculate_fuzz_score(df.copy(), 'name1', 'name2', backend='fuzzywuzzy')
+    assert get_score_cache_info()['misses'] == nb_pairs
+    assert get_score_cache_info()['hits'] == 2 * len(df) - nb_pairs
+
+def test_fuzzywuzzy_score_cutoff():
+    clear_score_cache()
+    df = pd.DataFrame({'name1': ['JEAN DUPONT', 'JEAN DUPONT'], 'name2': ['M DUPONT', 'JEAN DUPONT']})
+    scores = calculate_fuzz_score(df, 'name1', 'name2', backend='fuzzywuzzy', score_cutoff=90)['max_score']
+    assert scores.tolist() == [0, 100]
+
+@pytest.mark.parametrize('min_score', [70, 85, 90])
+def test_exact_blocking_keeps_the_pairs_reaching_min_score(min_score):
+    df = get_name_pairs(1000)
+    # Random pairs of names too, most of them are pruned
+    rng = np.random.default_rng(1)
+    df = pd.concat([df, pd.DataFrame({'name1': rng.permutation(df['name1'].to_numpy()),
+                                      'name2': df['name2'].to_numpy()})], ignore_index=True)
+    scores = calculate_fuzz_score_pairs(df['name1'], df['name2'])
+    keep = prune_name_pairs(df['name1'], df['name2'], min_score, 'exact')
+    assert keep[scores >= min_score].all()
+    assert (~keep).sum() > 0
+
+def test_token_blocking():
+    keep = prune_name_pairs(['DUPONT JEAN', 'DUPONTJEAN', 'MARTIN LEA'], ['JEAN DUPONT', 'DUPONT JEAN', 'DUPONT'],
+                            90, 'token')
+    assert keep.tolist() == [True, False, False]
+
+def test_find_commun_word_series_same_as_find_commun_word():
+    df = get_name_pairs(1000)
+    rng = np.random.default_rng(2)
+    list_text1 = list(df['name1']) + list(rng.permutation(df['name1'].to_numpy())) + \
+        ['LES DUPONT', 'LES MARTIN', 'DE LA FONT', 'AL BO', '', 'DUPONT', 'DUPONT']
+    list_text2 = list(df['name2']) + list(df['name2']) + ['LES MARTIN', 'LES MARTIN', 'DE LA FONT', 'AL BO', 'DUPONT', '', None]
+    expected = [find_commun_word(text1, text2) for text1, text2 in zip(list_text1, list_text2)]
+    assert find_commun_word_series(list_text1, list_text2).tolist() == expected
+    assert any(expected) and not all(expected)
@@ -0,0 +1,113 @@
+import pandas as pd
+
+from benchmark.synthetic_data import generate_dataset
+from benchmark.benchmark_suite import prepare_inputs, DICT_PAYMENT_KINDS
+from mapping_transfer_check.master_functions import *
+
+
+def _run_transfer(parallel_ownership: bool) -> tuple:
+    dict_data = generate_dataset(120, 'ABCD', 0)
+    df_paiement, df_BO, _, kwargs = prepare_inputs(dict_data, 'ABCD', 'transfer')
+    # Short aggregation windows, the default period of the orders (60 / 180 days) is slow with fuzzywuzzy
+    kwargs['nb_days_period'] = 10
+    candidate_store = create_candidate_store()
+    df_result = master_mapping_transfer_check('ABCD', df_paiement, df_BO, dict_data['df_mapping_col'],
+                                              DICT_PAYMENT_KINDS['transfer']['col_paiements'],
+                                              parallel_ownership=parallel_ownership, candidate_store=candidate_store,
+                                              **kwargs)
+    return df_result, candidate_store
+
+def test_parallel_ownership_reports_the_candidate_store():
+    df_serial, store_serial = _run_transfer(False)
+    df_parallel, store_parallel = _run_transfer(True)
+    assert store_serial['hits'] > 0
+    # Both branches and the repair pass use a primed store
+    assert store_parallel['hits'] >= store_serial['hits']
+    assert store_parallel['misses'] > 0
+    assert (df_parallel['categorie'] != 'Heavy check').sum() == (df_serial['categorie'] != 'Heavy check').sum()
+
+def test_exact_match_stats_with_workers():
+    dict_data = generate_dataset(120, 'ABCD', 0)
+    df_paiement, df_BO, _, kwargs = prepare_inputs(dict_data, 'ABCD', 'transfer')
+    # Short aggregation windows, the default period of the orders (60 / 180 days) is slow with fuzzywuzzy
+    kwargs['nb_days_period'] = 10
+    list_hits = []
+    for dict_mode in [{}, {'n_workers': 2}, {'parallel_ownership': True}]:
+        list_records = []
+        sink = memory_sink(list_records)
+        add_sink(sink)
+        try:
+            df_result = master_mapping_transfer_check('ABCD', df_paiement, df_BO, dict_data['df_mapping_col'],
+                                                      DICT_PAYMENT_KINDS['transfer']['col_paiements'], **dict_mode,
+                                                      **kwargs)
+        finally:
+            remove_sink(sink)
+        list_hits.append(get_exact_match_stats(list_records)['hits'])
+        assert list_hits[-1] == (df_result['motif'] == 'exact_match').sum()
+    assert list_hits[0] > 0
+    assert list_hits[0] == list_hits[1]
+
+def test_prepare_mapping_inputs_forwards_nb_days_period():
+    dict_nb_jours = {'ABCD_PP': 60, 'ABCD_DM': 180, 'XYZ': 20}
+    assert get_nb_days_period('ABCD', 'Full ownership', dict_nb_jours=dict_nb_jours) == 60
+    assert get_nb_days_period('ABCD', 'Usufruct', dict_nb_jours=dict_nb_jours) == 180
+    assert get_nb_days_period('XYZ', dict_nb_jours=dict_nb_jours) == 20
+    assert get_nb_days_period('xyz', dict_nb_jours={'xyz': 30}) == 30
+    assert get_nb_days_period('ABCD', dict_nb_jours=dict_nb_jours, nb_days_period=10) == 10
+
+    dict_data = generate_dataset(50, 'XYZ', 0)
+    df_paiement, df_BO, _, kwargs = prepare_inputs(dict_data, 'XYZ', 'transfer')
+    df_mapping_col = dict_data['df_mapping_col']
+    col_BO = df_mapping_col[~df_mapping_col['XYZ'].isnull()]['column'].tolist()
+    _, df_BO, kwargs_bo = prepare_mapping_inputs('XYZ', df_paiement, df_BO[col_BO], **kwargs)
+    # By default the passes keep their own period of 2 days
+    assert 'nb_days_period' not in kwargs_bo
+    assert ((df_BO['End_Date'] - df_BO['Start_Date']).dt.days == 20).all()
+    _, _, kwargs_bo = prepare_mapping_inputs('XYZ', df_paiement, df_BO[col_BO], order_period_windows=True, **kwargs)
+    assert kwargs_bo['nb_days_period'] == 20
+    _, _, kwargs_bo = prepare_mapping_inputs('XYZ', df_paiement, df_BO[col_BO], nb_days_period=10, **kwargs)
+    assert kwargs_bo['nb_days_period'] == 10
+
+def test_prime_candidate_store_without_payments():
+    # The payment table left when every payment is matched has no columns
+    df_BO = pd.DataFrame({'order_id': ['O1'], 'Start_Date': pd.to_datetime(['2024-01-01']),
+                          'End_Date': pd.to_datetime(['2024-03-01']), 'total_amount': [10000]})
+    candidate_store = prime_candidate_store(create_candidate_store(), pd.DataFrame(), df_BO, 'amount', 'effective_date',
+                                            500, 'id')
+    assert candidate_store['entries'] == {}
+
+def test_mapping_npeople_without_bo_skips_the_candidate_store():
+    # The date-only join of mapping_npeople (is_bo=False) is not a primed join, it must not count as a miss
+    df_paiement = pd.DataFrame({'id': ['P1', 'P2'], 'effective_date': pd.to_datetime(['2024-01-05', '2024-01-06']),
+                                'amount': [6000, 4000], 'clientname': ['DUPONT JEAN', 'DUPONT JEAN']})
+    df_BO = pd.DataFrame({'order_id': ['O1'], 'product_code': ['PD1'], 'total_amount': [10000],
+                          'creation_date': pd.to_datetime(['2024-01-01']), 'subscriber_name': ['DUPONT JEAN'],
+                          'Start_Date': pd.to_datetime(['2024-01-01']), 'End_Date': pd.to_datetime(['2024-03-01'])})
+    candidate_store = prime_candidate_store(create_candidate_store(), df_paiement, df_BO, 'amount', 'effective_date',
+                                            500, 'id')
+    df_rapproche, df_paiement, _ = mapping_npeople(pd.DataFrame(), df_paiement, df_BO, ['clientname'],
+                                                   date_colname='effective_date', amount_colname='amount',
+                                                   payment_id='id', amount_threshold=500, is_bo=False,
+                                                   motif='n_payments', candidate_store=candidate_store)
+    assert sorted(df_rapproche['id']) == ['P1', 'P2']
+    assert candidate_store['hits'] == candidate_store['misses'] == 0
+
+def test_no_sink_at_import():
+    # Without a sink the records are dropped: importing the matching modules registers none
+    assert list_sinks == []
+
+def test_incremental_windows_same_matches():
+    dict_data = generate_dataset(120, 'ABCD', 0)
+    df_paiement, df_BO, _, kwargs = prepare_inputs(dict_data, 'ABCD', 'transfer')
+    # Windows of 4 to 10 days for the n payments / n orders passes
+    kwargs['nb_days_period'] = 20
+    list_results = []
+    for incremental_windows in [True, False]:
+        df_result = master_mapping_transfer_check('ABCD', df_paiement, df_BO, dict_data['df_mapping_col'],
+                                                  DICT_PAYMENT_KINDS['transfer']['col_paiements'],
+                                                  incremental_windows=incremental_windows, **kwargs)
+        df_result = df_result[df_result['categorie'] != 'Heavy check']
+        list_results.append(sorted(zip(df_result['id'], df_result['Order ID'], df_result['motif'])))
+    assert list_results[0] == list_results[1]
+    # The aggregated payments are matched
+    assert 'npaiement_1ord' in [motif for _, _, motif in list_results[0]]
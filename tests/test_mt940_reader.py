@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.mt940_reader import *
+
+
+SAMPLE_MT940 = '''{1:F01BANKFRPPAXXX0000000000}{2:O9401200240102BANKFRPPAXXX00000000002401021200N}{4:
+:20:STMT1
+:25:FR7630001007941234567890185
+:28C:00001/001
+:60F:C241230EUR1000,00
+:61:2412310102C1500,50NTRFNONREF//BK001
+SUPPLEMENTARY DETAILS
+:86:VIR SEPA RECU /DE DUPONT JEAN /MOTIF SOUSCRIPTION
+ORD000123 CONTRAT PD1
+:61:2412311231D200,NCHK1234567//BK002
+:86:REMISE CHEQUES 2 CHQ
+:61:250102RC50,00NRTIREF3
+:62F:C250102EUR2250,50
+:86:STATEMENT INFORMATION, NOT A TRANSACTION
+-}
+{1:F01BANKFRPPAXXX0000000000}{2:O9401200240102BANKFRPPAXXX00000000002401021200N}{4:
+:20:STMT2
+:25:BE68539007547034
+:28C:00002/001
+:60F:C250102EUR2250,50
+:61:2501030103C75,25NTRFREF4//BK004
+:86:/NAME/MARTIN LEA/REMI/ABONNEMENT
+:62F:C250103EUR2325,75
+-}
+'''
+
+def to_list(values: pd.Series) -> list:
+    return values.astype(object).where(values.notna(), None).tolist()
+
+@pytest.fixture
+def sample_path(tmp_path):
+    path = tmp_path / 'releve.sta'
+    path.write_text(SAMPLE_MT940, encoding='latin-1')
+    return str(path)
+
+def test_read_mt940_sample(sample_path):
+    df = read_mt940(sample_path, dict_accounts={'FR7630001007941234567890185': 'PD1'})
+    assert list(df.columns) == LIST_COLUMNS
+    assert df['id'].tolist() == ['releve-00001/001-0', 'releve-00001/001-1', 'releve-00001/001-2', 'releve-00002/001-3']
+    assert to_list(df['account_num']) == ['PD1'] * 3 + [None]
+    assert df['country'].tolist() == ['FRANCE'] * 3 + ['BELGIQUE']
+    assert df['currency'].tolist() == ['EUR'] * 4
+    assert df['sense'].tolist() == ['C', 'D', 'D', 'C']
+    assert df['amount'].tolist() == [1500.5, 200.0, 50.0, 75.25]
+    assert df['transaction_type'].tolist() == ['Virement', 'remise de chèques', 'Rejected / Not paid', 'Virement']
+    # Entry date in the next year, in the same year, missing
+    assert df['effective_date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-12-31', '2024-12-31', '2025-01-02',
+                                                                     '2025-01-03']
+    assert df['date'].dt.strftime('%Y-%m-%d').tolist() == ['2025-01-02', '2024-12-31', '2025-01-02', '2025-01-03']
+    assert to_list(df['reference1']) == [None, '1234567', 'REF3', 'REF4']
+    assert to_list(df['reference2']) == ['BK001', 'BK002', None, 'BK004']
+    assert to_list(df['extra_information']) == ['SUPPLEMENTARY DETAILS', None, None, None]
+    # :86: on several lines, and the :86: of the statement is not given to the last transaction
+    assert to_list(df['transaction_details']) == [
+        'VIR SEPA RECU /DE DUPONT JEAN /MOTIF SOUSCRIPTION ORD000123 CONTRAT PD1', 'REMISE CHEQUES 2 CHQ', None,
+        '/NAME/MARTIN LEA/REMI/ABONNEMENT']
+    assert to_list(df['clientname']) == ['DUPONT JEAN', None, None, 'MARTIN LEA']
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3])
+def test_read_mt940_chunk_boundaries(sample_path, chunk_size):
+    # The chunks end between two transactions, after the :86: of the last one
+    list_chunks = list(read_mt940_chunks(sample_path, chunk_size))
+    assert [len(df_chunk) for df_chunk in list_chunks] == [chunk_size] * (4 // chunk_size) + \
+        ([4 % chunk_size] if 4 % chunk_size else [])
+    df = pd.concat(list_chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(df, read_mt940(sample_path, chunk_size=100))
+
+def test_convert_mt940_chunk_without_text(sample_path, tmp_path):
+    # The second chunk has no extra_information: same parquet type as in the first one
+    output_path = convert_mt940_to_parquet(sample_path, str(tmp_path / 'releve.parquet'), chunk_size=1)
+    pd.testing.assert_frame_equal(pd.read_parquet(output_path), read_mt940(sample_path), check_dtype=False)
+
+def test_read_mt940_files_in_parallel(sample_path, tmp_path):
+    path2 = tmp_path / 'releve2.sta'
+    path2.write_text(SAMPLE_MT940, encoding='latin-1')
+    df_serial = read_mt940([sample_path, str(path2)])
+    df_parallel = read_mt940([sample_path, str(path2)], n_workers=2)
+    pd.testing.assert_frame_equal(df_serial, df_parallel)
+    assert df_serial['id'].str.startswith('releve2-').sum() == 4
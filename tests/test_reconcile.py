@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from benchmark.synthetic_data import generate_dataset
+from reconcile import *
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    # Small dataset: the n payments passes run on the 60 / 180 day periods of get_reconciliation_params
+    return generate_dataset(12, 'ABCD', 0)
+
+@pytest.mark.parametrize('n_workers', [None, 2])
+def test_master_project_synthetic(dataset, n_workers):
+    dict_result = master_project('ABCD', dataset['df_mapping_col'], dataset['MT940'], dataset['Check_deposit'],
+                                 dataset['BO'], dataset['df_prlv_sub'], n_workers=n_workers)
+    for stage in ['Transfer', 'Check', 'Check_deposit']:
+        assert stage in dict_result
+    df_truth = dataset['Ground_truth']
+    set_truth = set(zip(df_truth['payment_id'], df_truth['order_id']))
+    # account_num of the MT940 is kept with the transfers, every proposal is a true link
+    df_transfer = dict_result['Transfer']
+    assert 'account_num' in df_transfer.columns
+    df_proposition = df_transfer[df_transfer['categorie'] == 'Proposition']
+    assert len(df_proposition) > 0
+    assert set(zip(df_proposition['id'], df_proposition['Order ID'])) <= set_truth
+    # The PD2 checks are kept for ABCD and matched on subscriber_name
+    df_check = dict_result['Check']
+    df_check = df_check[df_check['categorie'] == 'Proposition']
+    assert set(zip(df_check['check_id'], df_check['Order ID'])) <= set_truth
+    assert 'PD2' in set(df_check['receiving_account'])
+    # Each check gets the id of its deposit line
+    df_deposit, df_check_deposit = dict_result['Check_deposit']
+    df_truth_deposit = df_truth.dropna(subset=['deposit_id'])
+    assert dict(zip(df_check_deposit['check_id'], df_check_deposit['deposit_id'])) == \
+        dict(zip(df_truth_deposit['payment_id'], df_truth_deposit['deposit_id']))
+    assert set(dict_result['Timing']['stage']) >= {'Clean_MT940', 'Clean_check', 'Clean_BO', 'Transfer', 'Check',
+                                                   'Check_deposit', 'Direct_debit', 'check_rejected'}
+    assert not dict_result['Instrumentation'].empty
+
+@pytest.mark.skipif(DIRECT_DEBIT_AVAILABLE, reason='mapping_direct_debit is installed')
+def test_direct_debit_stage_without_module():
+    dict_result = {'Direct_debit': pd.DataFrame({'id': [1], 'amount': [10.0]})}
+    assert direct_debit_stage(dict_result, pd.DataFrame({'session_id': ['a']}), 'ABCD') is None
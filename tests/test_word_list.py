@@ -0,0 +1,22 @@
+import importlib
+import re
+
+import utils.clean_reference as clean_reference
+
+
+def test_pattern_clean_motif_is_lazy_and_follows_the_word_list():
+    module = importlib.reload(clean_reference)
+    assert module.dict_word_list['words'] is None
+    module.set_word_list(['PARASITE', r'\bVIR\b'])
+    assert module.pattern_clean_motif == r'PARASITE|\bVIR\b'
+    from utils.clean_reference import pattern_clean_motif
+    assert pattern_clean_motif == module.get_pattern_clean_motif()
+    assert re.sub(pattern_clean_motif, '', 'VIR PARASITE DUPONT').strip() == 'DUPONT'
+
+def test_unknown_attribute():
+    try:
+        clean_reference.not_an_attribute
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('AttributeError expected')
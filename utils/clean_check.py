@@ -24,6 +24,11 @@ def find_deposit_info(text: str = None, find_nb_check: bool = True) -> str:
     else : result = text.split()[-1]
     return result
 
+# Fields of the deposit details of a check deposit (text without NOPE and /): BORDEREAU if it is a deposit slip,
+# nb_checks the digits before letters in the first word, last_token the last word (deposit number or date)
+pattern_deposit_info = (r'^(?:(?=.*(?P<bordereau>BORDEREAU))|)\s*(?:(?=\S*?(?P<nb_checks>\d+)[A-Z]+)|)'
+                        r'(?:.*\s)?(?P<last_token>\S+)\s*$')
+
 def clean_check_mt940(df_releve_cheque: pd.DataFrame, entity: str = 'ABCD', **kwargs) -> pd.DataFrame:
     """
     Cleans and processes MT940 cheque data based on the specified entity.
@@ -39,36 +44,27 @@ def clean_check_mt940(df_releve_cheque: pd.DataFrame, entity: str = 'ABCD', **kw
     if entity == 'ABCD':
         pattern_remise = r'(?<=NOPE)\/(.*)|(?<=FR)\/\d*\/+(.*)'
         
+        df_releve_cheque = df_releve_cheque.copy()
         df_result = df_releve_cheque['transaction_details'].str.extract(pattern_remise)
-        df_releve_cheque["deposit_details"] = df_result[0].combine_first(df_result[1])
-        df_releve_cheque["deposit_details"] = df_releve_cheque["deposit_details"].str.strip()
-
-        # Get deposit_number
-        mask = df_releve_cheque['deposit_details'].str.contains('BORDEREAU', na=False)
-        df_releve_cheque.loc[mask, 'deposit_number'] = df_releve_cheque.loc[mask].apply(
-            lambda f: find_deposit_info(f['deposit_details'], False), axis=1
-        )
+        deposit_details = df_result[0].combine_first(df_result[1]).astype(object).str.strip()
 
-        # Get nb_checks in deposit
-        mask = ~df_releve_cheque['deposit_details'].str.contains('BORDEREAU', na=False)
-        df_releve_cheque.loc[mask, 'nb_checks'] = df_releve_cheque.loc[mask].apply(
-            lambda f: find_deposit_info(f['deposit_details'], True), axis=1
-        )
+        # One scan of deposit_details: a BORDEREAU deposit ends with its deposit_number, the others start with
+        # the number of checks ('3CHQ') and end with the deposit date ('0412'), as find_deposit_info reads them
+        deposit_details = deposit_details.str.replace('NOPE', '', regex=False).str.replace('/', '', regex=False)
+        df_info = deposit_details.str.extract(pattern_deposit_info)
+        is_bordereau = df_info['bordereau'].notna()
+        is_deposit = deposit_details.notna() & df_info['last_token'].notna() & ~is_bordereau
 
-        # Get deposit_date
-        df_releve_cheque.loc[mask, 'deposit_date'] = df_releve_cheque.loc[mask].apply(
-            lambda f: find_deposit_info(f['deposit_details'], False), axis=1
-        )
-        df_releve_cheque.loc[mask, 'deposit_date'] = (
-            df_releve_cheque.loc[mask, 'date'].dt.year.astype(str) + df_releve_cheque.loc[mask, 'deposit_date']
-        )
-        df_releve_cheque.loc[mask, 'deposit_date'] = pd.to_datetime(df_releve_cheque.loc[mask, 'deposit_date'], format='%Y%m%d')
+        df_releve_cheque['deposit_number'] = df_info['last_token'].where(is_bordereau)
+        df_releve_cheque['nb_checks'] = df_info['nb_checks'].fillna('0').where(is_deposit)
 
-        # Modify date if deposit_date is after the transaction date
-        mask = (~df_releve_cheque['deposit_date'].isnull()) & (df_releve_cheque['deposit_date'] > df_releve_cheque['date'])
-        df_releve_cheque.loc[mask, 'deposit_date'] = df_releve_cheque.loc[mask, 'deposit_date'] + pd.DateOffset(years=-1)
-        
-        df_releve_cheque = df_releve_cheque.drop(columns='deposit_details')
+        # deposit_date: day and month of the deposit in the year of the transaction, the year before if after it
+        day_month = pd.to_numeric(df_info['last_token'].where(is_deposit), errors='coerce')
+        deposit_date = pd.to_datetime(pd.DataFrame({'year': df_releve_cheque['date'].dt.year,
+                                                    'month': day_month // 100,
+                                                    'day': day_month % 100}), errors='coerce')
+        mask = deposit_date > df_releve_cheque['date']
+        df_releve_cheque['deposit_date'] = deposit_date.mask(mask, deposit_date - pd.DateOffset(years=1))
     else:
         df_releve_cheque['deposit_number'] = df_releve_cheque['extra_information'].str.split().str[-1]
         df_releve_cheque['deposit_number'] = df_releve_cheque['deposit_number'].apply(clean_num_cheque, **kwargs)
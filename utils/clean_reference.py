@@ -1,14 +1,139 @@
 import pandas as pd
 import numpy as np
 import re
+import os
+import pickle
+import hashlib
+import sqlite3
 import unidecode
 
 
-df_motsprasites = pd.read_excel("./_config/word_list.xlsx",sheet_name="Sheet1",header=None)
-pattern_clean_motif = "|".join(list(df_motsprasites[0])) ### Create Regex pattern to clean the motif
+# The parasite word list used by clean_motif is only read on first use (see get_pattern_clean_motif and the
+# module __getattr__ that keeps pattern_clean_motif)
+WORD_LIST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '_config', 'word_list.xlsx')
+dict_word_list = {'words': None, 'pattern': None, 'compiled': None}
 
+def _read_word_list_file(path: str, use_cache: bool = True) -> list:
+    """
+    Reads the word list from the Excel file, through a pickle copy next to it that is reused
+    as long as the Excel file has the same modification time and size.
+    """
+    stat = os.stat(path)
+    file_key = (stat.st_mtime_ns, stat.st_size)
+    cache_path = path + '.cache.pkl'
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('file_key') == file_key:
+                return cached['words']
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            pass
+
+    df_motsprasites = pd.read_excel(path, sheet_name="Sheet1", header=None)
+    words = [str(word) for word in df_motsprasites[0].dropna()]
+    if use_cache:
+        try:
+            with open(cache_path, 'wb') as f:
+                pickle.dump({'file_key': file_key, 'words': words}, f)
+        except OSError:
+            pass  # Read-only config folder: the Excel file is read again next time
+    return words
+
+def set_word_list(words: list = None, path: str = None, use_cache: bool = True) -> list:
+    """
+    Sets the parasite word list used by clean_motif, either from a list of words or from an Excel file.
+
+    Parameters:
+        words (list): Words (regex parts) to remove from the motif. If None, they are read from `path`.
+        path (str): Excel file with the words in the first column of Sheet1. Defaults to _config/word_list.xlsx
+                    of the project, or of the current directory if the project has none.
+        use_cache (bool): Reuse the pickle copy of the Excel file when it is up to date. Default is True.
+
+    Returns:
+        list: The word list in use.
+    """
+    if words is None:
+        if path is None:
+            path = WORD_LIST_PATH if os.path.exists(WORD_LIST_PATH) else os.path.join('.', '_config', 'word_list.xlsx')
+        words = _read_word_list_file(path, use_cache)
+    words = list(words)
+    dict_word_list['words'] = words
+    dict_word_list['pattern'] = "|".join(words)  ### Create Regex pattern to clean the motif
+    dict_word_list['compiled'] = re.compile(dict_word_list['pattern'])
+    return words
+
+def get_pattern_clean_motif(compiled: bool = False):
+    """
+    Returns the regex pattern built from the parasite word list, loading the list on first use.
+
+    Parameters:
+        compiled (bool): Return the compiled pattern instead of the string. Default is False.
+
+    Returns:
+        str or re.Pattern: The pattern to clean the motif.
+    """
+    if dict_word_list['words'] is None:
+        set_word_list()
+    return dict_word_list['compiled'] if compiled else dict_word_list['pattern']
+
+def __getattr__(name: str):
+    """
+    Keeps the module attribute pattern_clean_motif (regex string of the parasite words) of the previous versions,
+    built on first access: utils.clean_reference.pattern_clean_motif or from utils.clean_reference import
+    pattern_clean_motif. A star import does not load the word list, use get_pattern_clean_motif() there.
+    """
+    if name == 'pattern_clean_motif':
+        return get_pattern_clean_motif()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+
+# Patterns for titles to be removed from client names, applied in this order. They are kept in small groups of
+# consecutive patterns, each guarded by the alternation of its patterns (see remove_titles)
+list_groups_name = [
+    # Monsieur or Madame
+    [r'\bM\.OU MME\s+', r'\bMRMME', r'\bM\.M\s+', r'\bM OU MME\s+', r'\bMOU ME\s+', r'\bMOU MME\s+'],
+    [r'\bMR ET MME\s+', r'\bM\. et MME\s+', r'\bM\.OUMME\s+', r'\bM\+MME\s+', r'\bOUMR\s+', r'\bMME OU M\s+'],
+    # Monsieur
+    [r'\bM\s+', r'\s+M\b', r'\bDR\.\s+', r'\bDR\s+', r'\bM\.', r'\bM\s+', r'\bM\.\s+', r'\bMR\.\s+'],
+    [r'\bMR\s+', r'\s+MR\b', r'\bMONSIEUR\s+', r'\bM\.OU\s+', r'\bSR\s+', r'\bSIR\s+', r'\bMONSIEUR'],
+    # Madame
+    [r'\bMME\s+', r'\s+MME\b', r'\bMADAME\s+', r'\bOU MME\s+', r'\bET MME\s+', r'\bE SRA\s+', r'\bMRS\s+'],
+    # Mademoiselle
+    [r'\bML\s+', r'\bMLLE\s+', r'\bMLE\s+', r'\bMELLE\s+', r'\bMISS\s+', r'\bMADEMOISELLE\s+'],
+    [r'\bOU\s+', r'\bET\s+', r'\bET\.\s+']
+]
+list_patterns_name = [pattern for list_group in list_groups_name for pattern in list_group]
+# (guard of the group, removals of the group)
+list_compiled_groups = [(re.compile('|'.join(f'(?:{pattern})' for pattern in list_group)),
+                         [re.compile(pattern).sub for pattern in list_group]) for list_group in list_groups_name]
+# If none of the patterns matches a name, the sequential removal leaves it unchanged
+pattern_any_title = re.compile('|'.join(f'(?:{pattern})' for pattern in list_patterns_name))
+pattern_name_chars = re.compile(r'[A-Z\s\d\']+')
+list_remove_de = ["DE", "DU", "ET", "AU", "LA", "LE", 'OU']
+
+
+
+def remove_titles(text: str) -> str:
+    """
+    Removes the title patterns from an upper-case name, one after the other in the order of list_patterns_name.
+    A group of patterns is skipped when its guard does not match: none of its patterns would change the name.
+    Merging the patterns into one alternation would change the result, as removing a title can make the next
+    one match or stop another one from matching (DUPONT MR ET MME gives DUPONT ET, not DUPONT MME).
+
+    Parameters:
+        text (str): The upper-case name without accents.
+
+    Returns:
+        str: The name without its titles.
+    """
+    for pattern_group, list_sub in list_compiled_groups:
+        if pattern_group.search(text):
+            for sub in list_sub:
+                text = sub('', text)
+    return text
+
 def clean_name(text: str = None) -> str:
     """
     Cleans the client name by removing terms indicating titles such as Mr., Mrs., Ms., etc.
@@ -26,27 +151,11 @@ def clean_name(text: str = None) -> str:
     # Normalize text to uppercase and remove accents
     text = unidecode.unidecode(str(text).upper())
     
-    # Define patterns for titles to be removed
-    patterns = [
-        # Monsieur or Madame
-        r'\bM\.OU MME\s+', r'\bMRMME', r'\bM\.M\s+', r'\bM OU MME\s+', r'\bMOU ME\s+', r'\bMOU MME\s+',
-        r'\bMR ET MME\s+', r'\bM\. et MME\s+', r'\bM\.OUMME\s+', r'\bM\+MME\s+', r'\bOUMR\s+', r'\bMME OU M\s+',
-        # Monsieur
-        r'\bM\s+', r'\s+M\b', r'\bDR\.\s+', r'\bDR\s+', r'\bM\.', r'\bM\s+', r'\bM\.\s+', r'\bMR\.\s+',
-        r'\bMR\s+', r'\s+MR\b', r'\bMONSIEUR\s+', r'\bM\.OU\s+', r'\bSR\s+', r'\bSIR\s+', r'\bMONSIEUR',
-        # Madame
-        r'\bMME\s+', r'\s+MME\b', r'\bMADAME\s+', r'\bOU MME\s+', r'\bET MME\s+', r'\bE SRA\s+', r'\bMRS\s+',
-        # Mademoiselle
-        r'\bML\s+', r'\bMLLE\s+', r'\bMLE\s+', r'\bMELLE\s+', r'\bMISS\s+', r'\bMADEMOISELLE\s+',
-        r'\bOU\s+', r'\bET\s+', r'\bET\.\s+'
-    ]
-    
     # Remove patterns from text
-    for pattern in patterns:
-        text = re.sub(pattern, '', text)
+    text = remove_titles(text)
     
     # Extract only valid name characters (A-Z, spaces, digits, and apostrophes)
-    text = ' '.join(re.findall(r'[A-Z\s\d\']+', text))
+    text = ' '.join(pattern_name_chars.findall(text))
     
     # Remove extra spaces and trailing dots
     text = re.sub(r'\s+', ' ', text).strip()
@@ -58,6 +167,45 @@ def clean_name(text: str = None) -> str:
     
     return text
 
+def clean_name_series(names: pd.Series) -> pd.Series:
+    """
+    Vectorized version of clean_name for a whole column, with the same result for each value.
+    The title patterns are only applied to the names where at least one of them matches.
+    
+    Parameters:
+        names (pd.Series): The client names.
+    
+    Returns:
+        pd.Series: The cleaned client names.
+    """
+    values = names.astype(object).tolist()
+    is_null = pd.Series([value is None or (isinstance(value, str) and value == "NAN") for value in values],
+                        index=names.index)
+    
+    # Normalize text to uppercase and remove accents
+    text = pd.Series([unidecode.unidecode(str(value).upper()) for value in values], index=names.index, dtype=object)
+    
+    # Remove patterns from text, only where one of them matches
+    mask = text.str.contains(pattern_any_title, regex=True)
+    if mask.any():
+        text[mask] = [remove_titles(value) for value in text[mask]]
+    
+    # Extract only valid name characters (A-Z, spaces, digits, and apostrophes)
+    text = text.str.findall(pattern_name_chars).str.join(' ')
+    
+    # Remove extra spaces and trailing dots
+    text = text.str.replace(r'\s+', ' ', regex=True).str.strip()
+    text = text.str.replace(r'\.', '', regex=True).str.strip()
+    
+    # Same as 5 passes of remove_de
+    for _ in range(5):
+        starts = text.str[:3].isin(["ET ", 'OU '])
+        short = ~starts & text.isin(list_remove_de)
+        text = text.where(~starts, text.str[3:])
+        text[short] = ''
+    
+    return text.where(~is_null, np.nan)
+
 def clean_motif(text: str = None) -> str:
     """
     Cleans the motif by removing unnecessary words, numbers, special characters, and duplicate words.
@@ -91,7 +239,7 @@ def clean_motif(text: str = None) -> str:
     
     if text:
         # Remove specific unwanted patterns
-        text = re.sub(pattern_clean_motif, '', text)  # Assumes this pattern is defined elsewhere
+        text = get_pattern_clean_motif(compiled=True).sub('', text)
         text = text.strip()
         
         # Remove single-character words and clean the name
@@ -106,6 +254,109 @@ def clean_motif(text: str = None) -> str:
             text = remove_de(text)  # Assumes remove_de is defined elsewhere
 
     return np.nan if text in {'nan', 'NAN', np.nan, '', None} else text
+# Number of values and distinct values seen by the last normalize_unique call for each function/column
+dict_normalization_stats = {}
+
+def get_normalization_version(func_name: str = 'clean_name') -> str:
+    """
+    Returns a hash of the rules used by a normalization function, so that cached results are
+    invalidated when the patterns or the word list change.
+
+    Parameters:
+        func_name (str): 'clean_name' or 'clean_motif'.
+
+    Returns:
+        str: The version hash.
+    """
+    rules = list_patterns_name + list_remove_de
+    if func_name == 'clean_motif':
+        rules = rules + [get_pattern_clean_motif()]
+    return hashlib.sha1('\n'.join(rules).encode('utf-8')).hexdigest()[:16]
+
+def _read_normalization_cache(cache_path: str, func_name: str, version: str, raw_values: list) -> dict:
+    """
+    Reads the cached normalizations of raw_values from the SQLite cache file.
+    """
+    with sqlite3.connect(cache_path) as conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS normalization
+                        (func TEXT, version TEXT, raw TEXT, result TEXT, PRIMARY KEY (func, version, raw))""")
+        conn.execute("CREATE TEMP TABLE wanted (raw TEXT PRIMARY KEY)")
+        conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", ((raw,) for raw in raw_values))
+        rows = conn.execute("""SELECT n.raw, n.result FROM normalization n JOIN wanted w ON n.raw = w.raw
+                               WHERE n.func = ? AND n.version = ?""", (func_name, version)).fetchall()
+    return {raw: (np.nan if result is None else result) for raw, result in rows}
+
+def _write_normalization_cache(cache_path: str, func_name: str, version: str, dict_results: dict) -> None:
+    """
+    Adds new normalizations to the SQLite cache file.
+    """
+    with sqlite3.connect(cache_path) as conn:
+        conn.executemany("INSERT OR REPLACE INTO normalization VALUES (?, ?, ?, ?)",
+                         ((func_name, version, raw, result if isinstance(result, str) else None)
+                          for raw, result in dict_results.items()))
+
+def normalize_unique(values: pd.Series, func_name: str = 'clean_name', cache_path: str = None) -> pd.Series:
+    """
+    Applies clean_name or clean_motif to a column by normalizing each distinct value once and mapping
+    the results back to the rows. With cache_path, the normalizations of previous runs are read from
+    (and new ones written to) a local SQLite file keyed by raw string and rules version.
+
+    Parameters:
+        values (pd.Series): The raw values to normalize.
+        func_name (str): 'clean_name' or 'clean_motif'.
+        cache_path (str): Path of the SQLite cache file. No disk cache if None.
+
+    Returns:
+        pd.Series: The normalized values, same index as the input, with the string dtype of the input if any.
+    """
+    func = clean_name if func_name == 'clean_name' else clean_motif
+    codes, uniques = pd.factorize(values.astype(object))
+    uniques = pd.Series(uniques, dtype=object)
+
+    # Only strings are cached on disk, other values are cheap to normalize again
+    dict_cached = {}
+    is_str = uniques.map(lambda value: isinstance(value, str)).astype(bool)
+    version = get_normalization_version(func_name) if cache_path is not None else None
+    if cache_path is not None and is_str.any():
+        dict_cached = _read_normalization_cache(cache_path, func_name, version, uniques[is_str].tolist())
+    mask_todo = ~(uniques.isin(list(dict_cached.keys())) & is_str)
+
+    result = uniques.map(dict_cached).astype(object)
+    if mask_todo.any():
+        if func_name == 'clean_name':
+            result[mask_todo] = clean_name_series(uniques[mask_todo])
+        else:
+            result[mask_todo] = uniques[mask_todo].map(func)
+        if cache_path is not None:
+            mask_new = mask_todo & is_str
+            _write_normalization_cache(cache_path, func_name, version,
+                                       dict(zip(uniques[mask_new], result[mask_new])))
+
+    # Missing values are not in the uniques (code -1 takes the None sentinel), they are normalized row by row
+    result = pd.Series(np.append(result.to_numpy(dtype=object), None)[codes], index=values.index, dtype=object)
+    mask_null = codes == -1
+    if mask_null.any():
+        result[mask_null] = [func(value) for value in values[mask_null].astype(object)]
+    # A string column (pandas str dtype) stays a string column, as with values.apply(func)
+    if isinstance(values.dtype, pd.StringDtype):
+        result = result.astype(values.dtype)
+
+    dict_normalization_stats[f'{func_name}:{values.name}'] = {
+        'total': len(values),
+        'distinct': len(uniques),
+        'from_disk_cache': len(dict_cached)
+    }
+    return result
+
+def get_normalization_stats() -> pd.DataFrame:
+    """
+    Returns the number of values and distinct values normalized by the last normalize_unique call of each column.
+
+    Returns:
+        pd.DataFrame: One row per function/column with 'total', 'distinct' and 'from_disk_cache'.
+    """
+    return pd.DataFrame.from_dict(dict_normalization_stats, orient='index')
+
 def get_words_only(text: str = None) -> str:
     """
     Extracts only alphabetic words from the input text, removing special characters and words containing digits.
@@ -141,7 +392,7 @@ def remove_de(text: str = None) -> str:
         str: The modified text with trailing words removed if they appear at the end. 
              Returns NaN if the text is one of the specified words to remove.
     """
-    list_to_remove = ["DE", "DU", "ET","AU","LA", "LE",'OU']
+    list_to_remove = list_remove_de
     if text:
         text = str(text)
         
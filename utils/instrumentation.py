@@ -0,0 +1,226 @@
+import inspect
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
+import pandas as pd
+
+'''
+Instrumentation of the reconciliation: the cleaning steps, the mapping passes and the candidate joins emit
+records (dicts) with their timing, memory and counters to the registered sinks.
+    A record has:
+        + event : kind of step ('cleaning', 'stage', 'mapping_pass', 'approximate', 'reconciliation'...)
+        + name : name of the step (function, stage or mapping type)
+        + path : names of the records open when it started, e.g. 'Transfer/master_mapping_transfer_check/basic'
+        + start, elapsed_s, memory_delta_mb, pid
+        + the counters of the step (nb_payments_in, nb_candidate_pairs, nb_pairs_scored, nb_matches...)
+    A sink is a function called with each finished record: logging_sink, jsonl_sink, memory_sink or any callable.
+Without sink, the records are dropped.
+'''
+
+# Sinks receiving the finished records, and records currently open (to build the path of the nested ones)
+list_sinks = []
+list_open_records = []
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+def get_rss_mb() -> float:
+    """
+    Returns the resident memory of the process in MB (NaN where /proc is not available).
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * PAGE_SIZE / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return np.nan
+
+def logging_sink(logger_name: str = 'bank_reconciliation', level: int = logging.INFO):
+    """
+    Returns a sink writing each record as one line to a logger.
+
+    Parameters:
+        logger_name (str): Name of the logger.
+        level (int): Logging level of the records.
+
+    Returns:
+        callable: The sink.
+    """
+    logger = logging.getLogger(logger_name)
+    def sink(record: dict) -> None:
+        fields = ', '.join(f'{key}={value}' for key, value in record.items()
+                           if key not in ['event', 'path', 'start', 'pid'])
+        logger.log(level, f"[{record['event']}] {record['path']}: {fields}")
+    return sink
+
+def jsonl_sink(path: str):
+    """
+    Returns a sink appending each record as a JSON line to a file.
+
+    Parameters:
+        path (str): Path of the JSON lines file.
+
+    Returns:
+        callable: The sink.
+    """
+    def sink(record: dict) -> None:
+        with open(path, 'a') as file:
+            file.write(json.dumps(record, default=str) + '\n')
+    return sink
+
+def memory_sink(list_records: list):
+    """
+    Returns a sink appending each record to list_records.
+
+    Parameters:
+        list_records (list): The list collecting the records.
+
+    Returns:
+        callable: The sink.
+    """
+    return list_records.append
+
+def add_sink(sink) -> None:
+    """
+    Registers a sink (see logging_sink, jsonl_sink, memory_sink).
+    """
+    list_sinks.append(sink)
+
+def remove_sink(sink) -> None:
+    """
+    Unregisters a sink.
+    """
+    if sink in list_sinks:
+        list_sinks.remove(sink)
+
+def emit_records(list_records: list) -> None:
+    """
+    Sends finished records to all the sinks.
+    """
+    for record in list_records:
+        for sink in list(list_sinks):
+            sink(record)
+
+def start_record(event: str, name: str, **fields) -> dict:
+    """
+    Opens a record: its path is made of the names of the records already open.
+
+    Parameters:
+        event (str): Kind of step.
+        name (str): Name of the step.
+        **fields: First counters of the record (input sizes...).
+
+    Returns:
+        dict: The record, to complete with counters and give to end_record.
+    """
+    path = '/'.join([record['name'] for record in list_open_records] + [str(name)])
+    record = {'event': event, 'name': str(name), 'path': path, 'start': time.time(), 'pid': os.getpid(), **fields}
+    record['_perf_counter'], record['_rss_mb'] = time.perf_counter(), get_rss_mb()
+    list_open_records.append(record)
+    return record
+
+def end_record(record: dict, **fields) -> dict:
+    """
+    Closes a record opened by start_record, adds the elapsed time, the memory delta and fields, then emits it.
+
+    Parameters:
+        record (dict): The record.
+        **fields: Last counters of the record (output sizes, matches...).
+
+    Returns:
+        dict: The finished record.
+    """
+    # The records opened inside it and not closed (exception) are dropped with it
+    position = next((i for i, open_record in enumerate(list_open_records) if open_record is record), None)
+    if position is not None:
+        del list_open_records[position:]
+    record.update(fields)
+    record['elapsed_s'] = time.perf_counter() - record.pop('_perf_counter')
+    record['memory_delta_mb'] = get_rss_mb() - record.pop('_rss_mb')
+    emit_records([record])
+    return record
+
+@contextmanager
+def instrument(event: str, name: str, **fields):
+    """
+    Context manager around start_record / end_record, the yielded record can be completed with counters.
+    """
+    record = start_record(event, name, **fields)
+    try:
+        yield record
+    finally:
+        end_record(record)
+
+def emit_event(event: str, name: str, **fields) -> None:
+    """
+    Emits a record without duration (progress message with counters).
+    """
+    end_record(start_record(event, name, **fields))
+
+def _count_rows(value) -> int:
+    """
+    Returns the number of rows of a DataFrame, or of the DataFrames of a tuple / list / dict, None otherwise.
+    """
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (tuple, list)):
+        list_len = [len(item) for item in value if isinstance(item, pd.DataFrame)]
+        return sum(list_len) if list_len else None
+    return None
+
+def instrumented(event: str, input_arg: str = None):
+    """
+    Decorator recording each call of a function with the number of rows of its input DataFrame (nb_rows_in)
+    and of its DataFrame results (nb_rows_out).
+
+    Parameters:
+        event (str): Kind of step of the records.
+        input_arg (str): Name of the input DataFrame argument, the first DataFrame argument if None.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if input_arg is not None:
+                nb_rows_in = _count_rows(signature.bind(*args, **kwargs).arguments.get(input_arg))
+            else:
+                nb_rows_in = next((len(arg) for arg in args if isinstance(arg, pd.DataFrame)), None)
+            record = start_record(event, func.__name__, nb_rows_in=nb_rows_in)
+            result = func(*args, **kwargs)
+            end_record(record, nb_rows_out=_count_rows(result))
+            return result
+        return wrapper
+    return decorator
+
+def capture_records(func, *args) -> tuple:
+    """
+    Calls func(*args) with the records sent to a list instead of the sinks, to bring back the records of a
+    process pool worker (the parent emits them with emit_records).
+
+    Returns:
+        tuple: (result of func, list of the records)
+    """
+    list_records = []
+    list_sinks_saved, list_open_saved = list_sinks[:], list_open_records[:]
+    list_sinks[:] = [memory_sink(list_records)]
+    try:
+        result = func(*args)
+    finally:
+        list_sinks[:], list_open_records[:] = list_sinks_saved, list_open_saved
+    return result, list_records
+
+def records_to_frame(list_records: list) -> pd.DataFrame:
+    """
+    Returns the records as a DataFrame, one row per record, with start as a datetime.
+    """
+    df_records = pd.DataFrame(list_records)
+    if 'start' in df_records.columns:
+        df_records['start'] = pd.to_datetime(df_records['start'], unit='s')
+    return df_records
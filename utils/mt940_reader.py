@@ -0,0 +1,296 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+
+'''
+Streaming reader of MT940 statement files, producing the df_releve input of master.clean_data.clean_data_mt940.
+The files are read line by line: one transaction is a :61: statement line and the :86: information that follows
+it, the statement fields (:20:, :25:, :28C:, :60F:) are carried over to its transactions.
+Rows are built by chunks of chunk_size transactions (DataFrames or Arrow record batches), so the memory does not
+depend on the size of the file.
+    Columns:
+        + id : <file name>-<statement number>-<number of the transaction in the file>
+        + account_code : account of :25:, account_num : product of the account (dict_accounts), country, currency
+        + date : entry date, effective_date : value date, sense : C / D, amount
+        + transaction_type : label of the transaction type code of :61: (dict_transaction_types), type_code
+        + reference1 : reference for the account owner, reference2 : reference of the bank
+        + transaction_details : text of :86:, clientname : name found in it (pattern_clientname)
+        + extra_information : supplementary details of :61:
+'''
+
+# Labels of the SWIFT transaction type codes, as expected by clean_data_mt940
+DICT_TRANSACTION_TYPES = {
+    'TRF': 'Virement',
+    'CHK': 'remise de chèques',
+    'DDT': 'Prélèvements',
+    'RTI': 'Rejected / Not paid'
+}
+
+# Country of the account, from the first letters of the IBAN of :25:
+DICT_COUNTRIES = {
+    'FR': 'FRANCE',
+    'BE': 'BELGIQUE',
+    'LU': 'LUXEMBOURG',
+    'DE': 'ALLEMAGNE',
+    'ES': 'ESPAGNE',
+    'IT': 'ITALIE'
+}
+
+LIST_COLUMNS = ['id', 'account_code', 'account_num', 'country', 'currency', 'statement_number', 'date',
+                'effective_date', 'sense', 'amount', 'transaction_type', 'type_code', 'reference1', 'reference2',
+                'clientname', 'transaction_details', 'extra_information']
+# Text columns, always in the str dtype: a column without any value in a chunk keeps the dtype of the other chunks
+LIST_TEXT_COLUMNS = [col for col in LIST_COLUMNS if col not in ['date', 'effective_date', 'amount']]
+
+pattern_tag = re.compile(r'^:(\d{2}[A-Z]?):(.*)$')
+pattern_statement_line = re.compile(
+    r'^(?P<value_date>\d{6})(?P<entry_date>\d{4})?(?P<mark>RC|RD|C|D)(?P<funds_code>[A-Z])?(?P<amount>\d[\d,]*)'
+    r'(?P<type_id>[NSF])(?P<type_code>[A-Z0-9]{3})(?P<customer_ref>.*?)(?://(?P<bank_ref>.*))?$'
+)
+pattern_balance = re.compile(r'^[CD]\d{6}(?P<currency>[A-Z]{3})')
+# Name of the payer in the :86: text: '/DE <name> /', '/NAME/<name>/' or the ?32 / ?33 subfields
+pattern_clientname = r'(?:/DE\s+|/NAME/|\?3[23])([^/?]+)'
+
+def _parse_statement_line(value: str, dict_columns: dict) -> None:
+    """
+    Appends the raw fields of a :61: statement line (first line of the tag) to dict_columns.
+    """
+    match = pattern_statement_line.match(value)
+    if match is None:
+        raise ValueError(f'Invalid MT940 statement line :61:{value}')
+    dict_columns['value_date'].append(match['value_date'])
+    dict_columns['entry_date'].append(match['entry_date'])
+    dict_columns['mark'].append(match['mark'])
+    dict_columns['amount'].append(match['amount'])
+    dict_columns['type_code'].append(match['type_code'])
+    dict_columns['reference1'].append(match['customer_ref'])
+    dict_columns['reference2'].append(match['bank_ref'])
+
+def iter_mt940_blocks(path: str, chunk_size: int = 100000, encoding: str = 'latin-1'):
+    """
+    Reads an MT940 file line by line and yields the raw fields of its transactions by chunks.
+
+    Parameters:
+        path (str): Path of the MT940 file.
+        chunk_size (int): Maximum number of transactions per chunk.
+        encoding (str): Encoding of the file.
+
+    Yields:
+        dict: {field: list of raw strings}, one item per transaction of the chunk.
+    """
+    list_fields = ['statement_ref', 'account_code', 'statement_number', 'currency', 'value_date', 'entry_date',
+                   'mark', 'amount', 'type_code', 'reference1', 'reference2', 'extra_information',
+                   'transaction_details']
+    dict_columns = {field: [] for field in list_fields}
+    dict_statement = {'statement_ref': None, 'account_code': None, 'statement_number': None, 'currency': None}
+    # Tag being read and its lines, the :61: and :86: of a transaction are added when the next tag starts.
+    # An :86: is the information of a transaction only right after its :61: (otherwise it is about the statement)
+    tag, list_lines = None, []
+    dict_state = {'after_61': False}
+
+    def close_tag():
+        after_61, dict_state['after_61'] = dict_state['after_61'], tag == '61'
+        if tag == '61':
+            for field, value in dict_statement.items():
+                dict_columns[field].append(value)
+            _parse_statement_line(list_lines[0], dict_columns)
+            dict_columns['extra_information'].append(' '.join(list_lines[1:]) or None)
+            dict_columns['transaction_details'].append(None)
+        elif tag == '86' and after_61:
+            dict_columns['transaction_details'][-1] = ' '.join(list_lines)
+        elif tag == '20':
+            dict_statement['statement_ref'] = list_lines[0].strip()
+        elif tag == '25':
+            dict_statement['account_code'] = list_lines[0].strip()
+        elif tag == '28C':
+            dict_statement['statement_number'] = list_lines[0].strip()
+        elif tag in ['60F', '60M']:
+            match = pattern_balance.match(list_lines[0])
+            dict_statement['currency'] = match['currency'] if match else None
+
+    with open(path, encoding=encoding) as file:
+        for line in file:
+            line = line.rstrip('\r\n')
+            # SWIFT blocks: the text block {4: contains the tags, it ends with -}
+            if line.startswith('{'):
+                if '{4:' not in line:
+                    continue
+                line = line.split('{4:', 1)[1]
+                if not line:
+                    continue
+            match = pattern_tag.match(line)
+            if match is not None or line.startswith('-'):
+                close_tag()
+                tag, list_lines = (match[1], [match[2]]) if match is not None else (None, [])
+                # A chunk is yielded between two transactions, when the :86: of the last one has been read
+                if len(dict_columns['value_date']) >= chunk_size and tag != '86':
+                    yield dict_columns
+                    dict_columns = {field: [] for field in list_fields}
+            elif tag is not None:
+                list_lines.append(line.strip())
+        close_tag()
+    if len(dict_columns['value_date']) > 0:
+        yield dict_columns
+
+def blocks_to_frame(dict_columns: dict, file_name: str = '', first_row: int = 0, **kwargs) -> pd.DataFrame:
+    """
+    Converts the raw fields of a chunk of transactions to the df_releve columns (vectorized on the chunk).
+
+    Parameters:
+        dict_columns (dict): Raw fields yielded by iter_mt940_blocks.
+        file_name (str): Name of the file, used in the id.
+        first_row (int): Number of the first transaction of the chunk in the file, used in the id.
+        **kwargs: Optional parameters:
+            dict_transaction_types (dict): Labels of the transaction type codes, DICT_TRANSACTION_TYPES by default.
+            dict_accounts (dict): Product (account_num) of each account_code, account_num is empty if None.
+            pattern_clientname (str): Regex with one group extracting the payer name from transaction_details.
+
+    Returns:
+        pd.DataFrame: The transactions with the columns of LIST_COLUMNS.
+    """
+    dict_transaction_types = kwargs.get('dict_transaction_types', DICT_TRANSACTION_TYPES)
+    dict_accounts = kwargs.get('dict_accounts')
+    df = pd.DataFrame(dict_columns)
+
+    # Dates: value date YYMMDD, entry date MMDD in the year of the value date (or the next / previous one)
+    df['effective_date'] = pd.to_datetime(df['value_date'], format='%y%m%d')
+    entry_date = pd.to_datetime(df['effective_date'].dt.year.astype(str) + df['entry_date'].fillna(''),
+                                format='%Y%m%d', errors='coerce')
+    delta_days = (entry_date - df['effective_date']).dt.days
+    entry_date = entry_date.mask(delta_days > 180, entry_date - pd.DateOffset(years=1))
+    entry_date = entry_date.mask(delta_days < -180, entry_date + pd.DateOffset(years=1))
+    df['date'] = entry_date.fillna(df['effective_date'])
+
+    # Reversal of a credit is a debit and reversal of a debit a credit
+    df['sense'] = df['mark'].map({'C': 'C', 'D': 'D', 'RC': 'D', 'RD': 'C'})
+    df['amount'] = df['amount'].str.replace(',', '.', regex=False).astype(float)
+    df['transaction_type'] = df['type_code'].map(dict_transaction_types).fillna(df['type_code'])
+    df['reference1'] = df['reference1'].str.strip().replace({'': None, 'NONREF': None})
+    df['reference2'] = df['reference2'].str.strip().replace({'': None})
+    df['clientname'] = df['transaction_details'].str.extract(kwargs.get('pattern_clientname', pattern_clientname),
+                                                             expand=False).str.strip()
+    df['country'] = df['account_code'].str[:2].map(DICT_COUNTRIES)
+    df['account_num'] = df['account_code'].map(dict_accounts) if dict_accounts is not None else np.nan
+    df['id'] = (file_name + '-' + df['statement_number'].fillna('').astype(str) + '-' +
+                pd.Series(np.arange(first_row, first_row + len(df)), index=df.index).astype(str))
+    df[LIST_TEXT_COLUMNS] = df[LIST_TEXT_COLUMNS].astype('str')
+    return df[LIST_COLUMNS]
+
+def read_mt940_chunks(path: str, chunk_size: int = 100000, output: str = 'pandas', encoding: str = 'latin-1', **kwargs):
+    """
+    Streams an MT940 file as chunks of df_releve rows.
+
+    Parameters:
+        path (str): Path of the MT940 file.
+        chunk_size (int): Maximum number of transactions per chunk.
+        output (str): 'pandas' for DataFrames, 'arrow' for pyarrow RecordBatch (requires pyarrow).
+        encoding (str): Encoding of the file.
+        **kwargs: Optional parameters of blocks_to_frame.
+
+    Yields:
+        pd.DataFrame or pyarrow.RecordBatch: The transactions of the chunk.
+    """
+    file_name = os.path.splitext(os.path.basename(path))[0]
+    first_row = 0
+    for dict_columns in iter_mt940_blocks(path, chunk_size, encoding):
+        df_chunk = blocks_to_frame(dict_columns, file_name, first_row, **kwargs)
+        first_row += len(df_chunk)
+        if output == 'arrow':
+            import pyarrow as pa
+            yield pa.RecordBatch.from_pandas(df_chunk, preserve_index=False)
+        else:
+            yield df_chunk
+
+def convert_mt940_to_parquet(path: str, output_path: str, chunk_size: int = 100000, encoding: str = 'latin-1',
+                             **kwargs) -> str:
+    """
+    Converts an MT940 file to a parquet file chunk by chunk (requires pyarrow).
+
+    Parameters:
+        path (str): Path of the MT940 file.
+        output_path (str): Path of the parquet file.
+        chunk_size (int): Number of transactions per chunk (row group).
+        encoding (str): Encoding of the file.
+        **kwargs: Optional parameters of blocks_to_frame.
+
+    Returns:
+        str: output_path.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for batch in read_mt940_chunks(path, chunk_size, 'arrow', encoding, **kwargs):
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, batch.schema)
+            writer.write_table(pa.Table.from_batches([batch]).cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    return output_path
+
+def _read_mt940_file(path: str, chunk_size: int, encoding: str, kwargs: dict) -> pd.DataFrame:
+    """
+    Reads a whole MT940 file as one DataFrame (worker of read_mt940).
+    """
+    list_chunks = list(read_mt940_chunks(path, chunk_size, 'pandas', encoding, **kwargs))
+    return pd.concat(list_chunks, ignore_index=True) if list_chunks else pd.DataFrame(columns=LIST_COLUMNS)
+
+def _convert_mt940_file(path: str, output_dir: str, chunk_size: int, encoding: str, kwargs: dict) -> str:
+    """
+    Converts an MT940 file to <output_dir>/<file name>.parquet (worker of convert_mt940_files).
+    """
+    output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.parquet')
+    return convert_mt940_to_parquet(path, output_path, chunk_size, encoding, **kwargs)
+
+def read_mt940(list_paths: list, n_workers: int = None, chunk_size: int = 100000, encoding: str = 'latin-1',
+               **kwargs) -> pd.DataFrame:
+    """
+    Reads MT940 files into the df_releve DataFrame of clean_data_mt940, the files being parsed in parallel.
+
+    Parameters:
+        list_paths (list): Paths of the MT940 files (or one path).
+        n_workers (int): Number of processes parsing the files, None parses them one by one in this process.
+        chunk_size (int): Number of transactions converted at once.
+        encoding (str): Encoding of the files.
+        **kwargs: Optional parameters of blocks_to_frame.
+
+    Returns:
+        pd.DataFrame: The transactions of all the files, in the order of list_paths.
+    """
+    if isinstance(list_paths, str):
+        list_paths = [list_paths]
+    args = (list_paths, repeat(chunk_size), repeat(encoding), repeat(kwargs))
+    if n_workers is None or n_workers <= 1 or len(list_paths) <= 1:
+        list_df = list(map(_read_mt940_file, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            list_df = list(executor.map(_read_mt940_file, *args))
+    return pd.concat(list_df, ignore_index=True) if list_df else pd.DataFrame(columns=LIST_COLUMNS)
+
+def convert_mt940_files(list_paths: list, output_dir: str, n_workers: int = None, chunk_size: int = 100000,
+                        encoding: str = 'latin-1', **kwargs) -> list:
+    """
+    Converts MT940 files to parquet files in parallel, each process keeping only one chunk in memory.
+    The result can be read with pd.read_parquet(output_dir) or chunk by chunk with pyarrow.
+
+    Parameters:
+        list_paths (list): Paths of the MT940 files.
+        output_dir (str): Folder of the parquet files (one per MT940 file).
+        n_workers (int): Number of processes, None converts the files one by one in this process.
+        chunk_size (int): Number of transactions per chunk (row group).
+        encoding (str): Encoding of the files.
+        **kwargs: Optional parameters of blocks_to_frame.
+
+    Returns:
+        list: Paths of the parquet files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    args = (list_paths, repeat(output_dir), repeat(chunk_size), repeat(encoding), repeat(kwargs))
+    if n_workers is None or n_workers <= 1 or len(list_paths) <= 1:
+        return list(map(_convert_mt940_file, *args))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(_convert_mt940_file, *args))
@@ -1,6 +1,25 @@
 import pandas as pd
 import numpy as np
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from fuzzywuzzy import fuzz
+from fuzzywuzzy import utils as fuzz_utils
+from utils.instrumentation import *
+
+try:
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process, utils as rf_utils
+    RAPIDFUZZ_AVAILABLE = hasattr(rf_process, 'cpdist')
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+# fuzzywuzzy is the reference scorer. rapidfuzz is much faster, but its partial_ratio does not give the same
+# scores (e.g. 'JEAN DUPONT' / 'M DUPONT': 88 with fuzzywuzzy, 93 with rapidfuzz), so it is only used on request
+FUZZ_BACKEND = 'fuzzywuzzy'
+FUZZ_WORKERS = 1  # Threads used by rapidfuzz when no workers value is given
+
+# LRU cache of pair scores: the same (payer, subscriber) pair is scored by several passes of a run
+_score_cache = OrderedDict()
+_score_cache_info = {'hits': 0, 'misses': 0, 'maxsize': 1_000_000}
 
 
 def get_date(id1: str = None, id2: str = None, valeur1: str = None, valeur2: str = None) -> str:
@@ -50,7 +69,526 @@ def clean_num_cheque(x: str = None) -> str:
     return str(x).replace('.0', '').zfill(8)
 
 
-def calculate_fuzz_score(df_data: pd.DataFrame, col1: str, col2: str, col_output: str = 'max_score') -> pd.DataFrame:
+def normalize_num_cheque(values: pd.Series) -> pd.Series:
+    """
+    Applies clean_num_cheque once per distinct check or deposit number, missing numbers stay missing.
+    The leading zeros are removed before the padding, so that 0001234567 and 1234567 give the same join key.
+
+    Parameters:
+        values (pd.Series): Check numbers (check_number, doc_num, deposit_number...).
+
+    Returns:
+        pd.Series: Normalized numbers, same index.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = np.append(np.array([clean_num_cheque(value).lstrip('0').zfill(8) for value in uniques], dtype=object),
+                        None)
+    return pd.Series(uniques[codes], index=values.index, dtype=object)
+
+def to_datetime64(values: pd.Series) -> pd.Series:
+    """
+    Converts a date column to datetime64[ns]. A column already in datetime64[ns] is returned as it is,
+    so the dates converted once at ingest are never parsed again.
+
+    Parameters:
+        values (pd.Series): Dates (datetime64, strings or datetime objects).
+
+    Returns:
+        pd.Series: Dates in datetime64[ns], missing dates as NaT.
+    """
+    if values.dtype == 'datetime64[ns]':
+        return values
+    return pd.to_datetime(values).astype('datetime64[ns]')
+
+def to_cents(values: pd.Series) -> pd.Series:
+    """
+    Converts amounts to integer cents: int64, or the nullable Int64 when some amounts are missing.
+
+    Parameters:
+        values (pd.Series): Amounts in euros.
+
+    Returns:
+        pd.Series: Amounts in cents, same index.
+    """
+    cents = (pd.to_numeric(values) * 100).round()
+    return cents.astype('Int64') if cents.isnull().any() else cents.astype('int64')
+
+def from_cents(values: pd.Series) -> pd.Series:
+    """
+    Converts amounts in integer cents back to float amounts in euros (missing amounts become NaN).
+
+    Parameters:
+        values (pd.Series): Amounts in cents.
+
+    Returns:
+        pd.Series: Amounts in euros, same index.
+    """
+    return pd.Series(values.to_numpy(dtype='float64', na_value=np.nan) / 100, index=values.index, name=values.name)
+
+def get_match_components(df_match: pd.DataFrame, col_left: str, col_right: str) -> np.ndarray:
+    """
+    Labels the connected components of the pairs (col_left, col_right) of a match table: two rows are in the
+    same component when they share a left id or a right id, directly or through other rows (ie all the
+    payments and orders of a n payments / 1 order or 1 payment / n orders match).
+
+    Parameters:
+        df_match (pd.DataFrame): The match table, one row per pair.
+        col_left (str): The column of the left ids (payments).
+        col_right (str): The column of the right ids (orders).
+
+    Returns:
+        np.ndarray: The component label of each row.
+    """
+    left_codes = pd.factorize(df_match[col_left])[0]
+    right_codes = pd.factorize(df_match[col_right])[0]
+    labels = np.arange(len(df_match))
+    while True:
+        # Each row takes the smallest label of the rows sharing its left id, then its right id
+        min_left = np.full(left_codes.max() + 1 if len(labels) else 0, len(labels))
+        np.minimum.at(min_left, left_codes, labels)
+        new_labels = min_left[left_codes]
+        min_right = np.full(right_codes.max() + 1 if len(labels) else 0, len(labels))
+        np.minimum.at(min_right, right_codes, new_labels)
+        new_labels = min_right[right_codes]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def select_one_to_one(df_pairs: pd.DataFrame, col_left: str, col_right: str, list_sort_cols: list) -> pd.DataFrame:
+    """
+    Keeps at most one right id per left id and one left id per right id: the pairs are sorted by list_sort_cols
+    and the best pair of each left id is accepted when its right id is not taken by a better pair, until no
+    pair is left.
+
+    Parameters:
+        df_pairs (pd.DataFrame): Candidate pairs, one row per pair.
+        col_left (str): The column of the left ids.
+        col_right (str): The column of the right ids.
+        list_sort_cols (list): Columns ranking the pairs, the smallest values first.
+
+    Returns:
+        pd.DataFrame: The accepted pairs.
+    """
+    df_pairs = df_pairs.sort_values(list_sort_cols, kind='stable')
+    list_accepted = []
+    while len(df_pairs) > 0:
+        df_best = df_pairs.drop_duplicates(subset=col_left).drop_duplicates(subset=col_right)
+        list_accepted.append(df_best)
+        df_pairs = df_pairs[~df_pairs[col_left].isin(df_best[col_left]) & ~df_pairs[col_right].isin(df_best[col_right])]
+    if not list_accepted:
+        return df_pairs
+    return pd.concat(list_accepted)
+
+def set_fuzz_backend(backend: str = 'fuzzywuzzy') -> str:
+    """
+    Sets the scorer used by calculate_fuzz_score when no backend is given.
+
+    Parameters:
+        backend (str): 'fuzzywuzzy' (default, reference scores) or 'rapidfuzz' (batch scoring, faster, but
+            partial_ratio differs from fuzzywuzzy so a few pairs around min_score are accepted or rejected differently).
+
+    Returns:
+        str: The backend in use.
+    """
+    global FUZZ_BACKEND
+    if backend not in ['fuzzywuzzy', 'rapidfuzz']:
+        raise ValueError(f"Unknown fuzzy backend: {backend}, expected 'fuzzywuzzy' or 'rapidfuzz'")
+    if backend == 'rapidfuzz' and not RAPIDFUZZ_AVAILABLE:
+        raise ImportError('rapidfuzz (with process.cpdist) is not installed')
+    FUZZ_BACKEND = backend
+    return FUZZ_BACKEND
+
+def get_score_cache_info() -> dict:
+    """
+    Returns the statistics of the pair score cache.
+
+    Returns:
+        dict: 'hits', 'misses', 'size', 'maxsize' and 'hit_rate' of the cache.
+    """
+    nb_lookups = _score_cache_info['hits'] + _score_cache_info['misses']
+    return {**_score_cache_info,
+            'size': len(_score_cache),
+            'hit_rate': _score_cache_info['hits'] / nb_lookups if nb_lookups else 0.0}
+
+def clear_score_cache(maxsize: int = None) -> None:
+    """
+    Empties the pair score cache and resets its statistics.
+
+    Parameters:
+        maxsize (int): New maximum number of pairs kept in the cache (0 disables the cache). Keeps the current size if None.
+    """
+    _score_cache.clear()
+    _score_cache_info['hits'] = 0
+    _score_cache_info['misses'] = 0
+    if maxsize is not None:
+        _score_cache_info['maxsize'] = maxsize
+
+def calculate_fuzz_score_cached(
+    list_text1: list,
+    list_text2: list,
+    score_cutoff: float = None,
+    workers: int = None,
+    backend: str = 'rapidfuzz'
+) -> np.ndarray:
+    """
+    Same as calculate_fuzz_score_batch (or calculate_fuzz_score_pairs with fuzzywuzzy), but each distinct pair
+    is scored once: repeated pairs in the batch and pairs already scored by a previous pass are read from the
+    LRU pair score cache.
+
+    Parameters:
+        list_text1 (list): First texts, already known to be non-empty.
+        list_text2 (list): Second texts, aligned with list_text1.
+        score_cutoff (float): Pairs scoring below this value get a score of 0. Defaults to None.
+        workers (int): Number of threads used by rapidfuzz. Defaults to FUZZ_WORKERS.
+        backend (str): 'rapidfuzz' or 'fuzzywuzzy', scorer of the pairs missing from the cache. The scores of the
+            two backends are cached separately.
+
+    Returns:
+        np.ndarray: Maximum similarity score of each pair.
+    """
+    list_text1 = pd.Series(list(list_text1), dtype=object).astype(str)
+    list_text2 = pd.Series(list(list_text2), dtype=object).astype(str)
+    if len(list_text1) == 0:
+        return np.array([], dtype='float64')
+
+    # Score each distinct pair once
+    codes, uniques = pd.factorize(list_text1 + '\x00' + list_text2)
+    _, first_pos = np.unique(codes, return_index=True)
+    keys = [(backend, score_cutoff, key) for key in uniques]
+
+    unique_scores = np.empty(len(uniques), dtype='float64')
+    missing = []
+    for i, key in enumerate(keys):
+        score = _score_cache.get(key)
+        if score is None:
+            missing.append(i)
+        else:
+            _score_cache.move_to_end(key)
+            unique_scores[i] = score
+
+    if missing:
+        missing = np.array(missing)
+        if backend == 'rapidfuzz':
+            unique_scores[missing] = calculate_fuzz_score_batch(list_text1.iloc[first_pos[missing]],
+                                                                list_text2.iloc[first_pos[missing]],
+                                                                score_cutoff, workers)
+        else:
+            unique_scores[missing] = calculate_fuzz_score_pairs(list_text1.iloc[first_pos[missing]],
+                                                                list_text2.iloc[first_pos[missing]],
+                                                                score_cutoff)
+        if _score_cache_info['maxsize'] > 0:
+            for i in missing:
+                _score_cache[keys[i]] = unique_scores[i]
+            while len(_score_cache) > _score_cache_info['maxsize']:
+                _score_cache.popitem(last=False)
+
+    _score_cache_info['misses'] += len(missing)
+    _score_cache_info['hits'] += len(codes) - len(missing)
+    return unique_scores[codes]
+
+def calculate_fuzz_score_pairs(
+    list_text1: list,
+    list_text2: list,
+    score_cutoff: float = None
+) -> np.ndarray:
+    """
+    Scores aligned lists of texts with fuzzywuzzy, pair by pair, and returns the maximum of the four fuzzy scores
+    for each pair. token_set_ratio and partial_ratio are only used when both texts have more than one word.
+
+    Parameters:
+        list_text1 (list): First texts, already known to be non-empty.
+        list_text2 (list): Second texts, aligned with list_text1.
+        score_cutoff (float): Pairs scoring below this value get a score of 0. Defaults to None (no cutoff).
+
+    Returns:
+        np.ndarray: Maximum similarity score of each pair.
+    """
+    list_scores = []
+    for text1, text2 in zip(list_text1, list_text2):
+        score = max(fuzz.token_sort_ratio(text1, text2), fuzz.ratio(text1, text2))
+        if len(text1.split()) > 1 and len(text2.split()) > 1:
+            score = max(score, fuzz.token_set_ratio(text1, text2), fuzz.partial_ratio(text1, text2))
+        list_scores.append(score)
+    scores = np.array(list_scores, dtype='float64')
+    if score_cutoff is not None:
+        scores[scores < score_cutoff] = 0
+    return scores
+
+def calculate_fuzz_score_batch(
+    list_text1: list,
+    list_text2: list,
+    score_cutoff: float = None,
+    workers: int = None
+) -> np.ndarray:
+    """
+    Scores aligned lists of texts with rapidfuzz in batch (one C++ call per scorer instead of one
+    Python call per pair) and returns the maximum of the four fuzzy scores for each pair.
+    token_set_ratio and partial_ratio are only used when both texts have more than one word.
+    rapidfuzz's partial_ratio can score higher than fuzzywuzzy's, so a few pairs differ (see FUZZ_BACKEND).
+
+    Parameters:
+        list_text1 (list): First texts, already known to be non-empty.
+        list_text2 (list): Second texts, aligned with list_text1.
+        score_cutoff (float): Pairs scoring below this value (after rounding) get a score of 0,
+                              which lets rapidfuzz abandon them early. Defaults to None (no cutoff).
+        workers (int): Number of threads used by rapidfuzz (-1 uses all cores). Defaults to FUZZ_WORKERS.
+
+    Returns:
+        np.ndarray: Maximum similarity score of each pair, rounded like fuzzywuzzy.
+    """
+    # fuzzywuzzy rounds the scores, so a pair at cutoff - 0.5 still reaches the cutoff
+    cutoff = None if score_cutoff is None else max(score_cutoff - 0.5, 0)
+    list_text1 = list(list_text1)
+    list_text2 = list(list_text2)
+    params = {'score_cutoff': cutoff, 'workers': workers or FUZZ_WORKERS, 'dtype': np.float64}
+
+    # Same processing as fuzzywuzzy: token ratios are computed on processed texts, the others on raw texts
+    scores = np.maximum(
+        rf_process.cpdist(list_text1, list_text2, scorer=rf_fuzz.token_sort_ratio, processor=rf_utils.default_process, **params),
+        rf_process.cpdist(list_text1, list_text2, scorer=rf_fuzz.ratio, **params)
+    )
+
+    # Scores for texts with more than one word
+    multi = np.array([len(t1.split()) > 1 and len(t2.split()) > 1 for t1, t2 in zip(list_text1, list_text2)], dtype=bool)
+    if multi.any():
+        text1_multi = [t for t, m in zip(list_text1, multi) if m]
+        text2_multi = [t for t, m in zip(list_text2, multi) if m]
+        scores[multi] = np.maximum.reduce([
+            scores[multi],
+            rf_process.cpdist(text1_multi, text2_multi, scorer=rf_fuzz.token_set_ratio, processor=rf_utils.default_process, **params),
+            rf_process.cpdist(text1_multi, text2_multi, scorer=rf_fuzz.partial_ratio, **params)
+        ])
+    
+    scores = np.round(scores)
+    if score_cutoff is not None:
+        scores[scores < score_cutoff] = 0
+    return scores
+
+# Number of candidate pairs seen and pruned by prune_name_pairs
+_blocking_stats = {'pairs': 0, 'pruned': 0}
+
+def get_blocking_stats() -> dict:
+    """
+    Returns the counters of prune_name_pairs.
+
+    Returns:
+        dict: 'pairs' (candidate pairs seen), 'pruned' (pairs dropped before scoring) and 'pruned_rate'.
+    """
+    return {**_blocking_stats,
+            'pruned_rate': _blocking_stats['pruned'] / _blocking_stats['pairs'] if _blocking_stats['pairs'] else 0.0}
+
+def reset_blocking_stats() -> None:
+    """
+    Resets the counters of prune_name_pairs.
+    """
+    _blocking_stats['pairs'] = 0
+    _blocking_stats['pruned'] = 0
+
+def _process_text(text: str) -> str:
+    """
+    Same processing as the token scorers: lower case, non alphanumeric characters replaced by spaces, trimmed.
+    """
+    if FUZZ_BACKEND == 'rapidfuzz':
+        return rf_utils.default_process(text)
+    return fuzz_utils.full_process(text, force_ascii=False)
+
+def _char_counts(list_text: list) -> tuple:
+    """
+    Counts the characters of each text in 38 buckets (26 letters without case, 10 digits, space, other).
+    Merging characters in a bucket can only increase the common counts, so the bounds stay upper bounds.
+
+    Returns:
+        tuple: (counts as an array of shape (n, 38), lengths of the texts).
+    """
+    lengths = np.array([len(text) for text in list_text], dtype=np.int64)
+    counts = np.zeros((len(list_text), 38), dtype=np.int64)
+    if lengths.sum() > 0:
+        chars = np.frombuffer(''.join(list_text).encode('utf-32-le'), dtype=np.uint32)
+        lookup = np.full(128, 37, dtype=np.int64)
+        lookup[ord('a'):ord('z') + 1] = np.arange(26)
+        lookup[ord('A'):ord('Z') + 1] = np.arange(26)
+        lookup[ord('0'):ord('9') + 1] = np.arange(26, 36)
+        lookup[ord(' ')] = 36
+        buckets = np.where(chars < 128, lookup[np.minimum(chars, 127)], 37)
+        rows = np.repeat(np.arange(len(list_text)), lengths)
+        counts = np.bincount(rows * 38 + buckets, minlength=len(list_text) * 38).reshape(len(list_text), 38)
+    return counts, lengths
+
+def get_name_features(values: list) -> dict:
+    """
+    Computes the blocking features of distinct names: tokens and character counts of the raw text (ratio,
+    partial_ratio), of the sorted tokens (token_sort_ratio) and of the distinct sorted tokens (token_set_ratio).
+
+    Parameters:
+        values (list): Distinct names (strings).
+
+    Returns:
+        dict: 'tokens' (list of sets), 'multi' (more than one word), and the counts/lengths of each text form.
+    """
+    list_tokens = [_process_text(text).split() for text in values]
+    raw_counts, raw_lengths = _char_counts(list(values))
+    sort_counts, sort_lengths = _char_counts([' '.join(tokens) for tokens in list_tokens])
+    set_counts, set_lengths = _char_counts([' '.join(set(tokens)) for tokens in list_tokens])
+    return {
+        'tokens': [set(tokens) for tokens in list_tokens],
+        'multi': np.array([len(text.split()) > 1 for text in values], dtype=bool),
+        'raw': (raw_counts, raw_lengths),
+        'sort': (sort_counts, sort_lengths),
+        'set': (set_counts, set_lengths)
+    }
+
+def _ratio_bound(features1: dict, features2: dict, form: str, codes1: np.ndarray, codes2: np.ndarray) -> tuple:
+    """
+    Upper bound of the ratio between two text forms: 200 * common characters / (len1 + len2).
+    Returns the bound and the number of common characters.
+    """
+    counts1, lengths1 = features1[form]
+    counts2, lengths2 = features2[form]
+    common = np.minimum(counts1[codes1], counts2[codes2]).sum(axis=1)
+    total = lengths1[codes1] + lengths2[codes2]
+    bound = np.where(total > 0, 200 * common / np.maximum(total, 1), 100.0)
+    # Empty processed texts are scored 100 or 0 depending on the scorer, they are never pruned
+    bound[(lengths1[codes1] == 0) | (lengths2[codes2] == 0)] = 100.0
+    return bound, common
+
+def _explode_token_ids(list_tokens: list, codes: np.ndarray, vocabulary: dict) -> tuple:
+    """
+    Returns (pair position, token id) for each token of the texts of the pairs, the texts being given by their
+    codes in list_tokens (sets of tokens of the distinct texts).
+    """
+    token_ids = [np.array([vocabulary.setdefault(token, len(vocabulary)) for token in tokens], dtype=np.int64)
+                 for tokens in list_tokens]
+    lengths = np.array([len(ids) for ids in token_ids], dtype=np.int64)
+    flat = np.concatenate(token_ids) if len(token_ids) else np.zeros(0, dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    nb_tokens = lengths[codes]
+    pair_pos = np.repeat(np.arange(len(codes)), nb_tokens)
+    within = np.arange(nb_tokens.sum()) - np.repeat(np.cumsum(nb_tokens) - nb_tokens, nb_tokens)
+    return pair_pos, flat[np.repeat(starts[codes], nb_tokens) + within]
+
+def _shared_tokens(tokens1: list, tokens2: list, codes1: np.ndarray, codes2: np.ndarray) -> np.ndarray:
+    """
+    Inverted index join: True for the pairs (codes1[i], codes2[i]) whose token sets intersect.
+    """
+    vocabulary = {}
+    pos1, ids1 = _explode_token_ids(tokens1, codes1, vocabulary)
+    pos2, ids2 = _explode_token_ids(tokens2, codes2, vocabulary)
+    size = max(len(vocabulary), 1)
+    common = np.intersect1d(pos1 * size + ids1, pos2 * size + ids2, assume_unique=True)
+    shared = np.zeros(len(codes1), dtype=bool)
+    shared[common // size] = True
+    return shared
+
+def tokens_overlap(list_text1: list, list_text2: list) -> np.ndarray:
+    """
+    Tells for each pair of texts if they share at least one processed token, with an inverted index
+    (token -> pairs) joining the tokens of both sides.
+
+    Parameters:
+        list_text1 (list): First texts.
+        list_text2 (list): Second texts, aligned with list_text1.
+
+    Returns:
+        np.ndarray: True for the pairs sharing a token.
+    """
+    codes1, uniques1 = pd.factorize(pd.Series(list(list_text1), dtype=object).astype(str))
+    codes2, uniques2 = pd.factorize(pd.Series(list(list_text2), dtype=object).astype(str))
+    tokens1 = [set(_process_text(text).split()) for text in uniques1]
+    tokens2 = [set(_process_text(text).split()) for text in uniques2]
+    return _shared_tokens(tokens1, tokens2, codes1, codes2)
+
+def find_commun_word_series(list_text1: list, list_text2: list) -> np.ndarray:
+    """
+    Vectorized find_commun_word: the words of the distinct texts are split once and the pairs sharing a word
+    (longer than 2 characters and not 'LES', taken from text1) are found with the inverted index join.
+
+    Parameters:
+        list_text1 (list): First texts (payer names).
+        list_text2 (list): Second texts (BO names), aligned with list_text1.
+
+    Returns:
+        np.ndarray: True for the pairs with a common word, False when one of the texts is empty or not a string.
+    """
+    codes1, uniques1 = pd.factorize(pd.Series(list(list_text1), dtype=object))
+    codes2, uniques2 = pd.factorize(pd.Series(list(list_text2), dtype=object))
+    tokens1 = [set(word for word in text.split() if len(word) > 2 and word != 'LES') if isinstance(text, str) else set()
+               for text in uniques1]
+    tokens2 = [set(text.split()) if isinstance(text, str) else set() for text in uniques2]
+    # Missing values have the code -1, mapped to an empty set of words
+    tokens1.append(set())
+    tokens2.append(set())
+    codes1 = np.where(codes1 < 0, len(uniques1), codes1)
+    codes2 = np.where(codes2 < 0, len(uniques2), codes2)
+    return _shared_tokens(tokens1, tokens2, codes1, codes2)
+
+def prune_name_pairs(list_text1: list, list_text2: list, min_score: float, mode: str = 'exact') -> np.ndarray:
+    """
+    Blocking before the fuzzy scores of calculate_fuzz_score: finds the pairs of names that cannot reach min_score.
+
+    - 'exact': a pair is pruned only when an upper bound of each of the four scores is below min_score, so the
+      result of the matching is unchanged. The bounds come from the common characters of the texts (an Indel
+      ratio is at most 2 * common characters / total length) and token_set_ratio is never bounded for pairs
+      sharing a token.
+    - 'token': a pair is pruned when the names share no token. Faster, but names written without spaces
+      (DUPONTJEAN / DUPONT JEAN) are lost.
+
+    Parameters:
+        list_text1 (list): Names of the payment table (non-empty strings).
+        list_text2 (list): Names of the BO table, aligned with list_text1.
+        min_score (float): Minimum similarity score of the matching.
+        mode (str): 'exact' or 'token'.
+
+    Returns:
+        np.ndarray: True for the pairs to keep.
+    """
+    list_text1 = pd.Series(list(list_text1), dtype=object).astype(str)
+    list_text2 = pd.Series(list(list_text2), dtype=object).astype(str)
+    nb_pairs = len(list_text1)
+    if nb_pairs == 0:
+        return np.ones(0, dtype=bool)
+
+    # Features of the distinct names of each side
+    codes1, uniques1 = pd.factorize(list_text1)
+    codes2, uniques2 = pd.factorize(list_text2)
+    features1 = get_name_features(list(uniques1))
+    features2 = get_name_features(list(uniques2))
+
+    # Pairs sharing a token
+    shared = _shared_tokens(features1['tokens'], features2['tokens'], codes1, codes2)
+
+    if mode == 'token':
+        keep = shared
+    elif mode == 'exact':
+        # fuzzywuzzy rounds the scores, so a pair at min_score - 0.5 still reaches min_score
+        threshold = min_score - 0.5 - 1e-9
+        bound, common = _ratio_bound(features1, features2, 'raw', codes1, codes2)
+        bound = np.maximum(bound, _ratio_bound(features1, features2, 'sort', codes1, codes2)[0])
+
+        # token_set_ratio and partial_ratio only for texts with more than one word
+        multi = features1['multi'][codes1] & features2['multi'][codes2]
+        bound_set = np.where(shared, 100.0, _ratio_bound(features1, features2, 'set', codes1, codes2)[0])
+        # partial_ratio aligns the shorter text on a window of the longer one: at most 200 * c / (shorter + c)
+        shorter = np.minimum(features1['raw'][1][codes1], features2['raw'][1][codes2])
+        bound_partial = np.where(shorter + common > 0, 200 * common / np.maximum(shorter + common, 1), 100.0)
+        bound = np.where(multi, np.maximum.reduce([bound, bound_set, bound_partial]), bound)
+        keep = bound >= threshold
+    else:
+        raise ValueError(f"Unknown blocking mode: {mode}, expected 'exact' or 'token'")
+
+    _blocking_stats['pairs'] += nb_pairs
+    _blocking_stats['pruned'] += int((~keep).sum())
+    return keep
+
+def calculate_fuzz_score(
+    df_data: pd.DataFrame,
+    col1: str,
+    col2: str,
+    col_output: str = 'max_score',
+    backend: str = None,
+    score_cutoff: float = None,
+    workers: int = None
+) -> pd.DataFrame:
     """
     Calculates similarity scores between text in two columns of a DataFrame using fuzzy matching techniques.
 
@@ -65,10 +603,16 @@ def calculate_fuzz_score(df_data: pd.DataFrame, col1: str, col2: str, col_output
         col1 (str): Name of the first column containing the text for comparison.
         col2 (str): Name of the second column containing the text for comparison.
         col_output (str): Name of the column where the maximum similarity score will be stored. Defaults to 'max_score'.
+        backend (str): 'fuzzywuzzy' (reference scores) or 'rapidfuzz' (scored in batch, faster, but its
+                       partial_ratio differs from fuzzywuzzy's). Each distinct pair is scored once, through the
+                       pair score cache. Defaults to FUZZ_BACKEND, fuzzywuzzy unless changed with set_fuzz_backend.
+        score_cutoff (float): Pairs scoring below this value get 0. Defaults to None.
+        workers (int): Only with rapidfuzz, number of threads used for scoring. Defaults to FUZZ_WORKERS.
 
     Returns:
         pd.DataFrame: DataFrame with an additional column for the maximum similarity score between `col1` and `col2`.
     """
+    backend = backend or FUZZ_BACKEND
     
     # List of values considered as null or empty
     list_null = [np.nan, '', None]
@@ -76,25 +620,12 @@ def calculate_fuzz_score(df_data: pd.DataFrame, col1: str, col2: str, col_output
     # Create a mask to filter out rows where either column has null or empty values
     mask = (~df_data[col1].isin(list_null)) & ~df_data[col2].isin(list_null)
     
-    # Calculate various fuzzy matching scores
-    df_data.loc[mask, 'token_sort_ratio'] = df_data.loc[mask].apply(lambda x: fuzz.token_sort_ratio(x[col1], x[col2]), axis=1)
-    df_data.loc[mask, 'full_score'] = df_data.loc[mask].apply(lambda x: fuzz.ratio(x[col1], x[col2]), axis=1)
-    
-    # Calculate scores for texts with more than one word
-    mask1 = mask & (df_data[col1].str.split().str.len() > 1) & (df_data[col2].str.split().str.len() > 1)
-    df_data.loc[mask1, 'token_set_ratio'] = df_data.loc[mask1].apply(lambda x: fuzz.token_set_ratio(x[col1], x[col2]), axis=1)
-    df_data.loc[mask1, 'partial_ratio'] = df_data.loc[mask1].apply(lambda x: fuzz.partial_ratio(x[col1], x[col2]), axis=1)
-    
-    # Fill NaN values with 0 for single-word texts
-    df_data.loc[mask, 'token_set_ratio'] = df_data.loc[mask, 'token_set_ratio'].fillna(0)
-    df_data.loc[mask, 'partial_ratio'] = df_data.loc[mask, 'partial_ratio'].fillna(0)
-    
-    # Determine the maximum score from the calculated scores
-    df_data[col_output] = df_data[['token_sort_ratio', 'full_score', 'token_set_ratio', 'partial_ratio']].max(axis=1)
-    
-    # Drop intermediate columns used for calculations
-    df_data = df_data.drop(columns=['token_sort_ratio', 'full_score', 'token_set_ratio', 'partial_ratio'])
-    
+    df_data = df_data.copy()
+    df_data[col_output] = np.nan
+    if mask.any():
+        df_data.loc[mask, col_output] = calculate_fuzz_score_cached(df_data.loc[mask, col1],
+                                                                    df_data.loc[mask, col2],
+                                                                    score_cutoff, workers, backend)
     return df_data
 
 def check_name(df_data: pd.DataFrame, list_names: list, score_threshold: int = 90) -> pd.DataFrame:
@@ -119,7 +650,7 @@ def check_name(df_data: pd.DataFrame, list_names: list, score_threshold: int = 9
     
     # Calculate fuzzy matching scores for each name column in list_names
     for col in list_names:
-        df_data = calculate_fuzz_score(df_data, col, 'subscriber_name', col_output='max_' + col)
+        df_data = calculate_fuzz_score(df_data, col, 'subscriber_name', col_output='max_' + col, score_cutoff=score_threshold)
     
     # Determine the highest score across all columns and filter based on the score threshold
     df_data['max_score'] = df_data[list_cols].max(axis=1)
@@ -128,4 +659,79 @@ def check_name(df_data: pd.DataFrame, list_names: list, score_threshold: int = 9
     # Drop the intermediate columns used for fuzzy score calculations
     df_data = df_data.drop(columns=list_cols)
     
-    return df_data
\ No newline at end of file
+    return df_data
+
+
+def _timed_call(func, args: tuple, name: str = None) -> tuple:
+    """
+    Calls func(*args) and returns (result, start time, end time), used to time the stages in the worker process.
+    With name, the call is also recorded as a 'stage' record (see utils.instrumentation).
+    """
+    record = start_record('stage', name) if name is not None else None
+    start = time.time()
+    result = func(*args)
+    end = time.time()
+    if record is not None:
+        end_record(record)
+    return result, start, end
+
+def run_stage_graph(dict_stages: dict, n_workers: int = None) -> tuple:
+    """
+    Runs a small dependency graph of stages. Each stage is called with the results of its dependencies
+    followed by its own arguments: func(*[results of depends_on], *args).
+
+    Parameters:
+        dict_stages (dict): {stage name: {'func': callable, 'args': tuple, 'depends_on': list of stage names}}.
+            The functions must be defined at module level to be sent to the process pool.
+        n_workers (int): Number of processes running the ready stages concurrently.
+            None runs the stages one by one in the calling process, in the order of dict_stages.
+
+    Returns:
+        tuple: (dict of the results by stage name, pd.DataFrame of the timing with one row per stage:
+            'stage', 'start', 'end', 'duration_s').
+    """
+    for name, stage in dict_stages.items():
+        unknown = [dep for dep in stage.get('depends_on', []) if dep not in dict_stages]
+        if unknown:
+            raise ValueError(f'Stage {name} depends on unknown stages: {unknown}')
+
+    dict_results, list_timing = {}, []
+    def stage_args(name):
+        stage = dict_stages[name]
+        return tuple(dict_results[dep] for dep in stage.get('depends_on', [])) + tuple(stage.get('args', ()))
+    def is_ready(name):
+        return all(dep in dict_results for dep in dict_stages[name].get('depends_on', []))
+
+    todo = list(dict_stages)
+    if n_workers is None:
+        while todo:
+            ready = [name for name in todo if is_ready(name)]
+            if not ready:
+                raise ValueError(f'Circular dependencies between stages: {todo}')
+            name = ready[0]
+            dict_results[name], start, end = _timed_call(dict_stages[name]['func'], stage_args(name), name)
+            list_timing.append((name, start, end))
+            todo.remove(name)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            running = {}
+            while todo or running:
+                for name in [name for name in todo if is_ready(name)]:
+                    # The records of the stage are sent back with its result and emitted here
+                    running[executor.submit(capture_records, _timed_call, dict_stages[name]['func'],
+                                            stage_args(name), name)] = name
+                    todo.remove(name)
+                if not running:
+                    raise ValueError(f'Circular dependencies between stages: {todo}')
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    (dict_results[name], start, end), list_records = future.result()
+                    emit_records(list_records)
+                    list_timing.append((name, start, end))
+
+    df_timing = pd.DataFrame(list_timing, columns=['stage', 'start', 'end'])
+    df_timing['duration_s'] = df_timing['end'] - df_timing['start']
+    df_timing['start'] = pd.to_datetime(df_timing['start'], unit='s')
+    df_timing['end'] = pd.to_datetime(df_timing['end'], unit='s')
+    return dict_results, df_timing